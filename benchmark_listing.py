@@ -0,0 +1,71 @@
+import argparse
+import sys
+import time
+from compact_listing import CompactListing, diff_listings
+
+###
+# BEGIN: SYNTHETIC LISTINGS
+###
+# Keys shaped like our datasets: a few projects, many runs, sharded part files, yielded in key order
+def synthetic_listing(object_count, changed_every=0, missing_every=0):
+    for i in range(object_count):
+        if missing_every and i % missing_every == 0:
+            continue
+        size = 1048576 + (i * 7919) % 268435456
+        if changed_every and i % changed_every == 0:
+            size += 1
+        yield f"datasets/project_{i // 10000000:02d}/run_{(i // 100000) % 100:03d}/shard_{(i // 1000) % 100:03d}/part-{i:010d}.parquet", size
+
+# Size of a {key: size} dict including its keys and sizes, the way list_objects returns a listing
+def dict_memory_bytes(listing):
+    return sys.getsizeof(listing) + sum(sys.getsizeof(key) + sys.getsizeof(size) for key, size in listing.items())
+###
+# END: SYNTHETIC LISTINGS
+###
+
+###
+# BEGIN: BENCHMARKS
+###
+# The diff cloud_transfer.py used to run: two full dict listings and a dict comprehension for each side of the result
+def benchmark_dicts(object_count):
+    start = time.time()
+    src_objects = dict(synthetic_listing(object_count))
+    dst_objects = dict(synthetic_listing(object_count, changed_every=100, missing_every=10))
+    build_seconds = time.time() - start
+    memory_bytes = dict_memory_bytes(src_objects) + dict_memory_bytes(dst_objects)
+    start = time.time()
+    objects_synced = {key: src_objects[key] for key in src_objects if (key in dst_objects and src_objects[key] == dst_objects[key])}
+    objects_not_synced = {key: src_objects[key] for key in src_objects if (key not in dst_objects or src_objects[key] != dst_objects[key])}
+    diff_seconds = time.time() - start
+    memory_bytes += dict_memory_bytes(objects_synced) + dict_memory_bytes(objects_not_synced)
+    return {'build_seconds': build_seconds, 'diff_seconds': diff_seconds, 'memory_bytes': memory_bytes, 'objects_not_synced': len(objects_not_synced)}
+
+def benchmark_compact(object_count):
+    start = time.time()
+    src_listing = CompactListing.from_sorted(synthetic_listing(object_count), details=False)
+    dst_listing = CompactListing.from_sorted(synthetic_listing(object_count, changed_every=100, missing_every=10), details=False)
+    build_seconds = time.time() - start
+    memory_bytes = src_listing.memory_bytes() + dst_listing.memory_bytes()
+    start = time.time()
+    synced_objects, synced_bytes, objects_not_synced = diff_listings(src_listing, dst_listing)
+    diff_seconds = time.time() - start
+    memory_bytes += dict_memory_bytes(objects_not_synced)
+    return {'build_seconds': build_seconds, 'diff_seconds': diff_seconds, 'memory_bytes': memory_bytes, 'objects_not_synced': len(objects_not_synced)}
+###
+# END: BENCHMARKS
+###
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the memory and time of dict listings and compact listings for a source/destination diff.')
+    parser.add_argument('object_counts', type=int, nargs='*', default=[1000000, 10000000, 50000000], help='Listing sizes to benchmark.')
+    parser.add_argument('--max-dict-objects', type=int, default=10000000, help='Largest listing the dict representation is benchmarked at, it needs several GB per 10M keys.')
+    args = parser.parse_args()
+
+    print(f"{'objects':>12} {'representation':>15} {'memory GB':>10} {'build s':>9} {'diff s':>9}")
+    for object_count in args.object_counts:
+        representations = [('compact', benchmark_compact)]
+        if object_count <= args.max_dict_objects:
+            representations.insert(0, ('dict', benchmark_dicts))
+        for representation, benchmark in representations:
+            result = benchmark(object_count)
+            print(f"{object_count:>12} {representation:>15} {result['memory_bytes']/1073741824:>10.3f} {result['build_seconds']:>9.1f} {result['diff_seconds']:>9.1f}", flush=True)
@@ -0,0 +1,333 @@
+import argparse
+import glob
+import io
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+from utils import read_json, write_json, run_command
+from storage_drivers import get_storage_driver
+
+###
+# BEGIN: BENCHMARK PROFILES
+###
+# Object size distributions, every entry is (object count, smallest bytes, largest bytes) with sizes spread log-uniformly
+BENCHMARK_PROFILES = {
+    'tiny': [(2000, 1024, 65536)],
+    'mixed': [(400, 1024, 1048576), (100, 1048576, 16777216), (8, 16777216, 67108864)],
+    'huge': [(4, 67108864, 134217728)],
+}
+
+# Transfer settings every benchmark run uses unless overridden, huge objects are copied multipart at sizes a stand-in handles
+BENCHMARK_TRANSFER_SETTINGS = {
+    'multipart_threshold_bytes': 33554432,
+    'multipart_part_size_bytes': 8388608,
+    'server_side_copy_part_size_bytes': 8388608,
+    'listing_index': False,
+}
+
+# Source/destination pairs run by default, pairs with AZURE are skipped when no Azurite is available
+DEFAULT_PAIRS = ['AWS-AWS', 'LOCAL-AWS', 'AWS-LOCAL', 'LOCAL-LOCAL', 'AWS-AZURE', 'AZURE-AWS', 'AZURE-AZURE']
+
+# Azurite's well-known development account
+AZURITE_ACCOUNT_NAME = 'devstoreaccount1'
+AZURITE_ACCOUNT_KEY = 'Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=='
+
+# Returns [size] of a profile scaled by scale, the same sizes for the same seed
+def profile_object_sizes(profile, scale=1.0, seed=0):
+    rng = random.Random(seed)
+    sizes = []
+    for object_count, min_bytes, max_bytes in BENCHMARK_PROFILES[profile]:
+        for _ in range(max(1, int(object_count * scale))):
+            sizes.append(int(min_bytes * (max_bytes / min_bytes) ** rng.random()))
+    return sizes
+###
+# END: BENCHMARK PROFILES
+###
+
+###
+# BEGIN: LOCAL STAND-INS
+###
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+# Waits until a stand-in answers http requests, any status counts as up
+def wait_for_http(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return True
+        except urllib.error.HTTPError:
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+class StandIns:
+    """
+    The local S3 stand-in (a moto server) and, when its command is installed, an Azurite blob stand-in.
+
+    Both run as child processes for the lifetime of the suite, every benchmark run gets its own buckets in them.
+    """
+    def __init__(self, work_directory, azurite_command='azurite-blob'):
+        self.processes = []
+        self.s3_endpoint_url = None
+        self.azure_connection_string = None
+        s3_port = free_port()
+        self.processes.append(subprocess.Popen([sys.executable, '-m', 'moto.server', '-p', str(s3_port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        if wait_for_http(f"http://127.0.0.1:{s3_port}"):
+            self.s3_endpoint_url = f"http://127.0.0.1:{s3_port}"
+        else:
+            print("The moto S3 stand-in did not start, pairs with AWS are skipped.")
+        if shutil.which(azurite_command):
+            azure_port = free_port()
+            self.processes.append(subprocess.Popen([azurite_command, '--blobPort', str(azure_port), '--location', os.path.join(work_directory, 'azurite'), '--silent', '--skipApiVersionCheck'],
+                                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            if wait_for_http(f"http://127.0.0.1:{azure_port}"):
+                self.azure_connection_string = (f"DefaultEndpointsProtocol=http;AccountName={AZURITE_ACCOUNT_NAME};AccountKey={AZURITE_ACCOUNT_KEY};"
+                                                f"BlobEndpoint=http://127.0.0.1:{azure_port}/{AZURITE_ACCOUNT_NAME};")
+        if self.azure_connection_string is None:
+            print(f"No Azurite blob stand-in ('{azurite_command}' is not installed or did not start), pairs with AZURE are skipped.")
+
+    def available(self, service):
+        return service == 'LOCAL' or (service == 'AWS' and self.s3_endpoint_url is not None) or (service == 'AZURE' and self.azure_connection_string is not None)
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait()
+
+# A config side for a bucket of a stand-in, LOCAL buckets are directories below the work directory
+def stand_in_side(stand_ins, service, bucket, work_directory):
+    if service == 'AWS':
+        return {'service': 'AWS', 'bucket': bucket, 'bucket_prefix': 'benchmark', 'region': 'us-east-1',
+                'access_key': 'benchmark', 'secret_access_key': 'benchmark', 'endpoint_urls': [stand_ins.s3_endpoint_url]}
+    if service == 'AZURE':
+        return {'service': 'AZURE', 'bucket': bucket, 'bucket_prefix': 'benchmark', 'region': '',
+                'access_key': stand_ins.azure_connection_string, 'secret_access_key': '', 'endpoint_urls': ['no_endpoint']}
+    return {'service': 'LOCAL', 'bucket': os.path.join(work_directory, 'local', bucket), 'bucket_prefix': 'benchmark', 'region': '',
+            'access_key': '', 'secret_access_key': '', 'endpoint_urls': ['no_endpoint']}
+
+def create_bucket(config, side):
+    side_config = config[side]
+    client = get_storage_driver(side_config['service'], config, side).client(side_config['endpoint_urls'][0])
+    if side_config['service'] == 'AWS':
+        client.create_bucket(Bucket=side_config['bucket'])
+    elif side_config['service'] == 'AZURE':
+        client.create_container(side_config['bucket'])
+    else:
+        os.makedirs(side_config['bucket'], exist_ok=True)
+
+# Writes the objects of a profile to the 'src' side of config through its storage driver
+def seed_objects(config, sizes, max_workers=16):
+    side_config = config['src']
+    driver = get_storage_driver(side_config['service'], config, 'src')
+    endpoint_url = side_config['endpoint_urls'][0]
+    # Random bytes are generated once and sliced, every object still gets its own content from its offset
+    random_block = os.urandom(max(sizes) + len(sizes))
+    def seed(index):
+        key = f"{side_config['bucket_prefix']}/part-{index:07d}.bin"
+        data = random_block[index:index + sizes[index]]
+        driver.write_stream(side_config['bucket'], key, driver.hashing_reader(io.BytesIO(data)), len(data), endpoint_url)
+        driver.commit_stream(side_config['bucket'], key, endpoint_url)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(seed, range(len(sizes))))
+###
+# END: LOCAL STAND-INS
+###
+
+###
+# BEGIN: PROCESS MEASUREMENT
+###
+# Memory of one process: its proportional set size, which splits the pages forked workers still share with their parent
+# between them instead of counting them in every worker, or its resident set size where the kernel has no smaps_rollup
+def process_memory_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps_file:
+            for line in smaps_file:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        with open(f'/proc/{pid}/statm') as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return 0
+
+# Memory of a process and all its descendants (the worker pool), read from /proc
+def process_tree_memory_bytes(root_pid):
+    children = {}
+    for stat_path in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat_path) as stat_file:
+                fields = stat_file.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat_path.split('/')[2]))
+    memory_bytes = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        memory_bytes += process_memory_bytes(pid)
+    return memory_bytes
+
+def run_measured(command, log_path, sample_seconds=0.2):
+    """
+    Runs a command to completion and returns its wall time, CPU seconds (user + system of it and every descendant
+    it waited for), the peak memory of its whole process tree and the peak resident bytes of its largest single process.
+    """
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.time()
+    peak_tree_memory_bytes = 0
+    with open(log_path, 'w') as log_file:
+        process = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT)
+        while process.poll() is None:
+            peak_tree_memory_bytes = max(peak_tree_memory_bytes, process_tree_memory_bytes(process.pid))
+            time.sleep(sample_seconds)
+    wall_seconds = time.time() - start
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {'returncode': process.returncode,
+            'wall_seconds': wall_seconds,
+            'cpu_seconds': (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime),
+            'peak_tree_memory_bytes': peak_tree_memory_bytes,
+            # ru_maxrss is in KiB on Linux and only ever grows, it is the largest process since the suite started
+            'peak_process_rss_bytes': usage_after.ru_maxrss * 1024}
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+###
+# END: PROCESS MEASUREMENT
+###
+
+###
+# BEGIN: BENCHMARK RUNS
+###
+def run_benchmark(stand_ins, work_directory, run_name, src_service, dst_service, src_bucket, transfer_settings):
+    """Runs cloud_transfer.py from a seeded source bucket into a new destination bucket and measures it."""
+    run_directory = os.path.join(work_directory, run_name)
+    os.makedirs(run_directory)
+    config = {'src': stand_in_side(stand_ins, src_service, src_bucket, work_directory),
+              'dst': stand_in_side(stand_ins, dst_service, f"{run_name}-dst", work_directory),
+              'log': {'service': 'LOCAL', 'bucket': run_directory, 'bucket_prefix': 'logs', 'region': '', 'access_key': '', 'secret_access_key': '',
+                      'endpoint_urls': ['no_endpoint'], 'local_directory': os.path.join(run_directory, 'logs')},
+              'transfer': {**BENCHMARK_TRANSFER_SETTINGS, 'journal_directory': os.path.join(run_directory, 'journals'), **transfer_settings}}
+    create_bucket(config, 'dst')
+    config_path = os.path.join(run_directory, 'config.yaml')
+    with open(config_path, 'w') as config_file:
+        yaml.safe_dump(config, config_file)
+
+    measurement = run_measured([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cloud_transfer.py'), config_path],
+                               os.path.join(run_directory, 'cloud_transfer.log'))
+    summaries = glob.glob(os.path.join(run_directory, 'logs', 'data_transfer_data_*.json'))
+    summary = read_json(summaries[0]) if summaries else {}
+    latencies = [obj['total_time_seconds'] for obj in summary.get('objects_moved', [])]
+    bytes_moved = sum(obj['bytes'] for obj in summary.get('objects_moved', []))
+    transfer_seconds = summary.get('total_duration_seconds') or measurement['wall_seconds']
+    return {'run': run_name,
+            'src_service': src_service,
+            'dst_service': dst_service,
+            'status': summary.get('status', 'Failed') if measurement['returncode'] == 0 else 'Failed',
+            'objects_moved': len(latencies),
+            'bytes_moved': bytes_moved,
+            'final_unsynced_objects': summary.get('final_unsynced_objects'),
+            'copy_methods': {method: sum(1 for obj in summary.get('objects_moved', []) if obj['copy_method'] == method) for method in {obj['copy_method'] for obj in summary.get('objects_moved', [])}},
+            'transfer_seconds': transfer_seconds,
+            'objects_per_second': len(latencies) / transfer_seconds if transfer_seconds else None,
+            'gigabytes_per_second': bytes_moved / 1073741824 / transfer_seconds if transfer_seconds else None,
+            'latency_p50_seconds': percentile(latencies, 0.5),
+            'latency_p99_seconds': percentile(latencies, 0.99),
+            **measurement}
+
+# Prints how every run of this suite compares with the run of the same name in an earlier results document
+def print_comparison(results, baseline):
+    baseline_runs = {run['run']: run for run in baseline.get('runs', [])}
+    print(f"Compared with {baseline.get('git_commit')} from {time.strftime('%Y-%m-%d %H:%M', time.localtime(baseline.get('start_time_epoch', 0)))}:")
+    if baseline.get('scale') != results['scale'] or baseline.get('transfer_settings') != results['transfer_settings']:
+        print("  (the earlier results were run with a different scale or different transfer settings)")
+    for run in results['runs']:
+        previous = baseline_runs.get(run['run'])
+        if not previous or not previous.get('gigabytes_per_second') or not run.get('gigabytes_per_second'):
+            continue
+        change = 100 * (run['gigabytes_per_second'] / previous['gigabytes_per_second'] - 1)
+        print(f"  {run['run']:<24} {previous['gigabytes_per_second']:.3f} -> {run['gigabytes_per_second']:.3f} GB/s ({change:+.1f}%), "
+              f"p99 {previous['latency_p99_seconds']:.3f} -> {run['latency_p99_seconds']:.3f} s")
+###
+# END: BENCHMARK RUNS
+###
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run full cloud_transfer.py transfers against local S3 and Azure stand-ins and measure their throughput.')
+    parser.add_argument('--profiles', type=str, default='tiny,mixed,huge', help=f"Object size distributions to run, of {', '.join(BENCHMARK_PROFILES)}.")
+    parser.add_argument('--pairs', type=str, default=','.join(DEFAULT_PAIRS), help='Source-destination service pairs to run, e.g. AWS-AWS,LOCAL-AWS.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplies the object counts of every profile.')
+    parser.add_argument('--transfer-settings', type=str, default='{}', help='YAML mapping of transfer settings every run uses, e.g. "{max_workers: 8, server_side_copy: False}".')
+    parser.add_argument('--output-directory', type=str, default='benchmarks', help='Where the results document is saved.')
+    parser.add_argument('--compare', type=str, default=None, help='An earlier results document to compare throughput and latency with.')
+    parser.add_argument('--azurite-command', type=str, default='azurite-blob', help='Command that starts the Azurite blob stand-in.')
+    parser.add_argument('--keep', action='store_true', help='Keep the work directory with the buckets, configs and logs of every run.')
+    args = parser.parse_args()
+
+    profiles = args.profiles.split(',')
+    pairs = [pair.split('-') for pair in args.pairs.split(',')]
+    transfer_settings = yaml.safe_load(args.transfer_settings) or {}
+    work_directory = tempfile.mkdtemp(prefix='dtu-benchmark-')
+    returncode, git_commit, _ = run_command(f"git -C {os.path.dirname(os.path.abspath(__file__))} rev-parse --short HEAD")
+    results = {'git_commit': git_commit.strip() if returncode == 0 else None,
+               'start_time_epoch': int(time.time()),
+               'python_version': sys.version.split()[0],
+               'cpu_count': os.cpu_count(),
+               'scale': args.scale,
+               'transfer_settings': {**BENCHMARK_TRANSFER_SETTINGS, **transfer_settings},
+               'runs': []}
+
+    stand_ins = StandIns(work_directory, args.azurite_command)
+    try:
+        for profile in profiles:
+            sizes = profile_object_sizes(profile, args.scale)
+            print(f"Profile {profile}: {len(sizes)} objects, {sum(sizes)/1073741824:.3f} GB")
+            # Every source service is seeded once per profile and copied from by all pairs that start there
+            seeded_buckets = {}
+            for src_service, dst_service in pairs:
+                if not (stand_ins.available(src_service) and stand_ins.available(dst_service)):
+                    continue
+                if src_service not in seeded_buckets:
+                    seed_config = {'src': stand_in_side(stand_ins, src_service, f"{profile}-src", work_directory)}
+                    create_bucket(seed_config, 'src')
+                    seed_objects(seed_config, sizes)
+                    seeded_buckets[src_service] = f"{profile}-src"
+                run_name = f"{profile}-{src_service.lower()}-{dst_service.lower()}"
+                result = run_benchmark(stand_ins, work_directory, run_name, src_service, dst_service, seeded_buckets[src_service], transfer_settings)
+                result['profile'] = profile
+                results['runs'].append(result)
+                print(f"  {run_name:<24} {result['status']:<9} {result['objects_per_second'] or 0:>9.1f} objects/s {result['gigabytes_per_second'] or 0:>7.3f} GB/s "
+                      f"p50 {result['latency_p50_seconds'] or 0:.3f} s p99 {result['latency_p99_seconds'] or 0:.3f} s "
+                      f"peak memory {result['peak_tree_memory_bytes']/1048576:.0f} MiB CPU {result['cpu_seconds']:.1f} s", flush=True)
+    finally:
+        stand_ins.stop()
+        if not args.keep:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    os.makedirs(args.output_directory, exist_ok=True)
+    results_path = os.path.join(args.output_directory, f"transfer_benchmark_{results['start_time_epoch']}.json")
+    write_json(results_path, results)
+    print(f"Benchmark results saved to {results_path}")
+    if args.compare:
+        print_comparison(results, read_json(args.compare))
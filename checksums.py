@@ -0,0 +1,105 @@
+import math
+import base64
+import hashlib
+
+###
+# BEGIN: ETAGS
+###
+MEBIBYTE = 1048576
+# Part sizes other tools commonly upload with, tried when the ETag of a source object is a multipart ETag
+COMMON_PART_SIZES = [5 * MEBIBYTE, 8 * MEBIBYTE, 16 * MEBIBYTE, 64 * MEBIBYTE]
+
+def is_multipart_etag(etag):
+    return etag is not None and '-' in etag
+
+# S3 multipart ETag: MD5 of the concatenated part MD5 digests followed by the part count
+def multipart_etag(part_digests):
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+# The ETag S3 gives an upload that switches to multipart at part_size, as boto3's upload_fileobj does
+def upload_etag(md5_hex, part_digests, obj_bytes, part_size):
+    return md5_hex if obj_bytes < part_size else multipart_etag(part_digests)
+
+# Part sizes that split obj_bytes into exactly the number of parts a multipart ETag says it has
+def etag_part_size_candidates(obj_bytes, etag, part_sizes=()):
+    part_count = int(etag.rsplit('-', 1)[1])
+    candidates = {part_size for part_size in list(part_sizes) + COMMON_PART_SIZES if part_size and math.ceil(obj_bytes / part_size) == part_count}
+    # Tools that size parts from the object size round them up to whole mebibytes
+    derived_part_size = math.ceil(obj_bytes / part_count / MEBIBYTE) * MEBIBYTE if part_count else 0
+    if derived_part_size and math.ceil(obj_bytes / derived_part_size) == part_count:
+        candidates.add(derived_part_size)
+    return sorted(candidates)
+
+def content_md5_base64(data):
+    return base64.b64encode(hashlib.md5(data).digest()).decode()
+###
+# END: ETAGS
+###
+
+###
+# BEGIN: STREAMING CHECKSUMS
+###
+class ChecksumMismatchError(Exception):
+    pass
+
+class HashingReader:
+    """
+    Wraps a readable stream and hashes the bytes as the upload reads them, so checksums cost no second read.
+
+    Keeps the MD5 of the whole object and, for every part size in part_sizes, the part digests an S3 multipart
+    upload cut at that size would have, which is what multipart ETags are made of.
+    """
+    def __init__(self, stream, part_sizes=()):
+        self.stream = stream
+        self.md5 = hashlib.md5()
+        self.bytes_read = 0
+        self.parts = {part_size: {'digests': [], 'hash': hashlib.md5(), 'filled': 0} for part_size in set(part_sizes)}
+
+    def read(self, size=-1):
+        data = self.stream.read() if size is None or size < 0 else self.stream.read(size)
+        self.update(data)
+        return data
+
+    def update(self, data):
+        self.md5.update(data)
+        self.bytes_read += len(data)
+        for part_size, part in self.parts.items():
+            view = memoryview(data)
+            while view:
+                length = min(len(view), part_size - part['filled'])
+                part['hash'].update(view[:length])
+                part['filled'] += length
+                view = view[length:]
+                if part['filled'] == part_size:
+                    part['digests'].append(part['hash'].digest())
+                    part['hash'] = hashlib.md5()
+                    part['filled'] = 0
+
+    def md5_hex(self):
+        return self.md5.hexdigest()
+
+    def part_digests(self, part_size):
+        part = self.parts[part_size]
+        return part['digests'] + ([part['hash'].digest()] if part['filled'] else [])
+
+    def upload_etag(self, part_size):
+        return upload_etag(self.md5_hex(), self.part_digests(part_size), self.bytes_read, part_size)
+
+    def verify(self, src_etag=None, src_md5_hex=None):
+        """
+        Compares what was read with the checksum the source published: an MD5 (Azure Content-MD5 or a plain S3 ETag)
+        or a multipart ETag, when one of the tracked part sizes reproduces it. Returns True when they match and None
+        when the source has no usable checksum, raises ChecksumMismatchError when the bytes differ.
+        """
+        expected_md5 = src_md5_hex or (src_etag if src_etag and not is_multipart_etag(src_etag) else None)
+        if expected_md5:
+            if expected_md5 != self.md5_hex():
+                raise ChecksumMismatchError(f"MD5 {self.md5_hex()} of the {self.bytes_read} bytes read does not match the source checksum {expected_md5}")
+            return True
+        if is_multipart_etag(src_etag):
+            if any(multipart_etag(self.part_digests(part_size)) == src_etag for part_size in self.parts):
+                return True
+        return None
+###
+# END: STREAMING CHECKSUMS
+###
@@ -3,7 +3,8 @@ import boto3
 import random
 import io
 from botocore.exceptions import NoCredentialsError, ClientError
-from utils import read_config, create_client, list_objects, is_endpoint_healthy
+from utils import read_config
+from storage_drivers import get_storage_driver
 
 ###
 # BEGIN: LOAD IN CONFIGURATIONS
@@ -36,33 +37,35 @@ dst_endpoint_urls = dst_config['src']['endpoint_urls']
 dst_bucket = dst_config['src']['bucket']
 dst_prefix = dst_config['src']['bucket_prefix']
 
+# Both configs keep their side under 'src'
+src_driver = get_storage_driver(src_service, src_config, 'src')
+dst_driver = get_storage_driver(dst_service, dst_config, 'src')
+
 # Filter out unhealthy endpoints
 tmp_endpoint_urls = []
 for src_endpoint_url in src_endpoint_urls:
     print(f'Checking source endpoint: {src_endpoint_url}')
-    src_client = create_client(src_service, src_access_key, src_secret_access_key, src_region, src_endpoint_url)
-    if is_endpoint_healthy(src_service, src_bucket, src_prefix, src_client, isSnow=(src_region=='snow')):
+    if src_driver.is_endpoint_healthy(src_bucket, src_prefix, src_endpoint_url):
         tmp_endpoint_urls.append(src_endpoint_url)
 src_endpoint_urls = tmp_endpoint_urls
         
 tmp_endpoint_urls = []
 for dst_endpoint_url in dst_endpoint_urls:
     print(f'Checking destination endpoint: {dst_endpoint_url}')
-    dst_client = create_client(dst_service, dst_access_key, dst_secret_access_key, dst_region, dst_endpoint_url)
-    if is_endpoint_healthy(dst_service, dst_bucket, dst_prefix, dst_client, isSnow=(dst_region=='snow')):
+    if dst_driver.is_endpoint_healthy(dst_bucket, dst_prefix, dst_endpoint_url):
         tmp_endpoint_urls.append(dst_endpoint_url)
 dst_endpoint_urls = tmp_endpoint_urls
 ###
 # END: LOAD IN CONFIGURATIONS
 ###
 
-# Create a source and destination cloud client
-src_client = create_client(src_service, src_access_key, src_secret_access_key, src_region, src_endpoint_urls[0])
-dst_client = create_client(dst_service, dst_access_key, dst_secret_access_key, dst_region, dst_endpoint_urls[0])
+# Use the first healthy source and destination endpoint
+src_endpoint_url = src_endpoint_urls[0]
+dst_endpoint_url = dst_endpoint_urls[0]
 
 ### Begin Upload
 # Query files/objects within the target bucket prefix
-obj_dict = list_objects(src_service, src_bucket, src_prefix, src_client, isSnow=(src_region=='snow'))
+obj_dict = src_driver.list_objects(src_bucket, src_prefix, src_endpoint_url)
 
 # Take the queried object dictionary and create a list of object keys up to a maximum byte size (sample_size)
 sample_size = 100000000000 # 100gb--> 100*E9
@@ -81,20 +84,18 @@ for key, size in obj_dict.items():
 def process_object(obj_key):
     """
     Retrieves an object from a specified source, randomly corrupts its bytes, and then uploads the corrupted
-    version to a destination. Handles different source and destination services like AWS, Azure, or a custom 'snow' service.
+    version to a destination. The storage drivers handle the source and destination services (AWS or snow, Azure, local files).
     """
     try:
         # Construct the source key with prefix
         src_key = f"{src_prefix}/{obj_key}"
 
-        # Retrieve the object based on the source service type
-        if src_region == 'snow': 
-            object = src_client.meta.client.get_object(Bucket=src_bucket, Key=src_key)["Body"]
-        elif src_service == "AWS":
-            object = src_client.get_object(Bucket=src_bucket, Key=src_key)["Body"]
-        elif src_service == "AZURE":
-            object = src_client.get_blob_client(container=src_bucket, blob=src_key).download_blob()
-        bytedata = bytearray(object.read() if src_service != "AZURE" else object.readall())
+        # Retrieve the object from the source
+        source = src_driver.open_read(src_bucket, src_key, src_endpoint_url)
+        try:
+            bytedata = bytearray(source['body'].read())
+        finally:
+            src_driver.close_read(source)
 
         # Corrupt random bytes in the object
         size = len(bytedata)
@@ -108,13 +109,9 @@ def process_object(obj_key):
         # Construct the destination key with prefix
         dst_key = f"{dst_prefix.rstrip('/')}/{obj_key}".lstrip('/')
 
-        # Upload the corrupted object based on the destination service type
-        if dst_region == 'snow':
-            dst_client.meta.client.upload_fileobj(corrupted_stream, dst_bucket, dst_key)
-        elif dst_service == "AWS":
-            dst_client.upload_fileobj(corrupted_stream, dst_bucket, dst_key)
-        elif dst_service == "AZURE":
-            dst_client.get_blob_client(container=dst_bucket, blob=dst_key).upload_blob(corrupted_stream, overwrite=True)
+        # Upload the corrupted object to the destination
+        dst_driver.write_stream(dst_bucket, dst_key, dst_driver.hashing_reader(corrupted_stream), size, dst_endpoint_url)
+        dst_driver.commit_stream(dst_bucket, dst_key, dst_endpoint_url)
 
         print(f"Corrupted and uploaded {obj_key} to {dst_key}")
     except (NoCredentialsError, ClientError) as e:
@@ -1,93 +1,368 @@
 import argparse
 import urllib3
 import time
-from utils import read_config, create_client, update_json
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from azure.core.exceptions import HttpResponseError
+from botocore.exceptions import ClientError
+from utils import read_config, update_json, get_transfer_setting
+from transfer_events import append_transfer_event
+from transfer_journal import TransferJournal
+from transfer_retry import TransferAttemptError, classify_error
+from transfer_planner import choose_copy_strategy
+from storage_drivers import get_storage_driver
+from transfer_trace import trace_span, enable_tracing
+from rate_limiter import RateLimitedStream
+from checksums import ChecksumMismatchError, is_multipart_etag, etag_part_size_candidates
 
 # Suppress InsecureRequestWarning
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 ###
-# BEGIN: LOAD IN CONFIGURATIONS
+# BEGIN: WORKER PROCESS STATE
 ###
+# Each worker process loads the config once, its clients come from the per-process cache in utils and are reused for every object it is handed.
+worker_config = None
+# Storage drivers of both sides by (side, service), built on first use
+worker_drivers = {}
+worker_endpoint_urls = {'src': [], 'dst': []}
+# Journal of the transfer, large objects record their multipart upload and finished parts here so a restart can continue them
+worker_journal = None
+# Set once a backend rejects server-side copies so this worker stops attempting them
+worker_server_side_copy_unsupported = False
+# Token buckets shared by all processes of the transfer, None when no bytes/s or requests/s limit is configured
+worker_rate_limiter = None
 
-parser = argparse.ArgumentParser(description='Copy a specific object from one bucket to another.')
-parser.add_argument('src_service', type=str, help='The source cloud service.')
-parser.add_argument('dst_service', type=str, help='The destination cloud service.')
+# Initializer for long-lived worker processes, also used by the single object command line entry point
+# src_endpoint_urls/dst_endpoint_urls are the healthy endpoints large objects may spread their byte ranges over,
+# trace_path is the trace event log of the transfer when it is traced, rate_limiter is inherited from the dispatcher by the fork
+def init_worker(config_path, src_endpoint_urls=None, dst_endpoint_urls=None, journal_path=None, trace_path=None, rate_limiter=None):
+    global worker_config, worker_journal, worker_rate_limiter
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    worker_config = read_config(config_path)
+    if not worker_config:
+        raise ValueError(f"Failed to read the configuration: {config_path}")
+    worker_drivers.clear()
+    worker_endpoint_urls['src'] = list(src_endpoint_urls or [])
+    worker_endpoint_urls['dst'] = list(dst_endpoint_urls or [])
+    worker_journal = TransferJournal(journal_path) if journal_path else None
+    if trace_path:
+        enable_tracing(trace_path, 'worker')
+    worker_rate_limiter = rate_limiter
 
-parser.add_argument('src_bucket', type=str, help='The source bucket name.')
-parser.add_argument('dst_bucket', type=str, help='The destination bucket name.')
+# Waits until bytes and requests fit the configured limits of the job and of endpoint_urls
+def limit_rate(endpoint_urls, bytes=0, requests=0, job_bytes=None):
+    if worker_rate_limiter is not None:
+        worker_rate_limiter.acquire(endpoint_urls, bytes, requests, job_bytes)
 
-parser.add_argument('src_key', type=str, help='The source object key to copy.')
-parser.add_argument('dst_key', type=str, help='The destination object key for the copied object.')
-parser.add_argument('bytes', type=int, help='The total size of the object in bytes')
+# Returns the storage driver of a side ('src' or 'dst') for a service, creating it on first use
+def get_worker_driver(side, service):
+    if (side, service) not in worker_drivers:
+        worker_drivers[(side, service)] = get_storage_driver(service, worker_config, side)
+    return worker_drivers[(side, service)]
+###
+# END: WORKER PROCESS STATE
+###
 
-parser.add_argument('src_endpoint_url', type=str, help='The source endpoint url for the copied object.')
-parser.add_argument('dst_endpoint_url', type=str, help='The destination endpoint url for the copied object.')
+###
+# BEGIN: SINGLE STREAM COPY
+###
+def stream_copy(src_driver, dst_driver, src_bucket, dst_bucket, src_key, dst_key, src_endpoint_url, dst_endpoint_url):
+    """Copy an object over a single GET stream piped straight into the destination upload.
 
-parser.add_argument('data_transfer_data_json_dir', type=str, help='The data transfer json file that we are saving transfer statistics to.')
-parser.add_argument('config', type=str, help='The configuration file we are using in our transfer.')
+    The bytes are hashed on their way through and checked against the source checksum, returns the checksums of the copy.
+    """
+    # Stream the object directly directly from the source, the span ends with the response headers (time to first byte)
+    limit_rate([src_endpoint_url], requests=1)
+    with trace_span('open_source', 'stream', key=src_key, endpoint_url=src_endpoint_url):
+        source = src_driver.open_read(src_bucket, src_key, src_endpoint_url)
+    part_sizes = set()
+    if is_multipart_etag(source['etag']):
+        part_sizes.update(etag_part_size_candidates(source['bytes'], source['etag'], [get_transfer_setting(worker_config, 'multipart_part_size_bytes')]))
+    # Every chunk the upload pulls through the stream passes both endpoints, a limit paces the whole pipe.
+    # Each further upload part costs the destination a request once the stream reaches it.
+    body = source['body']
+    if worker_rate_limiter is not None:
+        body = RateLimitedStream(body, worker_rate_limiter, [src_endpoint_url, dst_endpoint_url], dst_driver.stream_part_size, [dst_endpoint_url])
+    reader = dst_driver.hashing_reader(body, part_sizes)
 
+    # Upload the streamed object to the destination, larger objects go up as one request per stream part
+    try:
+        limit_rate([dst_endpoint_url], requests=1)
+        with trace_span('stream_upload', 'stream', key=dst_key, bytes=source['bytes'], endpoint_url=dst_endpoint_url):
+            dst_etag = dst_driver.write_stream(dst_bucket, dst_key, reader, source['bytes'], dst_endpoint_url)
+    finally:
+        src_driver.close_read(source)
 
-args = parser.parse_args()
+    try:
+        checksum_verified = reader.verify(source['etag'], source['md5_hex'])
+    except ChecksumMismatchError:
+        # Do not leave an object of the right size but the wrong content behind, it would look synced
+        dst_driver.discard_stream(dst_bucket, dst_key, dst_endpoint_url)
+        raise
+    dst_driver.commit_stream(dst_bucket, dst_key, dst_endpoint_url)
+    return {'md5': reader.md5_hex(), 'dst_etag': dst_etag, 'checksum_verified': checksum_verified}
+###
+# END: SINGLE STREAM COPY
+###
+
+###
+# BEGIN: PARALLEL RANGED MULTIPART COPY
+###
+# Grows the part size so an object stays under the service part limit
+def effective_part_size(obj_bytes, part_size, max_parts):
+    if not max_parts:
+        return part_size
+    return max(part_size, math.ceil(obj_bytes / max_parts))
 
-config = read_config(args.config)
+# Splits an object into (part_number, offset, length) byte ranges of part_size
+def plan_byte_ranges(obj_bytes, part_size):
+    return [(part_number, offset, min(part_size, obj_bytes - offset)) for part_number, offset in enumerate(range(0, obj_bytes, part_size), start=1)]
 
-if not config:
-    print("Failed to read the configuration.")
-    quit()
+# Picks the endpoint a byte range goes through, spreading consecutive ranges across the healthy endpoints
+def range_endpoint_url(side, assigned_endpoint_url, part_number):
+    endpoint_urls = worker_endpoint_urls[side]
+    if not get_transfer_setting(worker_config, 'multipart_spread_endpoints') or assigned_endpoint_url not in endpoint_urls:
+        return assigned_endpoint_url
+    return endpoint_urls[(endpoint_urls.index(assigned_endpoint_url) + part_number - 1) % len(endpoint_urls)]
 
-src_region = config["src"]["region"]
-src_access_key = config['src']['access_key']
-src_secret_access_key = config['src']['secret_access_key']
+# Runs copy_range over the byte ranges in parallel, journaling every part as it finishes
+# Returns {part_number: etag} for the ranges it copied
+def copy_byte_ranges(copy_range, byte_ranges, src_key):
+    copied_parts = {}
+    with ThreadPoolExecutor(max_workers=get_transfer_setting(worker_config, 'multipart_max_concurrency')) as executor:
+        futures = [executor.submit(copy_range, byte_range) for byte_range in byte_ranges]
+        for future in as_completed(futures):
+            part_number, etag = future.result()
+            copied_parts[part_number] = etag
+            # Journal writes stay on this thread, the journal connection is not shared with the range threads
+            if worker_journal:
+                worker_journal.record_part(src_key, part_number, etag)
+    return copied_parts
 
-dst_region = config["dst"]["region"]
-dst_access_key = config['dst']['access_key']
-dst_secret_access_key = config['dst']['secret_access_key']
+# Copies the byte ranges an opened upload is still missing and commits it, returns the checksums of the copy
+def copy_parts(dst_driver, upload, uploaded_parts, byte_ranges, copy_range, src_key):
+    try:
+        uploaded_parts.update(copy_byte_ranges(copy_range, [byte_range for byte_range in byte_ranges if byte_range[0] not in uploaded_parts], src_key))
+    except Exception:
+        # The parts are kept when the journal keeps track of them, so a later attempt or a resumed run can continue the upload
+        dst_driver.abort_parts(upload, keep_parts=worker_journal is not None)
+        raise
+    with trace_span('complete_parts', 'part', parts=len(byte_ranges)):
+        dst_etag = dst_driver.complete_parts(upload, [(part_number, uploaded_parts[part_number]) for part_number, _, _ in byte_ranges])
+    # The completed upload is gone at the destination, nothing is left for a later attempt or run to continue or abort
+    if worker_journal:
+        worker_journal.clear_multipart(src_key)
+    return {'md5': None, 'dst_etag': dst_etag}
+
+def multipart_copy(src_driver, dst_driver, src_bucket, dst_bucket, src_key, dst_key, obj_bytes, src_endpoint_url, dst_endpoint_url):
+    """Copy a large object as byte ranges fetched in parallel and written as S3 multipart parts, Azure staged blocks or at their offsets in a local file.
+
+    Every part is uploaded with its MD5 for the service to check, returns the checksums of the copy.
+    """
+    part_size = effective_part_size(obj_bytes, get_transfer_setting(worker_config, 'multipart_part_size_bytes'), dst_driver.max_parts)
+    byte_ranges = plan_byte_ranges(obj_bytes, part_size)
+    # Opening and completing the upload
+    limit_rate([dst_endpoint_url], requests=2)
+    with trace_span('open_parts', 'part', key=dst_key, part_size=part_size):
+        upload, uploaded_parts = dst_driver.open_parts(dst_bucket, dst_key, obj_bytes, part_size, dst_endpoint_url, worker_journal, src_key)
+
+    def copy_range(byte_range):
+        part_number, offset, length = byte_range
+        src_range_endpoint_url = range_endpoint_url('src', src_endpoint_url, part_number)
+        dst_range_endpoint_url = range_endpoint_url('dst', dst_endpoint_url, part_number)
+        limit_rate([src_range_endpoint_url], bytes=length, requests=1)
+        with trace_span('read_range', 'part', part_number=part_number, bytes=length, endpoint_url=src_range_endpoint_url):
+            data = src_driver.read_range(src_bucket, src_key, offset, length, src_range_endpoint_url)
+        limit_rate([dst_range_endpoint_url], bytes=length, requests=1, job_bytes=0)
+        with trace_span('write_part', 'part', part_number=part_number, bytes=length, endpoint_url=dst_range_endpoint_url):
+            return part_number, dst_driver.write_part(upload, part_number, offset, data, dst_range_endpoint_url)
+
+    return copy_parts(dst_driver, upload, uploaded_parts, byte_ranges, copy_range, src_key)
 ###
-# END: LOAD IN CONFIGURATIONS
+# END: PARALLEL RANGED MULTIPART COPY
 ###
 
-# Record the start time
-start_time = time.time()
+###
+# BEGIN: SERVER-SIDE COPY
+###
+# Error codes of a backend that cannot perform server-side copies at all, the worker stops trying them
+SERVER_SIDE_COPY_UNSUPPORTED_CODES = {'NotImplemented', 'XNotImplemented', 'FeatureNotSupported'}
+# Error codes of a copy the destination may not make of this one object, a missing grant or an object it cannot read
+SERVER_SIDE_COPY_DENIED_CODES = {'AccessDenied', 'InvalidRequest', 'CannotVerifyCopySource', 'AuthorizationFailure', 'AuthorizationPermissionMismatch'}
 
-# create our source and destination cloud clients so we can interact with our buckets
-src_client = create_client(args.src_service, src_access_key, src_secret_access_key, src_region, args.src_endpoint_url)
-dst_client = create_client(args.dst_service, dst_access_key, dst_secret_access_key, dst_region, args.dst_endpoint_url)
+def server_side_copy_error_code(error):
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code')
+    if isinstance(error, HttpResponseError):
+        return error.error_code
+    return None
 
-# Stream the object directly directly from the source
-if src_region == 'snow': 
-    object = src_client.meta.client.get_object(Bucket=args.src_bucket, Key=args.src_key)["Body"]
-elif args.src_service == "AWS":
-    object = src_client.get_object(Bucket=args.src_bucket, Key=args.src_key)["Body"]
-elif args.src_service == "AZURE":
-    object = src_client.get_blob_client(container = args.src_bucket, blob=args.src_key).download_blob()
+def server_side_copy_fallback(error, dst_key):
+    """Returns why a failed server-side copy is made by moving the bytes instead, 'unsupported' or 'denied', or None when it is a real failure.
 
-# Upload the streamed object to the destination
-if dst_region == 'snow':
-    dst_client.meta.client.upload_fileobj(object, args.dst_bucket, args.dst_key)
-elif args.dst_service == "AWS":
-    dst_client.upload_fileobj(object, args.dst_bucket, args.dst_key)
-elif args.dst_service == "AZURE":
-    dst_client.get_blob_client(container=args.dst_bucket, blob=args.dst_key).upload_blob(object, overwrite=True)
+    An unsupported copy is not tried again by this worker, a denied one only falls back for this object.
+    """
+    global worker_server_side_copy_unsupported
+    error_code = server_side_copy_error_code(error)
+    if error_code in SERVER_SIDE_COPY_UNSUPPORTED_CODES:
+        print(f"Server-side copy is not available ({error}), falling back to streaming through this host.")
+        worker_server_side_copy_unsupported = True
+        return 'unsupported'
+    if error_code in SERVER_SIDE_COPY_DENIED_CODES:
+        print(f"Server-side copy of '{dst_key}' was refused ({error}), streaming this object through this host.")
+        return 'denied'
+    return None
 
-# Record the end time
-end_time = time.time()
+def server_side_copy(src_driver, dst_driver, src_bucket, dst_bucket, src_key, dst_key, obj_bytes, src_endpoint_url, dst_endpoint_url):
+    """Have the destination copy the object from the source itself, no bytes pass through this host.
 
-# Calculate and print the elapsed time
-elapsed_time = end_time - start_time
-print(f"Object '{args.src_key}' has been copied to '{args.dst_key}' in {elapsed_time:.2f} seconds using {args.src_endpoint_url} to {args.dst_endpoint_url}.")
+    Large objects are copied as parallel byte ranges where the destination supports that (upload_part_copy), returns
+    the checksums of the copy. Errors are raised, server_side_copy_fallback tells the ones the caller moves the bytes for.
+    """
+    if dst_driver.server_side_part_copy and obj_bytes >= min(get_transfer_setting(worker_config, 'multipart_threshold_bytes'), dst_driver.copy_object_max_bytes):
+        part_size = effective_part_size(obj_bytes, get_transfer_setting(worker_config, 'server_side_copy_part_size_bytes'), dst_driver.max_parts)
+        byte_ranges = plan_byte_ranges(obj_bytes, part_size)
+        limit_rate([dst_endpoint_url], requests=2)
+        with trace_span('open_parts', 'part', key=dst_key, part_size=part_size):
+            upload, uploaded_parts = dst_driver.open_parts(dst_bucket, dst_key, obj_bytes, part_size, dst_endpoint_url, worker_journal, src_key)
 
+        # Copied bytes never cross the link, they only count against the endpoint doing the copy
+        def copy_range(byte_range):
+            part_number, offset, length = byte_range
+            dst_range_endpoint_url = range_endpoint_url('dst', dst_endpoint_url, part_number)
+            limit_rate([dst_range_endpoint_url], bytes=length, requests=1, job_bytes=0)
+            with trace_span('copy_part', 'part', part_number=part_number, bytes=length, endpoint_url=dst_range_endpoint_url):
+                return part_number, dst_driver.copy_part(upload, part_number, offset, length, src_bucket, src_key, dst_range_endpoint_url)
+
+        return copy_parts(dst_driver, upload, uploaded_parts, byte_ranges, copy_range, src_key)
+    limit_rate([dst_endpoint_url], bytes=obj_bytes, requests=1, job_bytes=0)
+    return {'md5': None, 'dst_etag': dst_driver.copy_object(src_driver, src_bucket, src_key, dst_bucket, dst_key, src_endpoint_url, dst_endpoint_url)}
+
+def dedup_copy(dst_driver, dst_bucket, dedup_key, dst_key, obj_bytes, dst_endpoint_url):
+    """Create an object by a server-side copy of dedup_key, a destination object that already holds the same content.
+
+    Returns the checksums of the copy, or None when it could not be made and the object has to come from the source.
+    """
+    if worker_server_side_copy_unsupported or not dst_driver.can_copy_from(dst_driver, dst_endpoint_url, dst_endpoint_url):
+        return None
+    try:
+        with trace_span('dedup_copy', 'object', key=dst_key, dedup_key=dedup_key, bytes=obj_bytes):
+            return server_side_copy(dst_driver, dst_driver, dst_bucket, dst_bucket, dedup_key, dst_key, obj_bytes, dst_endpoint_url, dst_endpoint_url)
+    except Exception as e:
+        if server_side_copy_fallback(e, dst_key) is None:
+            print(f"Deduplicated copy of '{dst_key}' from '{dedup_key}' failed ({e}), copying it from the source instead.")
+        return None
 ###
-# BEGIN: SAVE FINISHING COMPLETION INFORMATION TO JSON
-###
-new_data_transfer_data_dict = {'objects_moved': [{'src_key': args.src_key,
-                                    'dst_key': args.dst_key,
-                                    'bytes': args.bytes,
-                                    'equivalent_gigabytes': float(f"{(args.bytes/1073741824):.3f}"),
-                                    'epoch_time_start': int(start_time),
-                                    'epoch_time_end': int(end_time),
-                                    'total_time_seconds': elapsed_time}]}
-update_json(args.data_transfer_data_json_dir, new_data_transfer_data_dict)
-###
-# END: SAVE FINISHING COMPLETION INFORMATION TO JSON
+# END: SERVER-SIDE COPY
 ###
+
+def sync_obj(src_service, dst_service, src_bucket, dst_bucket, src_key, dst_key, obj_bytes, src_endpoint_url, dst_endpoint_url, data_transfer_events_path=None, src_etag=None, dedup_key=None):
+    """Copy a single object from the source to the destination using this process's cached clients.
+
+    The finished object is appended to data_transfer_events_path when given and returned either way.
+    src_etag is the source ETag from the listing, a copy whose destination ETag matches it is verified.
+    dedup_key is a destination object with the same content, the object is copied from it server-side when possible.
+    """
+    # Record the start time
+    start_time = time.time()
+
+    fallback = None
+    try:
+        with trace_span('copy_object', 'object', key=src_key, bytes=obj_bytes, src_endpoint_url=src_endpoint_url, dst_endpoint_url=dst_endpoint_url) as span:
+            src_driver = get_worker_driver('src', src_service)
+            dst_driver = get_worker_driver('dst', dst_service)
+            checksums = dedup_copy(dst_driver, dst_bucket, dedup_key, dst_key, obj_bytes, dst_endpoint_url) if dedup_key is not None else None
+            if checksums is not None:
+                copy_method = 'dedup'
+            else:
+                # The fastest path both drivers support: server-side when the destination can copy from the source itself,
+                # parallel byte ranges for large objects so a single object is not limited to one GET connection, a stream otherwise
+                copy_method = choose_copy_strategy(src_driver, dst_driver, src_endpoint_url, dst_endpoint_url, obj_bytes, worker_config, worker_server_side_copy_unsupported)
+                if copy_method == 'server_side':
+                    try:
+                        with trace_span('server_side_copy', 'object', key=src_key, bytes=obj_bytes):
+                            checksums = server_side_copy(src_driver, dst_driver, src_bucket, dst_bucket, src_key, dst_key, obj_bytes, src_endpoint_url, dst_endpoint_url)
+                    except Exception as e:
+                        fallback = server_side_copy_fallback(e, dst_key)
+                        if fallback is None:
+                            raise
+                        copy_method = choose_copy_strategy(src_driver, dst_driver, src_endpoint_url, dst_endpoint_url, obj_bytes, worker_config, server_side_copy_unsupported=True)
+            span.set(copy_method=copy_method)
+            if copy_method == 'multipart':
+                checksums = multipart_copy(src_driver, dst_driver, src_bucket, dst_bucket, src_key, dst_key, obj_bytes, src_endpoint_url, dst_endpoint_url)
+            elif copy_method == 'stream':
+                checksums = stream_copy(src_driver, dst_driver, src_bucket, dst_bucket, src_key, dst_key, src_endpoint_url, dst_endpoint_url)
+    except Exception as e:
+        # Classified here where the service error is still at hand, the dispatcher decides whether to retry the object
+        raise TransferAttemptError(f"Copy of '{src_key}' to '{dst_key}' using {src_endpoint_url} to {dst_endpoint_url} failed: {e}", classify_error(e)) from None
+    if not checksums.get('checksum_verified'):
+        checksums['checksum_verified'] = True if src_etag and checksums['dst_etag'] == src_etag else None
+
+    # Record the end time
+    end_time = time.time()
+
+    # Calculate and print the elapsed time
+    elapsed_time = end_time - start_time
+    print(f"Object '{src_key}' has been copied to '{dst_key}' in {elapsed_time:.2f} seconds using {src_endpoint_url} to {dst_endpoint_url} ({copy_method}).")
+
+    ###
+    # BEGIN: SAVE FINISHING COMPLETION INFORMATION TO EVENT LOG
+    ###
+    object_moved = {'src_key': src_key,
+                    'dst_key': dst_key,
+                    'bytes': obj_bytes,
+                    'equivalent_gigabytes': float(f"{(obj_bytes/1073741824):.3f}"),
+                    'epoch_time_start': int(start_time),
+                    'epoch_time_end': int(end_time),
+                    'total_time_seconds': elapsed_time,
+                    'copy_method': copy_method,
+                    'src_endpoint_url': src_endpoint_url,
+                    'dst_endpoint_url': dst_endpoint_url,
+                    'md5': checksums['md5'],
+                    'dst_etag': checksums['dst_etag'],
+                    'checksum_verified': checksums['checksum_verified'],
+                    'dedup_key': dedup_key if copy_method == 'dedup' else None,
+                    'server_side_copy_fallback': fallback}
+    if data_transfer_events_path:
+        append_transfer_event(data_transfer_events_path, object_moved)
+    ###
+    # END: SAVE FINISHING COMPLETION INFORMATION TO EVENT LOG
+    ###
+    return object_moved
+
+if __name__ == '__main__':
+    ###
+    # BEGIN: LOAD IN CONFIGURATIONS
+    ###
+    parser = argparse.ArgumentParser(description='Copy a specific object from one bucket to another.')
+    parser.add_argument('src_service', type=str, help='The source cloud service.')
+    parser.add_argument('dst_service', type=str, help='The destination cloud service.')
+
+    parser.add_argument('src_bucket', type=str, help='The source bucket name.')
+    parser.add_argument('dst_bucket', type=str, help='The destination bucket name.')
+
+    parser.add_argument('src_key', type=str, help='The source object key to copy.')
+    parser.add_argument('dst_key', type=str, help='The destination object key for the copied object.')
+    parser.add_argument('bytes', type=int, help='The total size of the object in bytes')
+
+    parser.add_argument('src_endpoint_url', type=str, help='The source endpoint url for the copied object.')
+    parser.add_argument('dst_endpoint_url', type=str, help='The destination endpoint url for the copied object.')
+
+    parser.add_argument('data_transfer_data_json_dir', type=str, help='The data transfer json file that we are saving transfer statistics to.')
+    parser.add_argument('config', type=str, help='The configuration file we are using in our transfer.')
+
+    args = parser.parse_args()
+
+    try:
+        init_worker(args.config)
+    except ValueError as e:
+        print(e)
+        quit()
+    ###
+    # END: LOAD IN CONFIGURATIONS
+    ###
+
+    object_moved = sync_obj(args.src_service, args.dst_service, args.src_bucket, args.dst_bucket, args.src_key, args.dst_key, args.bytes, args.src_endpoint_url, args.dst_endpoint_url)
+    # Run on its own there is no aggregator, so the summary document is updated directly
+    update_json(args.data_transfer_data_json_dir, {'objects_moved': [object_moved]})
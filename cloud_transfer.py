@@ -1,7 +1,25 @@
 import argparse
-from utils import read_config, is_endpoint_healthy, list_objects, write_json, update_json, create_client
-import subprocess
-from concurrent.futures import ThreadPoolExecutor, wait
+from utils import read_config, get_transfer_setting, write_json
+from cloud_sync_obj import init_worker, sync_obj
+from storage_drivers import get_storage_driver
+from concurrency_controller import AdaptiveConcurrency
+from endpoint_scheduler import EndpointScheduler
+from transfer_planner import TransferPlan, print_transfer_plan, copy_strategy_summary
+from transfer_progress import TransferProgress
+from transfer_events import TransferSummary
+from transfer_journal import TransferJournal, transfer_journal_path
+from transfer_retry import TransferRetry
+from listing_index import ListingIndex, ShardCache, listing_index_path, is_object_synced
+from dedup_index import DedupIndex, dedup_index_path, content_hash
+from compact_listing import CompactListing, diff_listings
+from listing_pipeline import ListingPipeline, prefetch_pages, merge_join_listings
+from transfer_trace import trace_span, enable_tracing, trace_events_path_for, export_chrome_trace
+from transfer_metrics import transfer_metrics_registry, expose_metrics
+from rate_limiter import create_rate_limiter
+from work_queue import WorkQueue, create_work_queue_backend, work_queue_job_id, partition_work_units
+from transfer_estimator import ThroughputHistory, size_histogram, estimate_transfer, print_transfer_estimate
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
 import time
 import os
 
@@ -10,6 +28,11 @@ import os
 ###
 parser = argparse.ArgumentParser(description='Using a config.yaml move data between storage environments')
 parser.add_argument('config', type=str, help='The config.yaml that specifies your data transfer.')
+parser.add_argument('--resume', action='store_true', help='Continue the interrupted run of this config from its transfer journal instead of listing both sides again.')
+parser.add_argument('--plan', action='store_true', help='List and diff both sides without copying, print the objects to move and an estimated duration from earlier transfers.')
+distributed_mode = parser.add_mutually_exclusive_group()
+distributed_mode.add_argument('--coordinator', action='store_true', help='List and diff, publish the objects to move as work units and copy them together with --worker hosts.')
+distributed_mode.add_argument('--worker', action='store_true', help='Copy the work units published by the --coordinator of the same config, without listing.')
 args = parser.parse_args()
 
 config = read_config(args.config)
@@ -35,25 +58,148 @@ dst_endpoint_urls = config['dst']['endpoint_urls']
 
 log_local_directory = config['log']['local_directory']
 
-# Filter out unhealthy endpoints
+# Spans of every phase and object are appended to one trace event log by the dispatcher and all workers
+trace_path = None
+if get_transfer_setting(config, 'trace_transfers'):
+    os.makedirs(log_local_directory, exist_ok=True)
+    trace_path = trace_events_path_for(log_local_directory, time.time())
+    enable_tracing(trace_path, 'dispatcher')
+
+# Full object keys on each side for a key relative to the bucket prefixes
+def src_object_key(obj_key):
+    return f"{src_prefix.rstrip('/')}/{obj_key}".lstrip('/')
+
+def dst_object_key(obj_key):
+    return f"{dst_prefix.rstrip('/')}/{obj_key}".lstrip('/')
+
+# The key relative to the destination prefix of a full destination key, None when it is outside the prefix
+def dst_relative_key(dst_key):
+    prefix = dst_prefix.strip('/')
+    if not prefix:
+        return dst_key
+    return dst_key[len(prefix) + 1:] if dst_key.startswith(prefix + '/') else None
+
+# Everything service specific goes through the storage driver of each side
+src_driver = get_storage_driver(src_service, config, 'src')
+dst_driver = get_storage_driver(dst_service, config, 'dst')
+
+# Filter out unhealthy endpoints, all healthy ones are listed through
 tmp_endpoint_urls = []
 for src_endpoint_url in src_endpoint_urls:
     print(f'Checking source endpoint: {src_endpoint_url}')
-    src_client = create_client(src_service, src_access_key, src_secret_access_key, src_region, src_endpoint_url)
-    if is_endpoint_healthy(src_service, src_bucket, src_prefix, src_client, isSnow=(src_region=='snow')):
+    with trace_span('health_check', 'setup', side='src', endpoint_url=src_endpoint_url) as span:
+        healthy = src_driver.is_endpoint_healthy(src_bucket, src_prefix, src_endpoint_url)
+        span.set(healthy=healthy)
+    if healthy:
         tmp_endpoint_urls.append(src_endpoint_url)
 src_endpoint_urls = tmp_endpoint_urls
         
 tmp_endpoint_urls = []
 for dst_endpoint_url in dst_endpoint_urls:
     print(f'Checking destination endpoint: {dst_endpoint_url}')
-    dst_client = create_client(dst_service, dst_access_key, dst_secret_access_key, dst_region, dst_endpoint_url)
-    if is_endpoint_healthy(dst_service, dst_bucket, dst_prefix, dst_client, isSnow=(dst_region=='snow')):
+    with trace_span('health_check', 'setup', side='dst', endpoint_url=dst_endpoint_url) as span:
+        healthy = dst_driver.is_endpoint_healthy(dst_bucket, dst_prefix, dst_endpoint_url)
+        span.set(healthy=healthy)
+    if healthy:
         tmp_endpoint_urls.append(dst_endpoint_url)
 dst_endpoint_urls = tmp_endpoint_urls
 
-max_workers = os.cpu_count()//3
+# Lists a side in parallel shards across all its healthy endpoints, shards a shard_cache still has are not listed again
+def list_side_objects(driver, bucket, prefix, endpoint_urls, shard_cache=None, progress=None):
+    return driver.list_objects_parallel(bucket, prefix, endpoint_urls, details=True,
+                                        max_workers=get_transfer_setting(config, 'listing_workers'),
+                                        target_shards=get_transfer_setting(config, 'listing_shards'),
+                                        shard_cache=shard_cache, progress=progress)
+
+# Keeps the listed_objects gauge of a side current while it is listed, shard by shard
+def listed_objects_progress(side):
+    return lambda listed_objects: metrics.set('listed_objects', listed_objects, side=side)
+
+###
+# BEGIN: PLAN WITHOUT COPYING
+###
+# Lists and diffs like a transfer, then prints what it would copy and how long that should take from the earlier transfer logs.
+# Nothing is copied and no journal or transfer log is written, the plan goes to its own transfer_plan_*.json.
+if args.plan:
+    plan_start_time = time.time()
+    with trace_span('list_source', 'listing', endpoint_urls=src_endpoint_urls):
+        src_listing = CompactListing.from_listing(list_side_objects(src_driver, src_bucket, src_prefix, src_endpoint_urls))
+    dst_listing_start_time = time.time()
+    with trace_span('list_destination', 'listing', endpoint_urls=dst_endpoint_urls):
+        dst_listing = CompactListing.from_listing(list_side_objects(dst_driver, dst_bucket, dst_prefix, dst_endpoint_urls))
+    dst_listing_seconds = time.time() - dst_listing_start_time
+    # The destination index only knows the source versions of earlier copies, it is read but not refreshed
+    dst_index_path = listing_index_path(get_transfer_setting(config, 'journal_directory'), dst_service, dst_bucket, dst_prefix)
+    source_etags = ListingIndex(dst_index_path).source_etags() if get_transfer_setting(config, 'listing_index') and os.path.exists(dst_index_path) else {}
+    synced_objects, synced_bytes, objects_not_synced = diff_listings(src_listing, dst_listing, source_etags)
+    # A transfer lists both sides and then the destination again to verify
+    listing_seconds = time.time() - plan_start_time + dst_listing_seconds
+
+    transfer_plan_summary = {**TransferPlan(objects_not_synced, config).summary(),
+                             'copy_strategies': copy_strategy_summary(src_driver, dst_driver, src_endpoint_urls, dst_endpoint_urls, config)}
+    history = ThroughputHistory(config, src_service, dst_service, src_endpoint_urls, dst_endpoint_urls).load(log_local_directory)
+    histogram = size_histogram(objects_not_synced)
+    estimate = estimate_transfer(transfer_plan_summary, history, src_driver, dst_driver, src_endpoint_urls, dst_endpoint_urls, config, listing_seconds)
+    print(f"{synced_objects} objects already synced, {len(objects_not_synced)} objects ({sum(objects_not_synced.values())/1073741824:.3f} GB) to move.")
+    print_transfer_plan(transfer_plan_summary)
+    print_transfer_estimate(histogram, estimate)
+
+    os.makedirs(log_local_directory, exist_ok=True)
+    transfer_plan_json_dir = os.path.join(log_local_directory, f"transfer_plan_{int(plan_start_time)}.json")
+    write_json(transfer_plan_json_dir, {"src_service": src_service,
+                                        "src_bucket": src_bucket,
+                                        "src_prefix": src_prefix,
+                                        "src_endpoint_urls": src_endpoint_urls,
+                                        "dst_service": dst_service,
+                                        "dst_bucket": dst_bucket,
+                                        "dst_prefix": dst_prefix,
+                                        "dst_endpoint_urls": dst_endpoint_urls,
+                                        "plan_time_epoch": int(plan_start_time),
+                                        "synced_objects": synced_objects,
+                                        "objects_to_move": len(objects_not_synced),
+                                        "bytes_to_move": sum(objects_not_synced.values()),
+                                        "size_histogram": histogram,
+                                        "transfer_plan": transfer_plan_summary,
+                                        "estimate": estimate})
+    print(f"Transfer plan saved to {transfer_plan_json_dir}")
+    if trace_path is not None:
+        print(f"Transfer trace saved to {export_chrome_trace(trace_path)}, open it in ui.perfetto.dev")
+    exit()
+###
+# END: PLAN WITHOUT COPYING
+###
+
+# The number of objects in flight is steered between min_workers and max_workers by measured throughput and throttling
+min_workers = get_transfer_setting(config, 'min_workers')
+max_workers = get_transfer_setting(config, 'max_workers')
+initial_workers = get_transfer_setting(config, 'initial_workers') or os.cpu_count()//3
+concurrency = AdaptiveConcurrency(min_workers, max_workers, initial_workers,
+                                  interval_seconds=get_transfer_setting(config, 'concurrency_interval_seconds'),
+                                  adaptive=get_transfer_setting(config, 'adaptive_concurrency'))
 start_time = time.time()
+
+# The journal of this config, a distributed transfer keeps its state in the work queue instead
+journal_path = None
+if get_transfer_setting(config, 'transfer_journal') and not (args.coordinator or args.worker):
+    journal_path = transfer_journal_path(get_transfer_setting(config, 'journal_directory'), src_service, src_bucket, src_prefix, dst_service, dst_bucket, dst_prefix)
+
+# Bytes/s and requests/s limits of the job and of every endpoint, token buckets in shared memory that the forked workers inherit
+rate_limiter = create_rate_limiter(config, src_endpoint_urls + dst_endpoint_urls)
+
+# Move objects with a pool of long-lived worker processes, this is necessary to avoid GIL bottleneck.
+# Each worker loads the config once and creates its clients on its first object instead of paying interpreter startup for every object.
+# Workers are forked so they inherit the already imported modules instead of re-running this script. A forked pool starts all
+# its processes on the first submit, so it is sized to the most objects the controller can ever allow in flight and started
+# right here, before the metrics server, listing prefetch and pool manager threads exist that a fork would copy mid-operation.
+executor = ProcessPoolExecutor(max_workers=concurrency.ceiling if concurrency.adaptive else concurrency.limit, mp_context=multiprocessing.get_context('fork'),
+                               initializer=init_worker, initargs=(args.config, src_endpoint_urls, dst_endpoint_urls, journal_path, trace_path, rate_limiter))
+executor.submit(os.getpid).result()
+
+# Live counters for Prometheus, updated by the dispatcher as objects complete and read from memory on every scrape
+metrics = transfer_metrics_registry()
+metrics.set('start_time_seconds', int(start_time))
+refresh_metrics_textfile = expose_metrics(metrics, get_transfer_setting(config, 'metrics_port'),
+                                          get_transfer_setting(config, 'metrics_textfile_directory'), 'data_transfer.prom')
 ###
 # END: LOAD IN CONFIGURATIONS
 ###
@@ -77,7 +223,10 @@ data_transfer_data_dict = {
     "dst_prefix": dst_prefix,
     "dst_region": dst_region,
     "dst_endpoint_urls": dst_endpoint_urls,
-    "max_workers": max_workers,
+    "min_workers": concurrency.floor,
+    "max_workers": concurrency.ceiling,
+    "initial_workers": concurrency.limit,
+    "concurrency_decisions": [],
     "start_time_epoch": int(start_time),
     "status": "Running",
     "objects_moved": [],
@@ -94,129 +243,504 @@ data_transfer_data_dict = {
     "equivalent_gigabytes_transferred": False,
     "remaining_bytes": False,
     "equivalent_remaining_bytes": False,
-    "failed_objects": {}
+    "failed_objects": {},
+    "trace_path": trace_path[:-len('.jsonl')] + '.json' if trace_path else None
 }
 
-write_json(data_transfer_data_json_dir, data_transfer_data_dict)
+# Workers append finished objects to an event log, this is the only writer of the summary document
+transfer_summary = TransferSummary(data_transfer_data_json_dir, data_transfer_data_dict)
 print(f"Configuration details saved to {data_transfer_data_json_dir}")
 ###
 # END: SAVE CONFIGURATION INFORMATION TO JSON 
 ###
 try:
-    # create our source and destination clients so we can interact with our buckets
-    src_client = create_client(src_service, src_access_key, src_secret_access_key, src_region, src_endpoint_urls[0])
-    dst_client = create_client(dst_service, dst_access_key, dst_secret_access_key, dst_region, dst_endpoint_urls[0])
+    # In a distributed transfer the coordinator lists and diffs, every host (the coordinator too) copies the work units it leases.
+    # The queue takes the place of the journal: units that were not finished are leased again by the next host that asks.
+    work_queue = None
+    if args.coordinator or args.worker:
+        work_queue = WorkQueue(create_work_queue_backend(config, work_queue_job_id(src_service, src_bucket, src_prefix, dst_service, dst_bucket, dst_prefix),
+                                                         get_transfer_setting(config, 'work_queue_directory')),
+                               lease_seconds=get_transfer_setting(config, 'work_lease_seconds'))
+        # Without enforced conditional writes two hosts could take the same lease and publish over each other's queue
+        if not work_queue.backend.conditional_writes_enforced():
+            print(f"{work_queue.backend.location()} does not enforce conditional writes, set work_queue_directory to a directory all hosts share.")
+            raise RuntimeError('Work queue backend does not enforce conditional writes')
+        if args.coordinator:
+            work_queue.announce()
+
+    # The journal records every planned object and its state, so an interrupted run can be resumed without listing again
+    journal = TransferJournal(journal_path) if journal_path is not None else None
+    resuming = args.resume and journal is not None and journal.get_meta('listing_complete', False)
+    if args.resume and not resuming:
+        print("No complete transfer journal to resume from, listing both sides.")
+    # A streaming listing starts copying while both sides are still listed, it never holds a whole listing in memory
+    streaming = not resuming and work_queue is None and get_transfer_setting(config, 'streaming_listing')
+    listing_pipeline = None
 
-    # Get the objects in our destination and source buckets to compare missing objects
-    src_objects = list_objects(src_service, src_bucket, src_prefix, src_client, isSnow=(src_region=='snow'))
-    dst_objects = list_objects(dst_service, dst_bucket, dst_prefix, dst_client, isSnow=(dst_region=='snow'))
+    # Persistent listings of both sides, the destination one also knows which source version every copied object came from.
+    # A streaming listing never has a side complete in memory to refresh them with.
+    src_index = dst_index = None
+    if get_transfer_setting(config, 'listing_index') and not streaming and not args.worker:
+        src_index = ListingIndex(listing_index_path(get_transfer_setting(config, 'journal_directory'), src_service, src_bucket, src_prefix))
+        dst_index = ListingIndex(listing_index_path(get_transfer_setting(config, 'journal_directory'), dst_service, dst_bucket, dst_prefix))
 
-    # Dictionary of objects that have been successfully moved and are identical in both source and destination
-    objects_synced = {key: src_objects[key] for key in src_objects if (key in dst_objects and src_objects[key] == dst_objects[key])}
-    # Dictionary of objects that have not been moved or differ from the source to destination
-    objects_not_synced = {key: src_objects[key] for key in src_objects if (key not in dst_objects or src_objects[key] != dst_objects[key])}
+    if resuming:
+        # Everything the interrupted run planned, minus what it finished, in-flight multipart uploads are continued by the workers
+        src_objects = journal.planned_objects()
+        indexed_src_objects = src_index.objects() if src_index is not None else {}
+        src_listing = CompactListing.from_listing({key: indexed_src_objects.get(key, (src_objects[key], None, None)) for key in src_objects})
+        del src_objects, indexed_src_objects
+        objects_not_synced = journal.unfinished_objects()
+        synced_objects = len(src_listing) - len(objects_not_synced)
+        previously_synced_objects = journal.get_meta('initial_synced_objects', 0)
+        print(f"Resuming from {journal.journal_path}: {len(objects_not_synced)} of {len(src_listing)} planned objects left to move.")
+    else:
+        if journal is not None:
+            # Multipart uploads (or partial files) left open by an earlier run of this config would never be completed now
+            for src_key, dst_key, upload_id in journal.open_multipart_uploads():
+                try:
+                    if dst_driver.abort_orphaned_upload(dst_bucket, dst_key, upload_id, dst_endpoint_urls[0]):
+                        print(f"Aborted orphaned multipart upload of '{dst_key}'.")
+                except Exception as e:
+                    print(f"Could not abort orphaned multipart upload of '{dst_key}': {e}")
+            journal.reset()
+
+        if args.worker:
+            # A worker lists nothing, the objects and source ETags of every unit it leases come with the unit
+            print(f"Waiting for work units at {work_queue.backend.location()}.")
+            src_listing, objects_not_synced = {}, {}
+            synced_objects = 0
+        elif streaming:
+            # Both sides are listed in key order and merged as they arrive, the dispatcher takes the objects to move from the pipeline
+            listing_pipeline = ListingPipeline(prefetch_pages(src_driver.iter_listing_pages(src_bucket, src_prefix, src_endpoint_urls[0])),
+                                               prefetch_pages(dst_driver.iter_listing_pages(dst_bucket, dst_prefix, dst_endpoint_urls[0])),
+                                               max_queued=get_transfer_setting(config, 'streaming_queue_objects'))
+            src_listing, objects_not_synced = CompactListing(), {}
+            synced_objects = 0
+        else:
+            # Get the objects in our destination and source buckets to compare missing objects, held as sorted compact listings.
+            # With source_index_max_age_seconds only the source shards that were not listed recently are listed again.
+            src_shard_cache = None
+            if src_index is not None and get_transfer_setting(config, 'source_index_max_age_seconds'):
+                src_shard_cache = ShardCache(src_index, get_transfer_setting(config, 'source_index_max_age_seconds'))
+            with trace_span('list_source', 'listing', endpoint_urls=src_endpoint_urls) as span:
+                src_listing = CompactListing.from_listing(list_side_objects(src_driver, src_bucket, src_prefix, src_endpoint_urls, src_shard_cache, progress=listed_objects_progress('src')))
+                span.set(objects=len(src_listing))
+            if src_index is not None:
+                with trace_span('index_refresh', 'listing', side='src'):
+                    changes = src_index.refresh(src_listing)
+                print(f"Source listing: {changes['added']} added, {changes['changed']} changed and {changes['removed']} removed objects since the last listing.")
+            if src_shard_cache is not None:
+                print(f"Source listing: {src_shard_cache.reused_shards} shards taken from the index, {len(src_shard_cache.listed_shards)} listed.")
+                src_shard_cache.commit()
+            # Only when destination_index_max_age_seconds is set, the destination index stands in for a recent listing
+            dst_listing = dst_index.fresh_objects(get_transfer_setting(config, 'destination_index_max_age_seconds')) if dst_index is not None else None
+            if dst_listing is None:
+                with trace_span('list_destination', 'listing', endpoint_urls=dst_endpoint_urls) as span:
+                    dst_listing = CompactListing.from_listing(list_side_objects(dst_driver, dst_bucket, dst_prefix, dst_endpoint_urls, progress=listed_objects_progress('dst')))
+                    span.set(objects=len(dst_listing))
+                if dst_index is not None:
+                    with trace_span('index_refresh', 'listing', side='dst'):
+                        dst_index.refresh(dst_listing)
+            else:
+                dst_listing = CompactListing.from_listing(dst_listing)
+                print("Diffing against the destination listing index instead of listing the destination.")
+            source_etags = dst_index.source_etags() if dst_index is not None else {}
+
+            # Count the objects that are identical in both source and destination, keep the ones that have not been moved or differ
+            with trace_span('diff', 'listing') as span:
+                synced_objects, synced_bytes, objects_not_synced = diff_listings(src_listing, dst_listing, source_etags)
+                span.set(synced_objects=synced_objects, objects_to_move=len(objects_not_synced))
+            metrics.set('listed_objects', len(dst_listing), side='dst')
+            del dst_listing, source_etags
+        previously_synced_objects = 0
+
+        if journal is not None and not streaming:
+            with trace_span('journal_plan', 'journal', objects=len(objects_not_synced)):
+                journal.plan({obj_key: (src_object_key(obj_key), dst_object_key(obj_key), objects_not_synced[obj_key]) for obj_key in objects_not_synced})
+            journal.set_meta(listing_complete=True, initial_synced_objects=synced_objects, start_time_epoch=int(start_time))
+    initial_synced_objects = previously_synced_objects + synced_objects
 
     total_bytes_to_move = sum(objects_not_synced.values())
     total_objects_to_move = len(objects_not_synced)
+    if not streaming:
+        metrics.set('listed_objects', len(src_listing), side='src')
+        metrics.set('listing_complete', 1)
     ###
     # BEGIN: UPDATE BUCKET OBJECT INFORMATION
     ###
-    update_data_transfer_data_dict = {"initial_synced_objects": len(objects_synced),
-                        "initial_unsynced_objects": len(objects_not_synced),
-                        "final_synced_objects": len(objects_synced),
-                        "final_unsynced_objects": len(objects_not_synced),
-                        "completion_percentage": 100*len(objects_synced)/(len(objects_synced)+len(objects_not_synced)),
-                        "total_bytes_to_move": total_bytes_to_move,
-                        "total_equivalent_gigabytes_to_move": float(f"{(total_bytes_to_move/1073741824):.3f}")}
-    update_json(data_transfer_data_json_dir, update_data_transfer_data_dict)
+    # With a streaming listing these are only known once the listing finishes
+    def listing_statistics(initial_synced_objects, objects_to_move, bytes_to_move):
+        return {"initial_synced_objects": initial_synced_objects,
+                "initial_unsynced_objects": objects_to_move,
+                "final_synced_objects": initial_synced_objects,
+                "final_unsynced_objects": objects_to_move,
+                "completion_percentage": 100*initial_synced_objects/(initial_synced_objects+objects_to_move) if initial_synced_objects+objects_to_move else 100.0,
+                "resumed": bool(resuming),
+                "streaming_listing": bool(streaming),
+                "total_bytes_to_move": bytes_to_move,
+                "total_equivalent_gigabytes_to_move": float(f"{(bytes_to_move/1073741824):.3f}")}
+    if not streaming and not args.worker:
+        transfer_summary.flush(listing_statistics(initial_synced_objects, total_objects_to_move, total_bytes_to_move))
     ###
     # END: UPDATE BUCKET OBJECT INFORMATION
     ###
 
-    # Distribute endpoint_urls evenly over the amount of objects we need to move
-    endpoint_url_distribution = []
-    for i in range(len(objects_not_synced)):
-        inbound = src_endpoint_urls[i % len(src_endpoint_urls)]
-        outbound = dst_endpoint_urls[i % len(dst_endpoint_urls)]
-        endpoint_url_distribution.append((inbound, outbound))
-
-    # Function to run the cloud_sync_obj.py script, this is necessary to avoid GIL bottleneck
-    def cloud_sync_obj(src_service, dst_service, src_bucket, dst_bucket, src_key, dst_key, bytes, src_endpoint_url, dst_endpoint_url, data_transfer_data_json_dir, benchmark_progress):
-        command = f'python cloud_sync_obj.py "{src_service}" "{dst_service}" "{src_bucket}" "{dst_bucket}" "{src_key}" "{dst_key}" "{bytes}" "{src_endpoint_url}" "{dst_endpoint_url}" "{data_transfer_data_json_dir}" "{args.config}"'
-        subprocess.run(command, shell=True, check=True)
-        if benchmark_progress:
-            # Get the objects in our destination buckets to compare missing objects
-            dst_objects = list_objects(dst_service, dst_bucket, dst_prefix, dst_client, isSnow=(dst_region=='snow'))
-
-            # Dictionary of objects that have been successfully moved and are identical in both source and destination
-            objects_synced = {key: src_objects[key] for key in src_objects if (key in dst_objects and src_objects[key] == dst_objects[key])}
-            # Dictionary of objects that have not been moved or differ from the source to destination
-            objects_not_synced = {key: src_objects[key] for key in src_objects if (key not in dst_objects or src_objects[key] != dst_objects[key])}
-
-            ###
-            # BEGIN: UPDATE BUCKET OBJECT INFORMATION
-            ###
-            update_data_transfer_data_dict = {"final_synced_objects": len(objects_synced),
-                                "final_unsynced_objects": len(objects_not_synced),
-                                "completion_percentage": 100 * len(objects_synced)/(len(objects_synced)+len(objects_not_synced)),
-                                "bytes_transferred": min(sum(objects_synced.values()), total_bytes_to_move),
-                                "equivalent_gigabytes_transferred": float(f"{(min(sum(objects_synced.values()), total_bytes_to_move)/1073741824):.3f}"),
-                                "remaining_bytes": sum(objects_not_synced.values()),
-                                "equivalent_remaining_bytes": float(f"{(sum(objects_not_synced.values())/1073741824):.3f}")}
-            update_json(data_transfer_data_json_dir, update_data_transfer_data_dict)
-            ###
-            # END: UPDATE BUCKET OBJECT INFORMATION
-            ###
-
-    # Spawn individual cloud_sync_obj processes moving 1 object per process, in parallel up to the amount of max_workers at a time.
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = []
-        for i, obj_key in enumerate(objects_not_synced.keys()):
-            src_key = f"{src_prefix.rstrip('/')}/{obj_key}".lstrip('/')
-            dst_key = f"{dst_prefix.rstrip('/')}/{obj_key}".lstrip('/')
-            src_endpoint_url, dst_endpoint_url = endpoint_url_distribution[i]
-            if i % max_workers == 0: # Every nth object sync we spawn, update our sync status every update_benchmark_interval 
-                benchmark_progress = True
-            else:
-                benchmark_progress = False
-            futures.append(executor.submit(cloud_sync_obj, src_service, dst_service, src_bucket, dst_bucket, src_key, dst_key, objects_not_synced[obj_key],src_endpoint_url, dst_endpoint_url, data_transfer_data_json_dir, benchmark_progress))
+    # Order the objects largest first into tiny/medium/huge lanes that each have their own concurrency
+    with trace_span('plan', 'setup', objects=len(objects_not_synced)):
+        transfer_plan = TransferPlan(objects_not_synced, config)
+    # How each pair of endpoints copies, from the capabilities of both storage drivers
+    copy_strategies = copy_strategy_summary(src_driver, dst_driver, src_endpoint_urls, dst_endpoint_urls, config)
+    if not streaming and not args.worker:
+        transfer_plan_summary = {**transfer_plan.summary(), 'copy_strategies': copy_strategies}
+        print_transfer_plan(transfer_plan_summary)
+        transfer_summary.flush({'transfer_plan': transfer_plan_summary})
+    if args.coordinator:
+        # The diff is handed out as key ranges, this host leases them like every worker does
+        with trace_span('publish_work_units', 'setup') as span:
+            work_units = partition_work_units(objects_not_synced, src_listing, get_transfer_setting(config, 'work_unit_bytes'), get_transfer_setting(config, 'work_unit_objects'))
+            work_queue.publish(work_units)
+            span.set(units=len(work_units))
+        print(f"Published {len(work_units)} work units of {total_objects_to_move} objects to {work_queue.backend.location()}.")
+        del work_units
+        objects_not_synced = {}
+        transfer_plan = TransferPlan(objects_not_synced, config)
+
+    # Each object goes to the source and destination endpoints with the least outstanding bytes relative to their recent throughput
+    src_endpoint_scheduler = EndpointScheduler(src_endpoint_urls)
+    dst_endpoint_scheduler = EndpointScheduler(dst_endpoint_urls)
+
+    # Throttled and transient failures are retried with backoff, on other endpoints where possible, instead of waiting for a rerun
+    retry = TransferRetry(max_attempts=get_transfer_setting(config, 'retry_max_attempts'),
+                          base_delay_seconds=get_transfer_setting(config, 'retry_base_delay_seconds'),
+                          max_delay_seconds=get_transfer_setting(config, 'retry_max_delay_seconds'))
+
+    # Progress is counted from worker completions and flushed on a timer, the destination is only listed again for the final verification.
+    # In a distributed transfer it counts the objects of the units this host leased.
+    progress = TransferProgress(initial_synced_objects, total_objects_to_move if work_queue is None else 0, total_bytes_to_move if work_queue is None else 0,
+                                flush_interval_seconds=get_transfer_setting(config, 'progress_flush_seconds'),
+                                throughput_window_seconds=get_transfer_setting(config, 'throughput_window_seconds'))
+
+    # Gauges of the dispatcher state, set once per dispatcher loop from what it already keeps in memory
+    reported_rate_limit_wait_seconds = 0
+    def update_metrics(futures):
+        global reported_rate_limit_wait_seconds
+        metrics.set('objects_in_flight', len(futures))
+        metrics.set('concurrency_limit', concurrency.limit)
+        for lane_name, lane in transfer_plan.lanes.items():
+            metrics.set('queued_objects', len(lane['pending']), lane=lane_name)
+        metrics.set('retry_queued_objects', retry.pending)
+        for side, endpoint_scheduler in (('src', src_endpoint_scheduler), ('dst', dst_endpoint_scheduler)):
+            for endpoint_url in endpoint_scheduler.endpoint_urls:
+                metrics.set('objects_in_flight_endpoint', endpoint_scheduler.outstanding_objects[endpoint_url], side=side, endpoint_url=endpoint_url)
+                metrics.set('endpoint_backing_off', int(retry.backing_off(endpoint_url)), side=side, endpoint_url=endpoint_url)
+        metrics.set('objects_to_move', progress.objects_to_move)
+        metrics.set('bytes_to_move', progress.bytes_to_move)
+        metrics.set('recent_bytes_per_second', int(progress.bytes_per_second()))
+        if rate_limiter is not None:
+            # The limiter sums the waits of every process, the counter goes up by what was waited since the last update
+            waited_seconds = rate_limiter.waited_seconds()
+            metrics.inc('rate_limit_wait_seconds', waited_seconds - reported_rate_limit_wait_seconds)
+            reported_rate_limit_wait_seconds = waited_seconds
+
+    # Objects with the same content hash and size as something already at the destination are copied from it server-side.
+    # Within a run, duplicates wait while the first object with their content is copied (its leader) and then copy from it.
+    dedup_index = None
+    if get_transfer_setting(config, 'deduplicate_objects'):
+        dedup_index = DedupIndex(dedup_index_path(get_transfer_setting(config, 'journal_directory'), dst_service, dst_bucket))
+        # Duplicates are found by the content hash of the source listing, copies are still recorded with the MD5 computed while streaming
+        if not src_driver.content_checksums:
+            print(f"{src_service} listings carry no content hashes, deduplication is inactive for this run. Copied objects are still recorded for later runs from other sources.")
+    dedup_leaders = {}
+    dedup_waiting = {}
+    dedup_statistics = {'deduplicated_objects': 0, 'deduplicated_bytes': 0}
+    # Server-side copies that fell back to moving the bytes, by reason: a backend without them or a copy refused for one object
+    server_side_copy_fallbacks = {'unsupported': 0, 'denied': 0}
+
+    # A key written by an earlier run is only reused while the destination index shows it unchanged since it was written
+    def find_dedup_key(obj_key, content, obj_bytes):
+        found = dedup_index.lookup([content], obj_bytes)
+        if found is None or found[0] == dst_object_key(obj_key):
+            return None
+        dedup_key, recorded_by_this_run = found
+        if recorded_by_this_run:
+            return dedup_key
+        relative_key = dst_relative_key(dedup_key)
+        entry = dst_index.entry(relative_key) if dst_index is not None and relative_key is not None else None
+        if entry is None or entry[0] != obj_bytes or (entry[1] is not None and entry[2] is not None and entry[1] != entry[2]):
+            return None
+        return dedup_key
+
+    # The work unit each leased object belongs to and what is left of every unit this host holds
+    object_units = {}
+    unit_progress = {}
 
-        # Wait for all futures to complete
-        wait(futures)
+    # Marks a unit done once every one of its objects was copied or given up
+    def finish_unit_object(obj_key, obj_bytes, succeeded):
+        unit_id = object_units.pop(obj_key, None)
+        unit = unit_progress.get(unit_id)
+        if unit is None:
+            return
+        unit['objects_left'] -= 1
+        unit['objects_copied' if succeeded else 'objects_failed'] += 1
+        unit['bytes_copied'] += obj_bytes if succeeded else 0
+        if unit['objects_left'] == 0:
+            del unit_progress[unit_id]
+            work_queue.complete(unit_id, {key: value for key, value in unit.items() if key != 'objects_left'})
+
+    with executor:
+        futures = {}
+        streaming_listing_open = listing_pipeline is not None
+        work_queue_open = work_queue is not None
+        next_lease_time = 0
+        while True:
+            if work_queue is not None:
+                for unit_id in work_queue.maybe_renew():
+                    print(f"Lost the lease of work unit {unit_id} to another host, its objects are finished without it.")
+                    unit_progress.pop(unit_id, None)
+            # Lease another unit whenever fewer objects are waiting than may be in flight, until every unit of the job is done
+            while work_queue_open and transfer_plan.pending_objects() < concurrency.limit and time.time() >= next_lease_time:
+                unit = work_queue.lease_next()
+                if unit is None:
+                    work_queue_open = not work_queue.finished()
+                    next_lease_time = time.time() + get_transfer_setting(config, 'work_queue_poll_seconds')
+                    break
+                unit_progress[unit['unit_id']] = {'objects_left': len(unit['objects']), 'objects_copied': 0, 'objects_failed': 0, 'bytes_copied': 0}
+                for obj_key, obj_bytes, src_etag in unit['objects']:
+                    objects_not_synced[obj_key] = obj_bytes
+                    object_units[obj_key] = unit['unit_id']
+                    transfer_plan.add(obj_key, obj_bytes)
+                    if args.worker:
+                        src_listing[obj_key] = (obj_bytes, src_etag, None)
+                progress.add(len(unit['objects']), unit['bytes'])
+                print(f"Leased work unit {unit['unit_id']}: {len(unit['objects'])} objects, {unit['bytes']} bytes.")
+
+            # Take newly listed objects while the listing runs, only as many as keep streaming_queue_objects waiting to start
+            if streaming_listing_open:
+                listed_objects = listing_pipeline.take(get_transfer_setting(config, 'streaming_queue_objects') - transfer_plan.pending_objects())
+                for obj_key, obj_bytes in listed_objects:
+                    objects_not_synced[obj_key] = obj_bytes
+                    transfer_plan.add(obj_key, obj_bytes)
+                progress.add(len(listed_objects), sum(obj_bytes for obj_key, obj_bytes in listed_objects))
+                progress.initial_synced_objects = listing_pipeline.synced_objects
+                metrics.set('listed_objects', listing_pipeline.listed_objects, side='src')
+                if journal is not None and listed_objects:
+                    journal.plan({obj_key: (src_object_key(obj_key), dst_object_key(obj_key), obj_bytes) for obj_key, obj_bytes in listed_objects})
+                if listing_pipeline.finished:
+                    streaming_listing_open = False
+                    metrics.set('listing_complete', 1)
+                    initial_synced_objects = listing_pipeline.synced_objects
+                    total_objects_to_move = progress.objects_to_move
+                    total_bytes_to_move = progress.bytes_to_move
+                    print(f"Listing finished after {time.time() - start_time:.2f} seconds: {listing_pipeline.listed_objects} objects, {total_objects_to_move} to move.")
+                    transfer_plan_summary = {**transfer_plan.summary(), 'copy_strategies': copy_strategies}
+                    print_transfer_plan(transfer_plan_summary)
+                    transfer_summary.update(listing_statistics(initial_synced_objects, total_objects_to_move, total_bytes_to_move))
+                    transfer_summary.update({'transfer_plan': transfer_plan_summary})
+                    if journal is not None:
+                        journal.set_meta(listing_complete=True, initial_synced_objects=initial_synced_objects, start_time_epoch=int(start_time))
+
+            # Objects whose retry delay has passed go back to the front of their lane
+            for obj_key in retry.due():
+                transfer_plan.requeue(obj_key, objects_not_synced[obj_key])
+
+            # Only hand the workers as many objects as the controller currently allows in flight, and each lane no more than its own cap
+            while len(futures) < concurrency.limit:
+                # While every endpoint of a side is backing off nothing new is started
+                if retry.all_backing_off(src_endpoint_urls) or retry.all_backing_off(dst_endpoint_urls):
+                    break
+                next_object = transfer_plan.next_object()
+                if next_object is None:
+                    break
+                lane_name, obj_key = next_object
+                src_key = src_object_key(obj_key)
+                dst_key = dst_object_key(obj_key)
+                obj_bytes = objects_not_synced[obj_key]
+                src_entry = src_listing.get(obj_key)
+                content = content_hash(src_entry[1]) if dedup_index is not None and src_entry else None
+                dedup_key = None
+                if content is not None:
+                    dedup_key = find_dedup_key(obj_key, content, obj_bytes)
+                    if dedup_key is None and (content, obj_bytes) in dedup_leaders:
+                        # Its content is being copied right now, the object is started again once that copy finished
+                        dedup_waiting.setdefault((content, obj_bytes), []).append(obj_key)
+                        transfer_plan.complete(lane_name)
+                        continue
+                    if dedup_key is None:
+                        dedup_leaders[(content, obj_bytes)] = obj_key
+                avoid_endpoint_urls = retry.avoid(obj_key)
+                src_endpoint_url = src_endpoint_scheduler.assign(obj_bytes, exclude=avoid_endpoint_urls)
+                dst_endpoint_url = dst_endpoint_scheduler.assign(obj_bytes, exclude=avoid_endpoint_urls)
+                future = executor.submit(sync_obj, src_service, dst_service, src_bucket, dst_bucket, src_key, dst_key, obj_bytes, src_endpoint_url, dst_endpoint_url, transfer_summary.events_path,
+                                         src_entry[1] if src_entry else None, dedup_key)
+                futures[future] = (obj_bytes, src_endpoint_url, dst_endpoint_url, lane_name, obj_key, content, dedup_key)
+                if journal is not None:
+                    journal.mark(src_key, 'in_flight')
+            if not futures:
+                # Objects are waiting for their retry delay or for endpoints to stop backing off
+                if retry.pending or transfer_plan.pending_objects():
+                    time.sleep(retry.wait_seconds(1))
+                    continue
+                if not streaming_listing_open and not work_queue_open:
+                    break
+                if streaming_listing_open:
+                    # Nothing to copy until more objects are listed
+                    listing_pipeline.wait(timeout=1)
+                else:
+                    # Nothing to copy until another unit can be leased
+                    time.sleep(max(0, min(next_lease_time - time.time(), 1)))
+                continue
+
+            in_flight = len(futures)
+            done, _ = wait(futures, timeout=retry.wait_seconds(1 if streaming_listing_open or work_queue_open else min(concurrency.interval_seconds, progress.flush_interval_seconds)), return_when=FIRST_COMPLETED)
+            for future in done:
+                obj_bytes, src_endpoint_url, dst_endpoint_url, lane_name, obj_key, content, dedup_key = futures.pop(future)
+                transfer_plan.complete(lane_name)
+                if future.exception() is None:
+                    retry.succeeded(obj_key, (src_endpoint_url, dst_endpoint_url))
+                    for side, endpoint_url in (('src', src_endpoint_url), ('dst', dst_endpoint_url)):
+                        metrics.inc('objects_copied', side=side, endpoint_url=endpoint_url)
+                        metrics.inc('bytes_copied', obj_bytes, side=side, endpoint_url=endpoint_url)
+                    if journal is not None:
+                        journal.mark(src_object_key(obj_key), 'done')
+                    if dst_index is not None:
+                        dst_index.record(obj_key, obj_bytes, source_etag=src_listing[obj_key][1], expected_etag=future.result()['dst_etag'])
+                    if future.result().get('server_side_copy_fallback') is not None:
+                        server_side_copy_fallbacks[future.result()['server_side_copy_fallback']] += 1
+                    if dedup_index is not None:
+                        object_moved = future.result()
+                        if object_moved['copy_method'] == 'dedup':
+                            dedup_statistics['deduplicated_objects'] += 1
+                            dedup_statistics['deduplicated_bytes'] += obj_bytes
+                            metrics.inc('deduplicated_objects')
+                            metrics.inc('deduplicated_bytes', obj_bytes)
+                        elif dedup_key is not None:
+                            dedup_index.forget(dedup_key)
+                        # The hashes known of the new object: the source one and the ones computed or returned by the copy
+                        hashes = {value for value in (content, object_moved['md5'], object_moved['dst_etag']) if content_hash(value)}
+                        if hashes:
+                            dedup_index.record(hashes, obj_bytes, dst_object_key(obj_key))
+                    finish_unit_object(obj_key, obj_bytes, succeeded=True)
+                else:
+                    error_class, retrying = retry.failed(obj_key, (src_endpoint_url, dst_endpoint_url), future.exception())
+                    print(f"Error syncing object ({error_class}{', retrying' if retrying else ', giving up'}): {future.exception()}")
+                    metrics.inc('copy_failures', error_class=error_class)
+                    if retrying:
+                        metrics.inc('retries')
+                    if journal is not None:
+                        journal.mark(src_object_key(obj_key), 'planned' if retrying else 'failed')
+                    if not retrying:
+                        finish_unit_object(obj_key, obj_bytes, succeeded=False)
+                # Objects waiting for this one's content are started again, copying from it when it succeeded
+                if content is not None and dedup_leaders.get((content, obj_bytes)) == obj_key:
+                    del dedup_leaders[(content, obj_bytes)]
+                    for waiting_key in dedup_waiting.pop((content, obj_bytes), []):
+                        transfer_plan.requeue(waiting_key, obj_bytes)
+                elapsed_seconds = future.result()['total_time_seconds'] if future.exception() is None else None
+                src_endpoint_scheduler.complete(src_endpoint_url, obj_bytes, elapsed_seconds)
+                dst_endpoint_scheduler.complete(dst_endpoint_url, obj_bytes, elapsed_seconds)
+                concurrency.record(obj_bytes, future.exception())
+                progress.record(obj_bytes, succeeded=future.exception() is None)
+            update_metrics(futures)
+            if progress.maybe_flush(transfer_summary):
+                refresh_metrics_textfile()
+                with trace_span('journal_commit', 'journal'):
+                    if journal is not None:
+                        journal.commit()
+                    if dst_index is not None:
+                        dst_index.commit()
+                    if dedup_index is not None:
+                        dedup_index.commit()
+
+            decision = concurrency.update(in_flight, rate_limit_waited_seconds=rate_limiter.waited_seconds() if rate_limiter else 0)
+            if decision:
+                print(f"Concurrency {decision['previous_limit']} -> {decision['limit']} ({decision['reason']}, {decision['bytes_per_second']} bytes/s)")
+                transfer_summary.update({'concurrency_decisions': [decision]})
+
+    progress.flush(transfer_summary)
+    update_metrics({})
+    refresh_metrics_textfile()
+    if journal is not None:
+        journal.close()
+    if dedup_index is not None:
+        dedup_index.close()
 
     end_time = time.time()
     total_time = end_time - start_time
     print(f"Total time taken: {total_time:.2f} seconds")
+    if any(server_side_copy_fallbacks.values()):
+        print(f"Server-side copy fell back to moving the bytes for {server_side_copy_fallbacks['unsupported']} objects the backend could not copy "
+              f"and {server_side_copy_fallbacks['denied']} objects it refused to copy.")
 
     ###
     # BEGIN: SAVE FINISHING COMPLETION INFORMATION TO JSON
     ###
-    # Get the objects in our destination buckets to compare missing objects
-    dst_objects = list_objects(dst_service, dst_bucket, dst_prefix, dst_client, isSnow=(dst_region=='snow'))
+    if args.worker:
+        # The coordinator verifies the whole job, a worker reports the objects it copied and the ones it gave up
+        synced_objects, synced_bytes = progress.objects_done, progress.bytes_done
+        objects_not_synced = {obj_key: objects_not_synced[obj_key] for obj_key in retry.given_up}
+        total_bytes_to_move = progress.bytes_to_move
+    elif streaming:
+        # Verify with a second key-ordered merge of both sides, only the objects that are still not synced are kept
+        synced_objects = synced_bytes = 0
+        objects_not_synced = {}
+        for key, src_entry, dst_entry in merge_join_listings(prefetch_pages(src_driver.iter_listing_pages(src_bucket, src_prefix, src_endpoint_urls[0])),
+                                                             prefetch_pages(dst_driver.iter_listing_pages(dst_bucket, dst_prefix, dst_endpoint_urls[0]))):
+            if is_object_synced(src_entry, dst_entry):
+                synced_objects += 1
+                synced_bytes += src_entry[0]
+            else:
+                objects_not_synced[key] = src_entry[0]
+    else:
+        # The destination is listed once more to verify the transfer. With verify_from_destination_index the index, the listing
+        # from before the transfer plus the copies this run completed, stands in for it: that trusts the completed copies
+        # and sees nothing else at the destination. A coordinator did not see the copies of its workers and always lists.
+        with trace_span('final_verification', 'listing', endpoint_urls=dst_endpoint_urls):
+            if dst_index is not None and work_queue is None and get_transfer_setting(config, 'verify_from_destination_index'):
+                dst_index.commit()
+                dst_listing = CompactListing.from_listing(dst_index.objects())
+            else:
+                dst_listing = CompactListing.from_listing(list_side_objects(dst_driver, dst_bucket, dst_prefix, dst_endpoint_urls))
+                if dst_index is not None:
+                    dst_index.refresh(dst_listing)
+            source_etags = dst_index.source_etags() if dst_index is not None else {}
 
-    # Dictionary of objects that have been successfully moved and are identical in both source and destination
-    objects_synced = {key: src_objects[key] for key in src_objects if (key in dst_objects and src_objects[key] == dst_objects[key])}
-    # Dictionary of objects that have not been moved or differ from the source to destination
-    objects_not_synced = {key: src_objects[key] for key in src_objects if (key not in dst_objects or src_objects[key] != dst_objects[key])}
+            # Count the objects that are identical in both source and destination, keep the ones that have not been moved or differ
+            synced_objects, synced_bytes, objects_not_synced = diff_listings(src_listing, dst_listing, source_etags)
+        synced_objects += previously_synced_objects
+        if src_index is not None:
+            src_index.close()
+            dst_index.close()
 
-    new_data_transfer_data_dict = {'final_synced_objects': len(objects_synced),
+    new_data_transfer_data_dict = {'final_synced_objects': synced_objects,
                         'final_unsynced_objects': len(objects_not_synced),
-                        "completion_percentage": 100 * len(objects_synced)/(len(objects_synced)+len(objects_not_synced)),
-                        "bytes_transferred": min(sum(objects_synced.values()), total_bytes_to_move),
-                        "equivalent_gigabytes_transferred": float(f"{(min(sum(objects_synced.values()), total_bytes_to_move)/1073741824):.3f}"),
+                        "completion_percentage": 100 * synced_objects/(synced_objects+len(objects_not_synced)) if synced_objects+len(objects_not_synced) else 100.0,
+                        "bytes_transferred": min(synced_bytes, total_bytes_to_move),
+                        "equivalent_gigabytes_transferred": float(f"{(min(synced_bytes, total_bytes_to_move)/1073741824):.3f}"),
                         "remaining_bytes": sum(objects_not_synced.values()),
                         "equivalent_remaining_bytes": float(f"{(sum(objects_not_synced.values())/1073741824):.3f}"),
                         'failed_objects': objects_not_synced,
                         'end_time_epoch': int(end_time),
                         'total_duration_seconds': total_time,
-                        'speed_gbps': float(f"{((min(sum(objects_synced.values()), total_bytes_to_move)/1073741824)*8/total_time):.3f}"),
+                        'speed_gbps': float(f"{((min(synced_bytes, total_bytes_to_move)/1073741824)*8/total_time):.3f}"),
+                        'src_endpoint_statistics': src_endpoint_scheduler.summary(),
+                        'dst_endpoint_statistics': dst_endpoint_scheduler.summary(),
+                        'retry_statistics': retry.summary(),
+                        'dedup_statistics': dedup_statistics if dedup_index is not None else None,
+                        'server_side_copy_fallbacks': server_side_copy_fallbacks,
+                        'work_queue': {'role': 'coordinator' if args.coordinator else 'worker', **work_queue.summary()} if work_queue is not None else None,
                         'status': 'Completed'}
-    update_json(data_transfer_data_json_dir, new_data_transfer_data_dict)
+    transfer_summary.flush(new_data_transfer_data_dict, final=True)
 except:
     new_data_transfer_data_dict = {
         'status': 'Failed'
     }
-    update_json(data_transfer_data_json_dir, new_data_transfer_data_dict)
+    transfer_summary.flush(new_data_transfer_data_dict, final=True)
+    executor.shutdown(cancel_futures=True)
+
+# The trace is exported after failed runs as well, they are the ones most worth looking at
+if trace_path is not None:
+    print(f"Transfer trace saved to {export_chrome_trace(trace_path)}, open it in ui.perfetto.dev")
 ###
 # END: SAVE FINISHING COMPLETION INFORMATION TO JSON
 ###
@@ -0,0 +1,153 @@
+import argparse
+import re
+import os
+import time
+from utils import read_config, get_transfer_setting, write_json
+from storage_drivers import get_storage_driver
+from listing_index import ListingIndex, listing_index_path
+from listing_pipeline import merge_join_listings
+from compact_listing import CompactListing
+
+###
+# BEGIN: LOAD IN CONFIGURATIONS
+###
+parser = argparse.ArgumentParser(description='Using a config.yaml verify the content of a data transfer from listings alone, without downloading either side.')
+parser.add_argument('config', type=str, help='The config.yaml that specifies your data transfer.')
+args = parser.parse_args()
+
+config = read_config(args.config)
+
+if not config:
+    print("Failed to read the configuration.")
+
+src_service = config["src"]["service"]
+src_bucket = config["src"]["bucket"]
+src_prefix = config["src"]["bucket_prefix"]
+src_region = config["src"]["region"]
+src_access_key = config['src']['access_key']
+src_secret_access_key = config['src']['secret_access_key']
+src_endpoint_urls = config['src']['endpoint_urls']
+
+dst_service = config["dst"]["service"]
+dst_bucket = config["dst"]["bucket"]
+dst_prefix = config["dst"]["bucket_prefix"]
+dst_region = config["dst"]["region"]
+dst_access_key = config['dst']['access_key']
+dst_secret_access_key = config['dst']['secret_access_key']
+dst_endpoint_urls = config['dst']['endpoint_urls']
+
+log_local_directory = config['log']['local_directory']
+
+src_driver = get_storage_driver(src_service, config, 'src')
+dst_driver = get_storage_driver(dst_service, config, 'dst')
+
+# Filter out unhealthy endpoints, all healthy ones are listed through
+tmp_endpoint_urls = []
+for src_endpoint_url in src_endpoint_urls:
+    print(f'Checking source endpoint: {src_endpoint_url}')
+    if src_driver.is_endpoint_healthy(src_bucket, src_prefix, src_endpoint_url):
+        tmp_endpoint_urls.append(src_endpoint_url)
+src_endpoint_urls = tmp_endpoint_urls
+
+tmp_endpoint_urls = []
+for dst_endpoint_url in dst_endpoint_urls:
+    print(f'Checking destination endpoint: {dst_endpoint_url}')
+    if dst_driver.is_endpoint_healthy(dst_bucket, dst_prefix, dst_endpoint_url):
+        tmp_endpoint_urls.append(dst_endpoint_url)
+dst_endpoint_urls = tmp_endpoint_urls
+start_time = time.time()
+###
+# END: LOAD IN CONFIGURATIONS
+###
+
+###
+# BEGIN: LISTING VERIFICATION
+###
+# Plain S3 ETags and Azure Content-MD5s are the MD5 of the content, multipart ETags end in a part count
+def is_md5_etag(etag):
+    return etag is not None and re.fullmatch(r'[0-9a-f]{32}', etag) is not None
+
+def verify_listings(src_listing, dst_listing, expected_etags, source_etags):
+    """
+    Checks every source object against the destination from listings alone, nothing is downloaded.
+
+    An object this tool copied is checked against the ETag its copy should have and the source ETag it was copied from,
+    any other object by comparing both ETags when they are MD5s or the same multipart layout. Local files have no ETag.
+    Returns the keys of every problem and the number of objects in each outcome.
+    """
+    problems = {'missing': [], 'destination_changed': [], 'source_changed': [], 'content_mismatch': []}
+    verified_objects = unverifiable_objects = 0
+    for key, src_entry, dst_entry in merge_join_listings(src_listing.items(), dst_listing.items()):
+        if dst_entry is None or src_entry[0] != dst_entry[0]:
+            problems['missing'].append(key)
+        elif key in expected_etags and dst_entry[1] is not None:
+            if dst_entry[1] != expected_etags[key]:
+                problems['destination_changed'].append(key)
+            elif key in source_etags and source_etags[key] != src_entry[1]:
+                problems['source_changed'].append(key)
+            else:
+                verified_objects += 1
+        elif is_md5_etag(src_entry[1]) and is_md5_etag(dst_entry[1]) or (src_entry[1] and src_entry[1] == dst_entry[1]):
+            if src_entry[1] == dst_entry[1]:
+                verified_objects += 1
+            else:
+                problems['content_mismatch'].append(key)
+        else:
+            unverifiable_objects += 1
+    return {'verified_objects': verified_objects,
+            'unverifiable_objects': unverifiable_objects,
+            **{f'{problem}_objects': len(keys) for problem, keys in problems.items()},
+            **problems}
+###
+# END: LISTING VERIFICATION
+###
+
+# Lists a side in parallel shards across all its healthy endpoints
+def list_side_objects(driver, bucket, prefix, endpoint_urls):
+    return CompactListing.from_listing(driver.list_objects_parallel(bucket, prefix, endpoint_urls, details=True,
+                                                                    max_workers=get_transfer_setting(config, 'listing_workers'),
+                                                                    target_shards=get_transfer_setting(config, 'listing_shards')))
+
+src_listing = list_side_objects(src_driver, src_bucket, src_prefix, src_endpoint_urls)
+dst_listing = list_side_objects(dst_driver, dst_bucket, dst_prefix, dst_endpoint_urls)
+
+# The destination index knows what every object copied by cloud_transfer.py should look like
+dst_index = ListingIndex(listing_index_path(get_transfer_setting(config, 'journal_directory'), dst_service, dst_bucket, dst_prefix))
+verification = verify_listings(src_listing, dst_listing, dst_index.expected_etags(), dst_index.source_etags())
+
+# Missing objects and objects of the right size but the wrong content look synced to the destination index while
+# it is trusted, the next cloud_transfer.py run copies them again
+stale_keys = verification['missing'] + verification['destination_changed'] + verification['source_changed'] + verification['content_mismatch']
+dst_index.invalidate(stale_keys)
+dst_index.close()
+
+###
+# BEGIN: SAVE VERIFICATION INFORMATION TO JSON
+###
+if not os.path.exists(log_local_directory):
+    os.makedirs(log_local_directory)
+# Named so the control panel, which reads the data_transfer_* summaries, does not pick it up
+transfer_verification_json_dir = os.path.join(log_local_directory, f"transfer_verification_{int(start_time)}.json")
+write_json(transfer_verification_json_dir, {'src_service': src_service,
+                                            'src_bucket': src_bucket,
+                                            'src_prefix': src_prefix,
+                                            'dst_service': dst_service,
+                                            'dst_bucket': dst_bucket,
+                                            'dst_prefix': dst_prefix,
+                                            'start_time_epoch': int(start_time),
+                                            'total_duration_seconds': time.time() - start_time,
+                                            'source_objects': len(src_listing),
+                                            **verification})
+###
+# END: SAVE VERIFICATION INFORMATION TO JSON
+###
+
+print(f"Verified {verification['verified_objects']} of {len(src_listing)} objects, {verification['unverifiable_objects']} have no comparable checksum.")
+if not (src_driver.content_checksums and dst_driver.content_checksums):
+    print(f"{src_service if not src_driver.content_checksums else dst_service} listings carry no content checksums, only sizes can be compared.")
+for problem in ('missing', 'destination_changed', 'source_changed', 'content_mismatch'):
+    if verification[problem]:
+        print(f"  {problem.replace('_', ' ')}: {len(verification[problem])} objects, e.g. {verification[problem][:5]}")
+if stale_keys:
+    print(f"{len(stale_keys)} objects will be copied again by the next cloud_transfer.py run.")
+print(f"Verification details saved to {transfer_verification_json_dir}")
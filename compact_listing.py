@@ -0,0 +1,185 @@
+from array import array
+from listing_index import is_object_synced
+
+###
+# BEGIN: COMPACT LISTING
+###
+# Every BLOCK_SIZE-th key is stored whole, so a lookup decodes at most one block
+BLOCK_SIZE = 32
+
+# Length of the common prefix of two byte strings, the first differing byte is the highest set byte of their XOR
+def common_prefix_length(a, b):
+    length = min(len(a), len(b), 65535)
+    difference = int.from_bytes(a[:length], 'big') ^ int.from_bytes(b[:length], 'big')
+    return length - (difference.bit_length() + 7) // 8
+
+class CompactListing:
+    """
+    A sorted bucket listing in a few flat buffers instead of a dict of Python strings and tuples.
+
+    Keys are front-coded: each key stores only its suffix after the prefix it shares with the previous key, which
+    removes the repeated directory names that make up most of a deep key. Sizes and last modified times are array
+    columns and ETags one byte buffer. Entries have to be appended in key order, from_listing() sorts a dict first.
+    With details every key maps to (size, etag, last_modified) like list_objects(..., details=True), otherwise to the size.
+    """
+    def __init__(self, details=True):
+        self.details = details
+        self.suffixes = bytearray()
+        self.offsets = array('Q', [0])
+        self.shared = array('H')
+        self.sizes = array('q')
+        if details:
+            self.last_modified = array('q')
+            self.etags = bytearray()
+            self.etag_offsets = array('Q', [0])
+        self.last_key = b''
+        self.total_bytes = 0
+
+    @classmethod
+    def from_listing(cls, listing, details=True):
+        compact_listing = cls(details)
+        compact_listing.extend((key, listing[key]) for key in sorted(listing))
+        return compact_listing
+
+    @classmethod
+    def from_sorted(cls, entries, details=True):
+        compact_listing = cls(details)
+        compact_listing.extend(entries)
+        return compact_listing
+
+    def append(self, key, entry):
+        self.extend([(key, entry)])
+
+    # Appends (key, entry) pairs in key order, the loop binds everything it touches locally since it runs once per key
+    def extend(self, entries):
+        suffixes, offsets, shared_lengths, sizes = self.suffixes, self.offsets, self.shared, self.sizes
+        details = self.details
+        if details:
+            etags, etag_offsets, last_modified = self.etags, self.etag_offsets, self.last_modified
+        last_key = self.last_key
+        count = len(sizes)
+        total_bytes = 0
+        for key, entry in entries:
+            key = key.encode('utf-8')
+            if key <= last_key and count:
+                raise ValueError(f"Keys have to be appended in order, '{key.decode('utf-8')}' follows '{last_key.decode('utf-8')}'")
+            shared = common_prefix_length(last_key, key) if count % BLOCK_SIZE else 0
+            suffixes += key[shared:]
+            offsets.append(len(suffixes))
+            shared_lengths.append(shared)
+            if details:
+                size = entry[0]
+                etags += (entry[1] or '').encode('utf-8')
+                etag_offsets.append(len(etags))
+                last_modified.append(entry[2] or 0)
+            else:
+                size = entry
+            sizes.append(size)
+            total_bytes += size
+            last_key = key
+            count += 1
+        self.last_key = last_key
+        self.total_bytes += total_bytes
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def entry(self, index):
+        if not self.details:
+            return self.sizes[index]
+        return (self.sizes[index], self.etags[self.etag_offsets[index]:self.etag_offsets[index + 1]].decode('utf-8') or None, self.last_modified[index] or None)
+
+    def key_bytes(self, index):
+        key = b''
+        for position in range(index - index % BLOCK_SIZE, index + 1):
+            key = key[:self.shared[position]] + self.suffixes[self.offsets[position]:self.offsets[position + 1]]
+        return bytes(key)
+
+    # Yields every key as UTF-8 bytes in order, decoding each key from the one before it
+    def raw_keys(self):
+        suffixes, offsets, shared = self.suffixes, self.offsets, self.shared
+        key = b''
+        for index in range(len(shared)):
+            key = key[:shared[index]] + suffixes[offsets[index]:offsets[index + 1]]
+            yield key
+
+    def items(self):
+        for index, key in enumerate(self.raw_keys()):
+            yield key.decode('utf-8'), self.entry(index)
+
+    def __iter__(self):
+        return (key for key, entry in self.items())
+
+    # Binary search over the whole keys that start each block, then a scan of that block
+    def index(self, key):
+        key = key.encode('utf-8')
+        low, high = 0, (len(self.sizes) - 1) // BLOCK_SIZE
+        if not len(self.sizes) or key < self.key_bytes(0):
+            return None
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.key_bytes(middle * BLOCK_SIZE) <= key:
+                low = middle
+            else:
+                high = middle - 1
+        current = b''
+        for index in range(low * BLOCK_SIZE, min((low + 1) * BLOCK_SIZE, len(self.sizes))):
+            current = current[:self.shared[index]] + self.suffixes[self.offsets[index]:self.offsets[index + 1]]
+            if current == key:
+                return index
+            if current > key:
+                return None
+        return None
+
+    def get(self, key, default=None):
+        index = self.index(key)
+        return default if index is None else self.entry(index)
+
+    def __getitem__(self, key):
+        index = self.index(key)
+        if index is None:
+            raise KeyError(key)
+        return self.entry(index)
+
+    def __contains__(self, key):
+        return self.index(key) is not None
+
+    # Bytes held by the buffers, the structure itself adds a few hundred bytes
+    def memory_bytes(self):
+        buffers = [self.suffixes, self.offsets, self.shared, self.sizes]
+        if self.details:
+            buffers += [self.etags, self.etag_offsets, self.last_modified]
+        return sum(len(buffer) * (buffer.itemsize if isinstance(buffer, array) else 1) for buffer in buffers)
+
+def diff_listings(src_listing, dst_listing, source_etags=None):
+    """
+    Compares two key-ordered listings in one merge pass over the encoded keys and the size columns.
+
+    Only the keys of objects that are not synced are decoded. Returns the number and bytes of synced objects and
+    {key: size} of the objects that are not synced, like is_object_synced() decides for every source key.
+    """
+    src_sizes, dst_sizes = src_listing.sizes, dst_listing.sizes
+    dst_keys = dst_listing.raw_keys()
+    dst_key = next(dst_keys, None)
+    dst_index = 0
+    synced_objects = synced_bytes = 0
+    objects_not_synced = {}
+    for src_index, src_key in enumerate(src_listing.raw_keys()):
+        while dst_key is not None and dst_key < src_key:
+            dst_key = next(dst_keys, None)
+            dst_index += 1
+        size = src_sizes[src_index]
+        synced = dst_key == src_key and dst_sizes[dst_index] == size
+        # The source version is only compared for objects the destination index knows the source ETag of
+        if synced and source_etags and src_listing.details:
+            source_etag = source_etags.get(src_key.decode('utf-8'))
+            synced = is_object_synced(src_listing.entry(src_index), (size,), source_etag)
+        if synced:
+            synced_objects += 1
+            synced_bytes += size
+        else:
+            objects_not_synced[src_key.decode('utf-8')] = size
+    return synced_objects, synced_bytes, objects_not_synced
+###
+# END: COMPACT LISTING
+###
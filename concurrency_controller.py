@@ -0,0 +1,122 @@
+import time
+from botocore.exceptions import ClientError
+from azure.core.exceptions import HttpResponseError
+
+###
+# BEGIN: THROTTLE DETECTION
+###
+# S3/Snowball error codes and HTTP statuses that mean the endpoint wants us to slow down
+THROTTLE_ERROR_CODES = {'SlowDown', 'Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'TooManyRequests', 'ServiceUnavailable', 'ServerBusy'}
+THROTTLE_HTTP_STATUSES = {429, 503}
+
+def is_throttle_error(error):
+    # Failures handed back by worker processes arrive already classified, see transfer_retry.TransferAttemptError
+    if getattr(error, 'error_class', None) is not None:
+        return error.error_class == 'throttle'
+    if isinstance(error, ClientError):
+        return (error.response.get('Error', {}).get('Code') in THROTTLE_ERROR_CODES
+                or error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') in THROTTLE_HTTP_STATUSES)
+    if isinstance(error, HttpResponseError):
+        return error.error_code in THROTTLE_ERROR_CODES or error.status_code in THROTTLE_HTTP_STATUSES
+    return False
+###
+# END: THROTTLE DETECTION
+###
+
+###
+# BEGIN: ADAPTIVE CONCURRENCY CONTROLLER
+###
+class AdaptiveConcurrency:
+    """
+    Additive-increase/multiplicative-decrease controller for the number of objects in flight.
+
+    Every interval_seconds the bytes/s of the objects that completed during the interval is compared to the previous interval.
+    Any throttle or error halves the limit, a throughput drop after an increase steps the limit back down,
+    otherwise the limit grows by increase_step. The limit always stays between floor and ceiling.
+    While the objects in flight spend rate_limited_share of their time waiting for rate limit tokens, the configured
+    rate and not the endpoints bounds the throughput, so the limit steps down instead of adding more waiting objects.
+    """
+    def __init__(self, floor, ceiling, initial, interval_seconds=10, increase_step=1, decrease_factor=0.5, throughput_tolerance=0.05, adaptive=True, rate_limited_share=0.5):
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.limit = min(max(initial, self.floor), self.ceiling)
+        self.interval_seconds = interval_seconds
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.throughput_tolerance = throughput_tolerance
+        self.adaptive = adaptive
+        self.rate_limited_share = rate_limited_share
+        self.decisions = []
+        self.interval_start = time.time()
+        self.interval_bytes = 0
+        self.interval_objects = 0
+        self.interval_errors = 0
+        self.interval_throttles = 0
+        self.previous_bytes_per_second = None
+        self.last_change = 0
+        self.interval_start_rate_limit_waited = 0
+
+    # Records the outcome of a single object
+    def record(self, obj_bytes, error=None):
+        if error is None:
+            self.interval_bytes += obj_bytes
+            self.interval_objects += 1
+        elif is_throttle_error(error):
+            self.interval_throttles += 1
+        else:
+            self.interval_errors += 1
+
+    # Re-evaluates the limit once an interval has passed, returns the decision made or None
+    # rate_limit_waited_seconds is the total the workers have waited for rate limit tokens since the start
+    def update(self, in_flight, now=None, rate_limit_waited_seconds=0):
+        now = time.time() if now is None else now
+        elapsed = now - self.interval_start
+        if not self.adaptive or elapsed < self.interval_seconds:
+            return None
+
+        bytes_per_second = self.interval_bytes / elapsed
+        waited_share = (rate_limit_waited_seconds - self.interval_start_rate_limit_waited) / (elapsed * max(1, in_flight))
+        self.interval_start_rate_limit_waited = rate_limit_waited_seconds
+        previous_limit = self.limit
+        if self.interval_throttles or self.interval_errors:
+            self.limit = max(self.floor, int(self.limit * self.decrease_factor))
+            reason = 'throttled' if self.interval_throttles else 'errors'
+        elif self.interval_objects == 0:
+            # Nothing finished (e.g. only huge objects in flight), there is nothing to judge the limit on yet
+            return None
+        elif waited_share >= self.rate_limited_share:
+            self.limit = max(self.floor, self.limit - self.increase_step)
+            reason = 'rate_limited'
+        elif self.last_change > 0 and self.previous_bytes_per_second and bytes_per_second < self.previous_bytes_per_second * (1 - self.throughput_tolerance):
+            self.limit = max(self.floor, self.limit - self.increase_step)
+            reason = 'throughput_dropped'
+        elif in_flight < self.limit or waited_share >= self.rate_limited_share / 5:
+            # The limit was not the bottleneck during this interval (or the rate limit nearly was), growing it would tell us nothing
+            reason = 'hold'
+        else:
+            self.limit = min(self.ceiling, self.limit + self.increase_step)
+            reason = 'throughput_ok'
+
+        decision = {'epoch_time': int(now),
+                    'previous_limit': previous_limit,
+                    'limit': self.limit,
+                    'reason': reason,
+                    'bytes_per_second': int(bytes_per_second),
+                    'objects': self.interval_objects,
+                    'errors': self.interval_errors,
+                    'throttles': self.interval_throttles,
+                    'rate_limit_waited_share': round(waited_share, 3)}
+        self.last_change = self.limit - previous_limit
+        self.previous_bytes_per_second = bytes_per_second
+        self.interval_start = now
+        self.interval_bytes = 0
+        self.interval_objects = 0
+        self.interval_errors = 0
+        self.interval_throttles = 0
+        if self.last_change == 0:
+            return None
+        self.decisions.append(decision)
+        return decision
+###
+# END: ADAPTIVE CONCURRENCY CONTROLLER
+###
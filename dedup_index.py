@@ -0,0 +1,91 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+
+###
+# BEGIN: CONTENT HASHES
+###
+# MD5 hex digests and S3 multipart ETags identify content, other ETags (e.g. Azure blob versions) only identify a version
+CONTENT_HASH_PATTERN = re.compile(r'^[0-9a-f]{32}(-[0-9]+)?$')
+
+# Returns the value if it identifies the content of an object, otherwise None
+def content_hash(value):
+    if value and CONTENT_HASH_PATTERN.match(value):
+        return value
+    return None
+###
+# END: CONTENT HASHES
+###
+
+###
+# BEGIN: DEDUP INDEX
+###
+# One index per destination bucket, a server-side copy can reuse any key within it
+def dedup_index_path(index_directory, service, bucket):
+    location = f"{service}:{bucket}"
+    return os.path.join(index_directory, f"dedup_index_{hashlib.sha1(location.encode('utf-8')).hexdigest()[:16]}.sqlite")
+
+class DedupIndex:
+    """
+    Persistent map from content hash and size to a destination key that holds that content.
+
+    Every copied object is recorded under all the hashes known for it: the source ETag or Content-MD5, the MD5
+    computed while streaming and the ETag of the copy. A later object with one of those hashes and the same size
+    is created by a server-side copy of the recorded key instead of moving its bytes again. Keys recorded by this
+    run are trusted, keys from earlier runs only once the caller has checked they still hold that content.
+    """
+    def __init__(self, index_path):
+        self.index_path = index_path
+        directory = os.path.dirname(index_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(index_path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS content (hash TEXT, size INTEGER, key TEXT, recorded_epoch INTEGER, PRIMARY KEY (hash, size))")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS content_key ON content (key)")
+        self.recorded = {}
+        self.pending_records = []
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def lookup(self, hashes, size):
+        """
+        Returns (key, recorded_by_this_run) of an object holding content with one of hashes and size, or None.
+        """
+        for value in hashes:
+            if (value, size) in self.recorded:
+                return self.recorded[(value, size)], True
+        for value in hashes:
+            row = self.connection.execute("SELECT key FROM content WHERE hash = ? AND size = ?", (value, size)).fetchone()
+            if row:
+                return row[0], False
+        return None
+
+    # Records a destination key written by this run under every hash known for its content
+    def record(self, hashes, size, key):
+        for value in hashes:
+            self.recorded[(value, size)] = key
+            self.pending_records.append((value, size, key, int(time.time())))
+
+    # Drops a key that turned out not to hold the recorded content anymore
+    def forget(self, key):
+        self.commit()
+        self.recorded = {entry: recorded_key for entry, recorded_key in self.recorded.items() if recorded_key != key}
+        with self.connection:
+            self.connection.execute("DELETE FROM content WHERE key = ?", (key,))
+
+    def commit(self):
+        if not self.pending_records:
+            return
+        pending_records, self.pending_records = self.pending_records, []
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO content (hash, size, key, recorded_epoch) VALUES (?, ?, ?, ?)", pending_records)
+###
+# END: DEDUP INDEX
+###
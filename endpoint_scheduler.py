@@ -0,0 +1,86 @@
+import threading
+
+###
+# BEGIN: ENDPOINT SCHEDULER
+###
+class EndpointScheduler:
+    """
+    Hands each object to the endpoint expected to finish its outstanding work soonest.
+
+    Every endpoint is modelled as seconds = latency + bytes * seconds_per_byte, fitted by a decayed least squares over the
+    objects it copied, so per-request latency (which dominates tiny objects) and bandwidth (which dominates huge ones) are
+    measured separately and the model does not depend on how much work the endpoint happened to be given.
+    The outstanding work of an endpoint is the objects and bytes assigned to it that have not finished yet.
+    Endpoints without a model yet borrow the average of the others, and with no measurements at all objects are spread by outstanding bytes.
+    """
+    def __init__(self, endpoint_urls, decay=0.95):
+        self.endpoint_urls = list(endpoint_urls)
+        self.decay = decay
+        self.lock = threading.Lock()
+        self.outstanding_bytes = {endpoint_url: 0 for endpoint_url in self.endpoint_urls}
+        self.outstanding_objects = {endpoint_url: 0 for endpoint_url in self.endpoint_urls}
+        self.completed_bytes = {endpoint_url: 0 for endpoint_url in self.endpoint_urls}
+        # Decayed sums of n, bytes, seconds, bytes^2 and bytes*seconds for the least squares fit
+        self.fit_sums = {endpoint_url: [0.0, 0.0, 0.0, 0.0, 0.0] for endpoint_url in self.endpoint_urls}
+
+    # Returns (latency_seconds, seconds_per_byte) for the endpoint, None until it has finished something
+    def model(self, endpoint_url):
+        n, sum_bytes, sum_seconds, sum_bytes_squared, sum_bytes_seconds = self.fit_sums[endpoint_url]
+        if n <= 0:
+            return None
+        mean_bytes = sum_bytes / n
+        mean_seconds = sum_seconds / n
+        variance = sum_bytes_squared / n - mean_bytes * mean_bytes
+        if variance <= 0 or mean_bytes <= 0:
+            # All objects were the same size, the split between latency and bandwidth is unknown so treat it all as bandwidth
+            return (0.0, mean_seconds / mean_bytes) if mean_bytes > 0 else (mean_seconds, 0.0)
+        seconds_per_byte = max(0.0, (sum_bytes_seconds / n - mean_bytes * mean_seconds) / variance)
+        latency_seconds = max(0.0, mean_seconds - seconds_per_byte * mean_bytes)
+        return latency_seconds, seconds_per_byte
+
+    # Picks the least loaded endpoint for an object and counts the object against it until complete() is called
+    def assign(self, obj_bytes, exclude=()):
+        with self.lock:
+            candidates = [endpoint_url for endpoint_url in self.endpoint_urls if endpoint_url not in exclude] or self.endpoint_urls
+            models = {endpoint_url: self.model(endpoint_url) for endpoint_url in candidates}
+            known_models = [model for model in models.values() if model]
+            if known_models:
+                default_model = (sum(model[0] for model in known_models) / len(known_models), sum(model[1] for model in known_models) / len(known_models))
+            else:
+                default_model = (0.0, 1.0)
+
+            def expected_drain_seconds(endpoint_url):
+                latency_seconds, seconds_per_byte = models[endpoint_url] or default_model
+                return (self.outstanding_objects[endpoint_url] + 1) * latency_seconds + (self.outstanding_bytes[endpoint_url] + obj_bytes) * seconds_per_byte
+
+            # Ties (e.g. nothing measured yet and empty objects) go to the endpoint with fewer objects so objects still round-robin
+            endpoint_url = min(candidates, key=lambda url: (expected_drain_seconds(url), self.outstanding_objects[url]))
+            self.outstanding_bytes[endpoint_url] += obj_bytes
+            self.outstanding_objects[endpoint_url] += 1
+            return endpoint_url
+
+    # Releases an object from its endpoint, only successful copies (with an elapsed time) update the endpoint's model
+    def complete(self, endpoint_url, obj_bytes, elapsed_seconds=None):
+        with self.lock:
+            self.outstanding_bytes[endpoint_url] -= obj_bytes
+            self.outstanding_objects[endpoint_url] -= 1
+            if elapsed_seconds is not None:
+                self.completed_bytes[endpoint_url] += obj_bytes
+                sums = self.fit_sums[endpoint_url]
+                for i, value in enumerate((1.0, obj_bytes, elapsed_seconds, obj_bytes * obj_bytes, obj_bytes * elapsed_seconds)):
+                    sums[i] = self.decay * sums[i] + value
+
+    # Per endpoint totals for the transfer JSON
+    def summary(self):
+        with self.lock:
+            summary = {}
+            for endpoint_url in self.endpoint_urls:
+                latency_seconds, seconds_per_byte = self.model(endpoint_url) or (None, None)
+                summary[endpoint_url] = {'bytes_transferred': self.completed_bytes[endpoint_url],
+                                         'latency_seconds': latency_seconds,
+                                         'stream_bytes_per_second': int(1 / seconds_per_byte) if seconds_per_byte else None,
+                                         'outstanding_bytes': self.outstanding_bytes[endpoint_url]}
+            return summary
+###
+# END: ENDPOINT SCHEDULER
+###
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+###
+# BEGIN: LISTING INDEX
+###
+# One index per bucket prefix, shared by every job that reads from or writes to it
+def listing_index_path(index_directory, service, bucket, prefix):
+    location = f"{service}:{bucket}/{prefix}"
+    return os.path.join(index_directory, f"listing_index_{hashlib.sha1(location.encode('utf-8')).hexdigest()[:16]}.sqlite")
+
+# An object is synced when the destination has it at the same size, and, when it is known which source ETag the
+# destination copy was made from, that ETag is still the current one, so same-size changes at the source are caught
+def is_object_synced(src_entry, dst_entry, source_etag=None):
+    if dst_entry is None or src_entry[0] != dst_entry[0]:
+        return False
+    return source_etag is None or src_entry[1] is None or source_etag == src_entry[1]
+
+class ListingIndex:
+    """
+    Persistent local listing of one bucket prefix: key -> (size, etag, last_modified).
+
+    refresh() folds in a new listing and only writes the rows that changed. A destination index also records, for
+    every object this tool copied, the source ETag it was copied from and the ETag the copy should have. It is kept
+    current from completed copies with record(), with verify_from_destination_index it verifies a transfer without listing again,
+    and when destination_index_max_age_seconds is set it also stands in for the listing before the transfer. The expected
+    ETag survives refreshes for cloud_verify.py to compare with. A source index remembers when each shard was listed.
+    """
+    def __init__(self, index_path):
+        self.index_path = index_path
+        directory = os.path.dirname(index_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(index_path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS objects (key TEXT PRIMARY KEY, size INTEGER, etag TEXT, last_modified INTEGER, source_etag TEXT, expected_etag TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS shards (shard TEXT PRIMARY KEY, listed_epoch INTEGER)")
+            # Indexes written before expected ETags were recorded
+            if 'expected_etag' not in [column[1] for column in self.connection.execute("PRAGMA table_info(objects)")]:
+                self.connection.execute("ALTER TABLE objects ADD COLUMN expected_etag TEXT")
+        self.pending_records = []
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def get_meta(self, name, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, **values):
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", [(name, json.dumps(value)) for name, value in values.items()])
+
+    # Returns {key: (size, etag, last_modified)}
+    def objects(self):
+        return {key: (size, etag, last_modified) for key, size, etag, last_modified in self.connection.execute("SELECT key, size, etag, last_modified FROM objects")}
+
+    # Returns {key: source_etag} for the objects whose source version is known
+    def source_etags(self):
+        return dict(self.connection.execute("SELECT key, source_etag FROM objects WHERE source_etag IS NOT NULL"))
+
+    # Returns {key: expected_etag} for the objects this tool copied and knows the resulting ETag of
+    def expected_etags(self):
+        return dict(self.connection.execute("SELECT key, expected_etag FROM objects WHERE expected_etag IS NOT NULL"))
+
+    # Returns (size, etag, expected_etag) of a key, or None when it is not indexed
+    def entry(self, key):
+        return self.connection.execute("SELECT size, etag, expected_etag FROM objects WHERE key = ?", (key,)).fetchone()
+
+    # Makes the next diff copy these objects again however their sizes compare, an empty source ETag matches no source version
+    def invalidate(self, keys):
+        self.commit()
+        with self.connection:
+            self.connection.executemany("UPDATE objects SET source_etag = '' WHERE key = ?", [(key,) for key in keys])
+
+    # Returns the indexed objects when the last full listing is younger than max_age_seconds, otherwise (or when it is 0) None
+    def fresh_objects(self, max_age_seconds):
+        refreshed_epoch = self.get_meta('refreshed_epoch')
+        if not max_age_seconds or refreshed_epoch is None or time.time() - refreshed_epoch > max_age_seconds:
+            return None
+        return self.objects()
+
+    def refresh(self, listing):
+        """
+        Replaces the index with a full listing {key: (size, etag, last_modified)}, writing only what changed.
+
+        A row keeps its source ETag while the listed object is still the one recorded, rows recorded from a
+        completed copy (no ETag yet) take the listed ETag. A resized object loses its expected ETag, a rewritten one
+        keeps it so the rewrite shows up in verification. Returns the number of added, changed and removed keys.
+        """
+        self.commit()
+        indexed = {key: (size, etag, last_modified) for key, size, etag, last_modified in self.connection.execute("SELECT key, size, etag, last_modified FROM objects")}
+        added, resized, changed, filled = [], [], [], []
+        for key, (size, etag, last_modified) in listing.items():
+            entry = indexed.pop(key, None)
+            if entry is None:
+                added.append((key, size, etag, last_modified))
+            elif entry[0] != size:
+                resized.append((size, etag, last_modified, key))
+            elif entry[1] is not None and entry[1] != etag:
+                changed.append((etag, last_modified, key))
+            elif entry[1] is None or entry[2] != last_modified:
+                filled.append((etag, last_modified, key))
+        with self.connection:
+            self.connection.executemany("INSERT INTO objects (key, size, etag, last_modified, source_etag, expected_etag) VALUES (?, ?, ?, ?, NULL, NULL)", added)
+            self.connection.executemany("UPDATE objects SET size = ?, etag = ?, last_modified = ?, source_etag = NULL, expected_etag = NULL WHERE key = ?", resized)
+            self.connection.executemany("UPDATE objects SET etag = ?, last_modified = ?, source_etag = NULL WHERE key = ?", changed)
+            self.connection.executemany("UPDATE objects SET etag = ?, last_modified = ? WHERE key = ?", filled)
+            self.connection.executemany("DELETE FROM objects WHERE key = ?", [(key,) for key in indexed])
+            self.connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('refreshed_epoch', ?)", (json.dumps(int(time.time())),))
+        return {'added': len(added), 'changed': len(resized) + len(changed), 'removed': len(indexed)}
+
+    # Returns {key: (size, etag, last_modified)} of the keys below key_prefix, after start_after and up to end_at
+    def range_objects(self, key_prefix, start_after=None, end_at=None):
+        query = "SELECT key, size, etag, last_modified FROM objects WHERE key >= ? AND key < ?"
+        parameters = [key_prefix, key_prefix + '\U0010ffff']
+        if start_after is not None:
+            query += " AND key > ?"
+            parameters.append(start_after)
+        if end_at is not None:
+            query += " AND key <= ?"
+            parameters.append(end_at)
+        return {key: (size, etag, last_modified) for key, size, etag, last_modified in self.connection.execute(query, parameters)}
+
+    def shard_listed_epoch(self, shard):
+        row = self.connection.execute("SELECT listed_epoch FROM shards WHERE shard = ?", (shard,)).fetchone()
+        return row[0] if row else None
+
+    # Records that these shards were listed now, only once the listing they were part of has been refreshed into the index
+    def mark_shards_listed(self, shards):
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO shards (shard, listed_epoch) VALUES (?, ?)", [(shard, int(time.time())) for shard in shards])
+
+    # Queues an object this run wrote, its ETag is filled in by the next full listing
+    def record(self, key, size, source_etag=None, expected_etag=None):
+        self.pending_records.append((key, size, int(time.time()), source_etag, expected_etag))
+
+    def commit(self):
+        if not self.pending_records:
+            return
+        pending_records, self.pending_records = self.pending_records, []
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO objects (key, size, etag, last_modified, source_etag, expected_etag) VALUES (?, ?, NULL, ?, ?, ?)", pending_records)
+
+class ShardCache:
+    """
+    Lets list_objects_parallel() take shards listed within max_age_seconds from a source index instead of listing them.
+
+    Shard discovery still lists the delimiter levels, so new sub-prefixes and objects near the top are always seen. Each
+    shard is relisted after a share of max_age_seconds between half and all of it that is fixed per shard, so the shards
+    of one first listing are relisted spread over later runs rather than all in the same one. Changes inside a shard
+    that is taken from the index are only seen once it is relisted, so this is opt-in.
+    """
+    def __init__(self, index, max_age_seconds):
+        self.index = index
+        self.max_age_seconds = max_age_seconds
+        self.listed_shards = []
+        self.reused_shards = 0
+
+    def get(self, shard, key_prefix, start_after, end_at):
+        shard_id = json.dumps(shard)
+        listed_epoch = self.index.shard_listed_epoch(shard_id)
+        spread = 0.5 + int(hashlib.sha1(shard_id.encode('utf-8')).hexdigest()[:8], 16) / 0x100000000 / 2
+        if listed_epoch is None or time.time() - listed_epoch > self.max_age_seconds * spread:
+            return None
+        self.reused_shards += 1
+        return self.index.range_objects(key_prefix, start_after, end_at)
+
+    def listed(self, shards):
+        self.listed_shards.extend(json.dumps(shard) for shard in shards)
+
+    # Called after the listing was refreshed into the index
+    def commit(self):
+        self.index.mark_shards_listed(self.listed_shards)
+        self.listed_shards = []
+###
+# END: LISTING INDEX
+###
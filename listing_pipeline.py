@@ -0,0 +1,137 @@
+import queue
+import threading
+from utils import s3_listing_entry, blob_listing_entry
+from local_storage import walk_local_objects, local_listing_entry
+from listing_index import is_object_synced
+
+###
+# BEGIN: ORDERED LISTING
+###
+# Yields the listing of a prefix one page at a time, as [(key, (size, etag, last_modified))] in key order
+def iter_listing_pages(service, bucket_name, prefix, client, isSnow=False):
+    if prefix == '/':
+        prefix=''
+    if service == "AWS":
+        prefix = prefix.lstrip('/') + '/'
+        s3_api = client.meta.client if isSnow else client
+        for page in s3_api.get_paginator('list_objects' if isSnow else 'list_objects_v2').paginate(Bucket=bucket_name, Prefix=prefix):
+            yield [(obj['Key'].replace(prefix, '', 1).lstrip('/'), s3_listing_entry(obj, True)) for obj in page.get('Contents', []) if not obj['Key'].endswith('/')]
+    elif service == "AZURE":
+        container_client = client.get_container_client(bucket_name)
+        for page in container_client.list_blobs(name_starts_with=prefix).by_page():
+            yield [(blob.name.replace(prefix, '', 1).lstrip('/'), blob_listing_entry(blob, True)) for blob in page if not blob.name.endswith('/')]
+    elif service == "LOCAL":
+        # Pages of the same size S3 lists in
+        page = []
+        for key, stat in walk_local_objects(client.path(bucket_name, prefix)):
+            page.append((key, local_listing_entry(stat, True)))
+            if len(page) >= 1000:
+                yield page
+                page = []
+        if page:
+            yield page
+
+# Lists ahead in a background thread, at most max_pages pages are held before the consumer catches up
+def prefetch_pages(pages, max_pages=8):
+    page_queue = queue.Queue(maxsize=max_pages)
+    def produce():
+        try:
+            for page in pages:
+                page_queue.put((page, None))
+        except Exception as e:
+            page_queue.put((None, e))
+        page_queue.put((None, None))
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        page, error = page_queue.get()
+        if error is not None:
+            raise error
+        if page is None:
+            return
+        yield from page
+
+# Walks two key-ordered listings side by side, yields (key, src_entry, dst_entry or None) for every source key
+def merge_join_listings(src_entries, dst_entries):
+    dst_entries = iter(dst_entries)
+    dst_key, dst_entry = next(dst_entries, (None, None))
+    for src_key, src_entry in src_entries:
+        while dst_key is not None and dst_key < src_key:
+            dst_key, dst_entry = next(dst_entries, (None, None))
+        yield src_key, src_entry, (dst_entry if dst_key == src_key else None)
+###
+# END: ORDERED LISTING
+###
+
+###
+# BEGIN: LISTING PIPELINE
+###
+class ListingPipeline:
+    """
+    Lists source and destination in key order in a background thread and merge-joins them, so objects to move are
+    handed to the dispatcher while the listing is still running and no side has to be held in memory as a whole.
+
+    The thread stops listing once max_queued objects to move are waiting to be taken, take() never blocks.
+    """
+    def __init__(self, src_entries, dst_entries, max_queued=10000, batch_size=1000):
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=max(1, max_queued // batch_size))
+        self.buffer = []
+        self.synced_objects = 0
+        self.listed_objects = 0
+        self.listing_complete = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, args=(src_entries, dst_entries), daemon=True)
+        self.thread.start()
+
+    def run(self, src_entries, dst_entries):
+        try:
+            batch = []
+            for key, src_entry, dst_entry in merge_join_listings(src_entries, dst_entries):
+                self.listed_objects += 1
+                if is_object_synced(src_entry, dst_entry):
+                    self.synced_objects += 1
+                    continue
+                batch.append((key, src_entry[0]))
+                if len(batch) >= self.batch_size:
+                    self.queue.put(batch)
+                    batch = []
+            if batch:
+                self.queue.put(batch)
+        except Exception as e:
+            self.error = e
+        self.queue.put(None)
+
+    # Returns up to limit (key, bytes) pairs that are listed and not synced yet, without waiting for more
+    def take(self, limit):
+        while len(self.buffer) < limit and not self.listing_complete:
+            try:
+                batch = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.receive(batch)
+        taken, self.buffer = self.buffer[:max(0, limit)], self.buffer[max(0, limit):]
+        return taken
+
+    # Blocks until more objects are listed or the listing finishes
+    def wait(self, timeout):
+        if self.listing_complete:
+            return
+        try:
+            self.receive(self.queue.get(timeout=timeout))
+        except queue.Empty:
+            pass
+
+    def receive(self, batch):
+        if batch is None:
+            self.listing_complete = True
+            if self.error is not None:
+                raise self.error
+            return
+        self.buffer.extend(batch)
+
+    @property
+    def finished(self):
+        return self.listing_complete and not self.buffer
+###
+# END: LISTING PIPELINE
+###
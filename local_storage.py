@@ -0,0 +1,216 @@
+import os
+import shutil
+import threading
+import concurrent.futures
+
+###
+# BEGIN: LOCAL FILESYSTEM CLIENT
+###
+# Files are written under this suffix and renamed once complete, listings skip them so a partial file never looks synced
+PARTIAL_SUFFIX = '.dtu-partial'
+# Bytes moved per read/write or copy_file_range call
+COPY_CHUNK_BYTES = 8388608
+
+class LocalClient:
+    """
+    Stands in for a storage client when the service is LOCAL: the bucket is a directory and keys are paths below it.
+
+    endpoint_url is the mount point the bucket directory is relative to, so several mounts of the same NFS export
+    are used like the endpoints of a bucket. With 'no_endpoint' the bucket is a path of its own.
+    """
+    def __init__(self, endpoint_url='no_endpoint'):
+        self.root = '' if endpoint_url in (None, 'no_endpoint') else endpoint_url
+
+    def path(self, bucket_name, key=''):
+        path = os.path.join(self.root, bucket_name) if self.root else bucket_name
+        return os.path.join(path, key.lstrip('/')) if key else path
+###
+# END: LOCAL FILESYSTEM CLIENT
+###
+
+###
+# BEGIN: LOCAL LISTING
+###
+def local_listing_entry(stat, details):
+    # There is no content hash without reading the file, the entry has no ETag
+    return (stat.st_size, None, int(stat.st_mtime)) if details else stat.st_size
+
+# Returns ([(name, stat)] of the files, [name] of the subdirectories) of a directory, a missing directory is empty
+def scan_local_directory(directory):
+    files, subdirectories = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.name)
+                elif entry.is_file() and not entry.name.endswith(PARTIAL_SUFFIX):
+                    files.append((entry.name, entry.stat()))
+    except FileNotFoundError:
+        pass
+    return files, subdirectories
+
+# Yields (key, stat) below a directory in the byte order of the keys, the order S3 and Azure list in
+def walk_local_objects(directory, relative_path=''):
+    files, subdirectories = scan_local_directory(directory)
+    # A directory sorts as its name with the '/' every key below it continues with
+    entries = sorted([(name, stat) for name, stat in files] + [(name + '/', None) for name in subdirectories], key=lambda entry: entry[0])
+    for name, stat in entries:
+        if stat is None:
+            yield from walk_local_objects(os.path.join(directory, name[:-1]), relative_path + name)
+        else:
+            yield relative_path + name, stat
+
+def list_local_objects(bucket_name, prefix, client, details=False):
+    return {key: local_listing_entry(stat, details) for key, stat in walk_local_objects(client.path(bucket_name, prefix))}
+
+def list_local_objects_parallel(bucket_name, prefix, clients, details=False, max_workers=16, progress=None):
+    """
+    Walks the directory tree with max_workers directories scanned at once, round-robin over the clients (mounts).
+
+    Every directory is one task, on NFS the per-directory round trips rather than the bytes are what takes the time.
+    progress is called with the number of objects found so far after every directory.
+    """
+    objects = {}
+    def scan(index, relative_path):
+        return relative_path, scan_local_directory(os.path.join(clients[index % len(clients)].path(bucket_name, prefix), relative_path))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        submitted = 0
+        pending = {executor.submit(scan, submitted, '')}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                relative_path, (files, subdirectories) = future.result()
+                for name, stat in files:
+                    objects[relative_path + name] = local_listing_entry(stat, details)
+                for name in subdirectories:
+                    submitted += 1
+                    pending.add(executor.submit(scan, submitted, relative_path + name + '/'))
+                if progress is not None:
+                    progress(len(objects))
+    return objects
+###
+# END: LOCAL LISTING
+###
+
+###
+# BEGIN: LOCAL READS AND WRITES
+###
+# One read buffer per thread, reused for every byte range of the same length the thread reads
+local_read_buffers = threading.local()
+
+def read_local_range(path, offset, length):
+    """
+    Reads a byte range with preadv into a buffer the calling thread reuses, so a large copy does not allocate
+    a new part-sized bytes object per range. The buffer is only valid until the thread's next read.
+    """
+    buffer = getattr(local_read_buffers, 'buffer', None)
+    if buffer is None or len(buffer) != length:
+        buffer = local_read_buffers.buffer = bytearray(length)
+    view = memoryview(buffer)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        filled = 0
+        while filled < length:
+            read = os.preadv(fd, [view[filled:]], offset + filled)
+            if read == 0:
+                raise EOFError(f"'{path}' ended {length - filled} bytes before the end of the range at {offset}")
+            filled += read
+    finally:
+        os.close(fd)
+    return buffer
+
+def partial_path(path):
+    return path + PARTIAL_SUFFIX
+
+# Creates the partial file of an object and reserves its blocks up front, so parts can be written at their offsets
+# and a full disk fails the copy at the start rather than halfway. Filesystems without fallocate (NFS < 4.2) just grow.
+def open_local_partial(path, obj_bytes, truncate=True):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd = os.open(partial_path(path), os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if truncate else 0), 0o644)
+    if obj_bytes and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, obj_bytes)
+        except OSError:
+            pass
+    return fd
+
+def write_local_range(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+# Renames the complete partial file over the object, readers only ever see a whole file
+def commit_local_partial(path):
+    os.replace(partial_path(path), path)
+
+def discard_local_partial(path):
+    try:
+        os.remove(partial_path(path))
+    except FileNotFoundError:
+        pass
+
+# Streams a readable into the object's partial file, the caller commits or discards it
+def write_local_stream(path, reader, obj_bytes):
+    fd = open_local_partial(path, obj_bytes)
+    try:
+        offset = 0
+        while True:
+            data = reader.read(COPY_CHUNK_BYTES)
+            if not data:
+                break
+            write_local_range(fd, data, offset)
+            offset += len(data)
+        # Space reserved for a source that turned out shorter is given back
+        os.ftruncate(fd, offset)
+    finally:
+        os.close(fd)
+
+def copy_local_file(src_path, dst_path):
+    """
+    Copies a file within the local filesystems without the bytes passing through this process: copy_file_range
+    (which NFS 4.2 and reflinking filesystems turn into a server-side copy or a clone), sendfile where it is not
+    supported and a buffered copy as the last resort.
+    """
+    obj_bytes = os.stat(src_path).st_size
+    src_fd = os.open(src_path, os.O_RDONLY)
+    dst_fd = open_local_partial(dst_path, obj_bytes)
+    try:
+        offset = 0
+        for copy_chunk in (copy_file_range_chunk, sendfile_chunk):
+            try:
+                while offset < obj_bytes:
+                    copied = copy_chunk(src_fd, dst_fd, offset, min(COPY_CHUNK_BYTES, obj_bytes - offset))
+                    if copied == 0:
+                        break
+                    offset += copied
+                break
+            except (AttributeError, OSError):
+                # Not available on this platform or between these filesystems, continue where the last call left off
+                continue
+        if offset < obj_bytes:
+            with open(src_path, 'rb') as src_file, open(dst_fd, 'wb', closefd=False) as dst_file:
+                src_file.seek(offset)
+                dst_file.seek(offset)
+                shutil.copyfileobj(src_file, dst_file, COPY_CHUNK_BYTES)
+        os.ftruncate(dst_fd, obj_bytes)
+    except Exception:
+        os.close(dst_fd)
+        discard_local_partial(dst_path)
+        raise
+    finally:
+        os.close(src_fd)
+    os.close(dst_fd)
+    commit_local_partial(dst_path)
+    return obj_bytes
+
+def copy_file_range_chunk(src_fd, dst_fd, offset, length):
+    return os.copy_file_range(src_fd, dst_fd, length, offset, offset)
+
+def sendfile_chunk(src_fd, dst_fd, offset, length):
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, offset, length)
+###
+# END: LOCAL READS AND WRITES
+###
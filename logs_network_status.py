@@ -1,4 +1,5 @@
-from utils import read_config, create_client, is_endpoint_healthy, write_json
+from utils import read_config, create_client, is_endpoint_healthy, write_json, get_transfer_setting
+from transfer_metrics import network_status_metrics_registry, set_endpoints_status, expose_metrics
 import time
 import os
 
@@ -28,6 +29,11 @@ dst_endpoint_urls = config['dst']['endpoint_urls']
 
 log_local_directory = config['log']['local_directory']
 
+# Endpoint health for Prometheus, updated after every round of checks
+metrics = network_status_metrics_registry()
+refresh_metrics_textfile = expose_metrics(metrics, get_transfer_setting(config, 'network_status_metrics_port'),
+                                          get_transfer_setting(config, 'metrics_textfile_directory'), 'data_transfer_network_status.prom')
+
 ###
 # END: LOAD IN CONFIGURATIONS
 ###
@@ -42,11 +48,14 @@ while True:
     src_endpoint_urls_failed = []
     for src_endpoint_url in src_endpoint_urls:
         print(f'Checking source endpoint: {src_endpoint_url}')
+        check_start_time = time.time()
         src_client = create_client(src_service, src_access_key, src_secret_access_key, src_region, src_endpoint_url)
         if is_endpoint_healthy(src_service, src_bucket, src_prefix, src_client, isSnow=(src_region=='snow')):
             src_endpoint_urls_succeeded.append(src_endpoint_url)
         else:
             src_endpoint_urls_failed.append(src_endpoint_url)
+        metrics.set('endpoint_healthy', int(src_endpoint_url in src_endpoint_urls_succeeded), side='src', endpoint_url=src_endpoint_url)
+        metrics.set('endpoint_health_check_seconds', round(time.time() - check_start_time, 3), side='src', endpoint_url=src_endpoint_url)
     
     src_endpoints_operational_status = ''
     if len(src_endpoint_urls_succeeded) == 0:
@@ -60,11 +69,14 @@ while True:
     dst_endpoint_urls_failed = []
     for dst_endpoint_url in dst_endpoint_urls:
         print(f'Checking destination endpoint: {dst_endpoint_url}')
+        check_start_time = time.time()
         dst_client = create_client(dst_service, dst_access_key, dst_secret_access_key, dst_region, dst_endpoint_url)
         if is_endpoint_healthy(dst_service, dst_bucket, dst_prefix, dst_client, isSnow=(dst_region=='snow')):
             dst_endpoint_urls_succeeded.append(dst_endpoint_url)
         else:
             dst_endpoint_urls_failed.append(dst_endpoint_url)
+        metrics.set('endpoint_healthy', int(dst_endpoint_url in dst_endpoint_urls_succeeded), side='dst', endpoint_url=dst_endpoint_url)
+        metrics.set('endpoint_health_check_seconds', round(time.time() - check_start_time, 3), side='dst', endpoint_url=dst_endpoint_url)
     
     dst_endpoints_operational_status = ''
     if len(dst_endpoint_urls_succeeded) == 0:
@@ -83,6 +95,11 @@ while True:
         "dst_endpoints_operational_status": dst_endpoints_operational_status
     }
 
+    set_endpoints_status(metrics, 'src', src_endpoints_operational_status)
+    set_endpoints_status(metrics, 'dst', dst_endpoints_operational_status)
+    metrics.set('health_check_time_seconds', int(time.time()))
+    refresh_metrics_textfile()
+
     write_json(network_status_data_json_dir, failed_endpoints_dict)
     print(f"Configuration details saved to {network_status_data_json_dir}")
     time.sleep(10)
\ No newline at end of file
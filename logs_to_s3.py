@@ -44,6 +44,9 @@ def get_s3_file_last_modified(s3_client, bucket, key):
 def sync_logs_to_s3():
     for root, dirs, files in os.walk(log_local_directory):
         for file in files:
+            # Hidden files are temporary copies of documents that are still being written
+            if file.startswith('.'):
+                continue
             local_path = os.path.join(root, file)
             relative_path = os.path.relpath(local_path, log_local_directory)
             s3_path = os.path.join(log_prefix, relative_path)
@@ -0,0 +1,124 @@
+import time
+import multiprocessing
+from utils import get_transfer_setting
+
+###
+# BEGIN: TOKEN BUCKETS
+###
+class TokenBucket:
+    """
+    A token bucket in shared memory, so the dispatcher and every forked worker draw from the same budget.
+
+    Tokens refill at rate per second up to rate * burst_seconds. A caller takes what it needs even when that drives
+    the bucket into debt and then sleeps until the debt is paid back, so a single read larger than the bucket still
+    goes through and every caller is delayed in the order it arrived.
+    """
+    def __init__(self, rate, burst_seconds=1.0, context=None):
+        context = context or multiprocessing.get_context('fork')
+        self.rate = float(rate)
+        self.capacity = self.rate * burst_seconds
+        self.lock = context.Lock()
+        # Tokens left and the monotonic time they were counted at, CLOCK_MONOTONIC is shared by all processes
+        self.state = context.RawArray('d', [self.capacity, time.monotonic()])
+
+    # Takes amount tokens and returns the seconds the caller has to wait before using them
+    def reserve(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            tokens = min(self.capacity, self.state[0] + (now - self.state[1]) * self.rate) - amount
+            self.state[0] = tokens
+            self.state[1] = now
+        return -tokens / self.rate if tokens < 0 else 0.0
+###
+# END: TOKEN BUCKETS
+###
+
+###
+# BEGIN: RATE LIMITER
+###
+class RateLimiter:
+    """
+    Caps the bytes/s and requests/s of a transfer as a whole and of every endpoint on its own.
+
+    The job buckets count every byte once, when it is read from the source, and every request. An endpoint's buckets
+    count the bytes and requests sent to it, so an endpoint serving both sides shares one budget. A caller waits for
+    the slowest of the buckets it draws from, and the seconds waited are summed for the concurrency controller.
+    """
+    def __init__(self, job_limits, endpoint_limits, burst_seconds=1.0, context=None):
+        context = context or multiprocessing.get_context('fork')
+        self.job_buckets = {kind: TokenBucket(rate, burst_seconds, context) for kind, rate in job_limits.items() if rate}
+        self.endpoint_buckets = {endpoint_url: {kind: TokenBucket(rate, burst_seconds, context) for kind, rate in limits.items() if rate}
+                                 for endpoint_url, limits in endpoint_limits.items()}
+        self.waited = context.Value('d', 0.0)
+
+    def acquire(self, endpoint_urls, bytes=0, requests=0, job_bytes=None):
+        """
+        Blocks until bytes and requests fit the limits of the job and of endpoint_urls.
+
+        job_bytes is what counts against the job, by default bytes, 0 for the write of bytes already counted when read.
+        """
+        job_bytes = bytes if job_bytes is None else job_bytes
+        wait_seconds = 0.0
+        for kind, amount in (('bytes', job_bytes), ('requests', requests)):
+            if amount and kind in self.job_buckets:
+                wait_seconds = max(wait_seconds, self.job_buckets[kind].reserve(amount))
+        for endpoint_url in endpoint_urls:
+            for kind, amount in (('bytes', bytes), ('requests', requests)):
+                bucket = self.endpoint_buckets.get(endpoint_url, {}).get(kind)
+                if amount and bucket is not None:
+                    wait_seconds = max(wait_seconds, bucket.reserve(amount))
+        if wait_seconds > 0:
+            with self.waited.get_lock():
+                self.waited.value += wait_seconds
+            time.sleep(wait_seconds)
+
+    # Seconds every process together has waited for tokens so far
+    def waited_seconds(self):
+        return self.waited.value
+
+class RateLimitedStream:
+    """
+    Wraps a readable source body so every read draws its bytes from the rate limiter before it is handed on.
+
+    With a part_size the body feeds an upload sent as one request per part: the request of every part after the first
+    is drawn from part_endpoint_urls as the part's first bytes are read, so the requests are paced along with the
+    upload instead of all being reserved before it starts. The caller draws the first request itself.
+    """
+    def __init__(self, stream, rate_limiter, endpoint_urls, part_size=None, part_endpoint_urls=()):
+        self.stream = stream
+        self.rate_limiter = rate_limiter
+        self.endpoint_urls = endpoint_urls
+        self.part_size = part_size
+        self.part_endpoint_urls = part_endpoint_urls
+        self.bytes_read = 0
+        self.parts_started = 1
+
+    def read(self, size=-1):
+        data = self.stream.read() if size is None or size < 0 else self.stream.read(size)
+        self.rate_limiter.acquire(self.endpoint_urls, bytes=len(data))
+        self.bytes_read += len(data)
+        if self.part_size and self.part_endpoint_urls:
+            parts_started = -(-self.bytes_read // self.part_size)
+            if parts_started > self.parts_started:
+                self.rate_limiter.acquire(self.part_endpoint_urls, requests=parts_started - self.parts_started)
+                self.parts_started = parts_started
+        return data
+
+# Builds the limiter the transfer settings ask for over the healthy endpoints of both sides, None when nothing is limited
+def create_rate_limiter(config, endpoint_urls):
+    job_limits = {'bytes': get_transfer_setting(config, 'max_bytes_per_second'),
+                  'requests': get_transfer_setting(config, 'max_requests_per_second')}
+    endpoint_overrides = get_transfer_setting(config, 'endpoint_rate_limits') or {}
+    endpoint_limits = {}
+    for endpoint_url in endpoint_urls:
+        overrides = endpoint_overrides.get(endpoint_url) or {}
+        limits = {'bytes': overrides.get('max_bytes_per_second', get_transfer_setting(config, 'endpoint_max_bytes_per_second')),
+                  'requests': overrides.get('max_requests_per_second', get_transfer_setting(config, 'endpoint_max_requests_per_second'))}
+        if any(limits.values()):
+            endpoint_limits[endpoint_url] = limits
+    if not any(job_limits.values()) and not endpoint_limits:
+        return None
+    return RateLimiter(job_limits, endpoint_limits, get_transfer_setting(config, 'rate_limit_burst_seconds'))
+###
+# END: RATE LIMITER
+###
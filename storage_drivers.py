@@ -0,0 +1,469 @@
+import os
+import time
+import base64
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+from azure.storage.blob import BlobBlock, ContentSettings
+from utils import create_client, client_pool_connections, get_transfer_setting, list_objects, list_objects_parallel, is_endpoint_healthy
+from listing_pipeline import iter_listing_pages
+from local_storage import read_local_range, write_local_stream, write_local_range, open_local_partial, commit_local_partial, discard_local_partial, partial_path, copy_local_file
+from checksums import HashingReader, content_md5_base64, multipart_etag
+
+###
+# BEGIN: STORAGE DRIVER INTERFACE
+###
+# Capabilities every driver declares, the transfer planner picks the copy strategy of a source/destination pair from them
+CAPABILITIES = ['ranged_reads', 'multipart_uploads', 'server_side_copy', 'server_side_part_copy', 'batch_delete', 'content_checksums', 'delimiter_listing']
+
+class StorageDriver:
+    """
+    One side ('src', 'dst' or 'log') of a config on one storage service, the only place that knows how the service does things.
+
+    The class attributes are its capabilities: the copy engine only asks a driver for what it declares and falls back to
+    a plainer strategy otherwise. Clients come from the per-process cache in utils, one per endpoint_url.
+    """
+    service = None
+    ranged_reads = False # A byte range of an object can be read on its own
+    multipart_uploads = False # An object can be written as parts uploaded in parallel and committed at once
+    server_side_copy = False # The service can copy an object from some sources itself, see can_copy_from()
+    server_side_part_copy = False # A server-side copy of a large object can be split into parallel byte ranges
+    batch_delete = False # Many objects are deleted with one request
+    content_checksums = False # Listings carry an MD5 of the content that copies can be verified against
+    delimiter_listing = False # Listings can be split at '/' into sub-prefixes that are listed in parallel
+    # Most parts a multipart upload may have, None when there is no limit
+    max_parts = None
+    # Part size the service cuts stream uploads at, the ETag of a streamed object is predicted from it
+    stream_part_size = None
+    # Largest object copy_object() copies in a single request, None when there is no limit
+    copy_object_max_bytes = None
+
+    def __init__(self, config, side):
+        self.config = config
+        self.side_config = config[side]
+        self.region = self.side_config['region']
+        self.max_pool_connections = client_pool_connections(config)
+
+    def client(self, endpoint_url):
+        return create_client(self.service, self.side_config['access_key'], self.side_config['secret_access_key'], self.region, endpoint_url, self.max_pool_connections)
+
+    def capabilities(self):
+        return {capability: getattr(self, capability) for capability in CAPABILITIES}
+
+    # Listing and health checks are implemented per service in utils and listing_pipeline
+    def is_endpoint_healthy(self, bucket, prefix, endpoint_url):
+        return is_endpoint_healthy(self.service, bucket, prefix, self.client(endpoint_url), isSnow=(self.region=='snow'))
+
+    def list_objects(self, bucket, prefix, endpoint_url, details=False):
+        return list_objects(self.service, bucket, prefix, self.client(endpoint_url), isSnow=(self.region=='snow'), details=details)
+
+    def list_objects_parallel(self, bucket, prefix, endpoint_urls, details=False, max_workers=16, target_shards=64, shard_cache=None, progress=None):
+        return list_objects_parallel(self.service, bucket, prefix, [self.client(endpoint_url) for endpoint_url in endpoint_urls],
+                                     isSnow=(self.region=='snow'), details=details, max_workers=max_workers, target_shards=target_shards, shard_cache=shard_cache, progress=progress)
+
+    def iter_listing_pages(self, bucket, prefix, endpoint_url):
+        return iter_listing_pages(self.service, bucket, prefix, self.client(endpoint_url), isSnow=(self.region=='snow'))
+
+    # Returns {'body': readable, 'bytes': size, 'etag': content ETag or None, 'md5_hex': Content-MD5 or None} of an object
+    def open_read(self, bucket, key, endpoint_url):
+        raise NotImplementedError
+
+    def close_read(self, source):
+        pass
+
+    def read_range(self, bucket, key, offset, length, endpoint_url):
+        raise NotImplementedError
+
+    # Wraps a readable in the HashingReader write_stream() expects, which also hashes the parts of every size in part_sizes
+    def hashing_reader(self, stream, part_sizes=()):
+        return HashingReader(stream, set(part_sizes) | ({self.stream_part_size} if self.stream_part_size else set()))
+
+    # Uploads everything a hashing_reader() yields, returns the ETag the object ends up with. The object only counts as
+    # written after commit_stream(), discard_stream() removes it when the bytes turned out not to match the source
+    def write_stream(self, bucket, key, reader, obj_bytes, endpoint_url):
+        raise NotImplementedError
+
+    def commit_stream(self, bucket, key, endpoint_url):
+        pass
+
+    def discard_stream(self, bucket, key, endpoint_url):
+        self.delete_objects(bucket, [key], endpoint_url)
+
+    # Opens a multipart upload, continuing the one the journal recorded for src_key when it can
+    # Returns (upload, {part_number: etag} of the parts already uploaded), upload is handed back to the other part methods
+    def open_parts(self, bucket, key, obj_bytes, part_size, endpoint_url, journal=None, src_key=None):
+        raise NotImplementedError
+
+    def write_part(self, upload, part_number, offset, data, endpoint_url):
+        raise NotImplementedError
+
+    def copy_part(self, upload, part_number, offset, length, src_bucket, src_key, endpoint_url):
+        raise NotImplementedError
+
+    # Commits [(part_number, etag)] in order as the object, returns its ETag when it can be predicted
+    def complete_parts(self, upload, parts):
+        raise NotImplementedError
+
+    # Gives up on an upload, keep_parts leaves the uploaded parts for a journaled later attempt to continue
+    def abort_parts(self, upload, keep_parts=False):
+        pass
+
+    # Cleans up an upload an earlier run journaled and never completed, returns True when there was something to clean up
+    def abort_orphaned_upload(self, bucket, key, upload_id, endpoint_url):
+        return False
+
+    # Whether this (destination) driver can copy an object from src_driver without the bytes passing through this host
+    def can_copy_from(self, src_driver, src_endpoint_url, dst_endpoint_url):
+        return False
+
+    # Copies a whole object server-side, returns the destination ETag when it is known
+    def copy_object(self, src_driver, src_bucket, src_key, dst_bucket, dst_key, src_endpoint_url, dst_endpoint_url):
+        raise NotImplementedError
+
+    def delete_objects(self, bucket, keys, endpoint_url):
+        raise NotImplementedError
+###
+# END: STORAGE DRIVER INTERFACE
+###
+
+###
+# BEGIN: S3 DRIVER
+###
+# Stream uploads use boto3's default part size, the ETag the destination ends up with is predicted from it
+STREAM_UPLOAD_CONFIG = TransferConfig()
+
+# AWS endpoints that resolve to S3 itself rather than a snowball or other S3 compatible device
+def is_native_aws_endpoint(region, endpoint_url):
+    return region != 'snow' and (endpoint_url == 'no_endpoint' or 's3-accelerate' in endpoint_url)
+
+class S3Driver(StorageDriver):
+    """S3, snowballs and other S3 compatible devices."""
+    service = 'AWS'
+    ranged_reads = True
+    multipart_uploads = True
+    server_side_copy = True
+    server_side_part_copy = True
+    batch_delete = True
+    # ETags are the MD5 of the content, or of the part MD5s, unless the object is KMS or customer key encrypted
+    content_checksums = True
+    delimiter_listing = True
+    max_parts = 10000
+    stream_part_size = STREAM_UPLOAD_CONFIG.multipart_chunksize
+    # copy_object is limited to 5 GiB
+    copy_object_max_bytes = 5368709120
+
+    # Returns the low level S3 client, snowballs are accessed through a boto3 resource
+    def api(self, endpoint_url):
+        client = self.client(endpoint_url)
+        return client.meta.client if self.region == 'snow' else client
+
+    def open_read(self, bucket, key, endpoint_url):
+        response = self.api(endpoint_url).get_object(Bucket=bucket, Key=key)
+        etag = None
+        # The ETag of a KMS or customer key encrypted object is not derived from its content
+        if response.get('ServerSideEncryption') != 'aws:kms' and not response.get('SSECustomerAlgorithm'):
+            etag = response["ETag"].strip('"')
+        return {'body': response["Body"], 'bytes': response["ContentLength"], 'etag': etag, 'md5_hex': None}
+
+    def read_range(self, bucket, key, offset, length, endpoint_url):
+        return self.api(endpoint_url).get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{offset + length - 1}")["Body"].read()
+
+    def write_stream(self, bucket, key, reader, obj_bytes, endpoint_url):
+        # Every request carries a checksum of its bytes for the service to check and keep with the object, a part damaged
+        # on the way is rejected before anything is written. The MD5 is only known once the stream ends.
+        checksum_algorithm = get_transfer_setting(self.config, 'stream_upload_checksum_algorithm')
+        self.api(endpoint_url).upload_fileobj(reader, bucket, key, Config=STREAM_UPLOAD_CONFIG,
+                                              ExtraArgs={'ChecksumAlgorithm': checksum_algorithm} if checksum_algorithm else None)
+        return reader.upload_etag(STREAM_UPLOAD_CONFIG.multipart_chunksize)
+
+    def open_parts(self, bucket, key, obj_bytes, part_size, endpoint_url, journal=None, src_key=None):
+        api = self.api(endpoint_url)
+        journaled = journal.get_multipart(src_key) if journal else None
+        if journaled:
+            upload_id, journaled_part_size, _ = journaled
+            try:
+                if journaled_part_size != part_size:
+                    # The parts were cut differently, they cannot be reused
+                    api.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+                else:
+                    # The service's own part list is authoritative, the journal may be a part or two behind
+                    uploaded_parts = {}
+                    for page in api.get_paginator('list_parts').paginate(Bucket=bucket, Key=key, UploadId=upload_id):
+                        for part in page.get('Parts', []):
+                            uploaded_parts[part['PartNumber']] = part['ETag']
+                    print(f"Resuming multipart upload of '{key}' with {len(uploaded_parts)} parts already uploaded.")
+                    return {'bucket': bucket, 'key': key, 'upload_id': upload_id, 'endpoint_url': endpoint_url}, uploaded_parts
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+                    raise
+        upload_id = api.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+        if journal:
+            journal.start_multipart(src_key, upload_id, part_size)
+        return {'bucket': bucket, 'key': key, 'upload_id': upload_id, 'endpoint_url': endpoint_url}, {}
+
+    def write_part(self, upload, part_number, offset, data, endpoint_url):
+        # The service checks every part against the MD5 computed here, a part damaged on the way is rejected
+        response = self.api(endpoint_url).upload_part(Bucket=upload['bucket'], Key=upload['key'], UploadId=upload['upload_id'], PartNumber=part_number,
+                                                      Body=data, ContentMD5=content_md5_base64(data))
+        return response['ETag']
+
+    def copy_part(self, upload, part_number, offset, length, src_bucket, src_key, endpoint_url):
+        response = self.api(endpoint_url).upload_part_copy(Bucket=upload['bucket'], Key=upload['key'], UploadId=upload['upload_id'], PartNumber=part_number,
+                                                           CopySource={'Bucket': src_bucket, 'Key': src_key}, CopySourceRange=f"bytes={offset}-{offset + length - 1}")
+        return response['CopyPartResult']['ETag']
+
+    def complete_parts(self, upload, parts):
+        self.api(upload['endpoint_url']).complete_multipart_upload(Bucket=upload['bucket'], Key=upload['key'], UploadId=upload['upload_id'],
+                                                                   MultipartUpload={'Parts': [{'PartNumber': part_number, 'ETag': etag} for part_number, etag in parts]})
+        return multipart_etag([bytes.fromhex(etag.strip('"')) for _, etag in parts])
+
+    def abort_parts(self, upload, keep_parts=False):
+        # Do not leave the already uploaded parts billed against an upload that will never complete
+        if not keep_parts:
+            self.api(upload['endpoint_url']).abort_multipart_upload(Bucket=upload['bucket'], Key=upload['key'], UploadId=upload['upload_id'])
+
+    def abort_orphaned_upload(self, bucket, key, upload_id, endpoint_url):
+        self.api(endpoint_url).abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        return True
+
+    def can_copy_from(self, src_driver, src_endpoint_url, dst_endpoint_url):
+        if src_driver.service != 'AWS':
+            return False
+        src_config, dst_config = src_driver.side_config, self.side_config
+        same_credentials = (src_config['access_key'], src_config['secret_access_key']) == (dst_config['access_key'], dst_config['secret_access_key'])
+        # The same snowball or S3 compatible device, or S3 itself on both sides. The endpoints are picked per side, so any
+        # two endpoints both sides list are the same device, whichever of its IPs each side got.
+        shared_endpoint_urls = set(src_config['endpoint_urls']) & set(dst_config['endpoint_urls'])
+        same_device = src_endpoint_url == dst_endpoint_url or (src_endpoint_url in shared_endpoint_urls and dst_endpoint_url in shared_endpoint_urls)
+        same_backend = (src_driver.region == 'snow') == (self.region == 'snow') and (same_device or (is_native_aws_endpoint(src_driver.region, src_endpoint_url) and is_native_aws_endpoint(self.region, dst_endpoint_url)))
+        return same_credentials and same_backend
+
+    def copy_object(self, src_driver, src_bucket, src_key, dst_bucket, dst_key, src_endpoint_url, dst_endpoint_url):
+        response = self.api(dst_endpoint_url).copy_object(Bucket=dst_bucket, Key=dst_key, CopySource={'Bucket': src_bucket, 'Key': src_key})
+        return response['CopyObjectResult']['ETag'].strip('"')
+
+    # A url other services can fetch the object from, only S3 itself is reachable from outside this network
+    def source_url(self, bucket, key, endpoint_url):
+        if not is_native_aws_endpoint(self.region, endpoint_url):
+            return None
+        return self.api(endpoint_url).generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': key}, ExpiresIn=get_transfer_setting(self.config, 'presigned_url_expiry_seconds'))
+
+    def delete_objects(self, bucket, keys, endpoint_url):
+        api = self.api(endpoint_url)
+        # Up to 1000 keys per request
+        for start in range(0, len(keys), 1000):
+            api.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': key} for key in keys[start:start + 1000]], 'Quiet': True})
+###
+# END: S3 DRIVER
+###
+
+###
+# BEGIN: AZURE DRIVER
+###
+# Azure block ids must all be the same length within a blob
+def azure_block_id(part_number):
+    return base64.b64encode(f"{part_number:08d}".encode()).decode()
+
+def azure_account_name(connection_string):
+    for field in connection_string.split(';'):
+        if field.startswith('AccountName='):
+            return field.split('=', 1)[1]
+    return None
+
+# Longest wait between two polls of a pending Azure server-side copy
+AZURE_COPY_MAX_POLL_SECONDS = 15
+
+class AzureDriver(StorageDriver):
+    """Azure Blob Storage, multipart uploads are staged blocks committed as a block list."""
+    service = 'AZURE'
+    ranged_reads = True
+    multipart_uploads = True
+    server_side_copy = True
+    batch_delete = True
+    # Blobs have a Content-MD5 when it was set on upload, which this tool always does
+    content_checksums = True
+    delimiter_listing = True
+    max_parts = 50000
+
+    def blob_client(self, bucket, key, endpoint_url):
+        return self.client(endpoint_url).get_blob_client(container=bucket, blob=key)
+
+    def open_read(self, bucket, key, endpoint_url):
+        downloader = self.blob_client(bucket, key, endpoint_url).download_blob()
+        content_md5 = downloader.properties.content_settings.content_md5
+        return {'body': downloader, 'bytes': downloader.size, 'etag': None, 'md5_hex': bytes(content_md5).hex() if content_md5 else None}
+
+    def read_range(self, bucket, key, offset, length, endpoint_url):
+        return self.blob_client(bucket, key, endpoint_url).download_blob(offset=offset, length=length).readall()
+
+    def write_stream(self, bucket, key, reader, obj_bytes, endpoint_url):
+        blob_client = self.blob_client(bucket, key, endpoint_url)
+        blob_client.upload_blob(reader, overwrite=True)
+        # Block list uploads get no Content-MD5 from the service, store the one computed on the way through
+        blob_client.set_http_headers(content_settings=ContentSettings(content_md5=bytearray(reader.md5.digest())))
+        return reader.md5_hex()
+
+    # The part numbers journaled by a previous run that are still staged as uncommitted blocks are reused
+    def open_parts(self, bucket, key, obj_bytes, part_size, endpoint_url, journal=None, src_key=None):
+        upload = {'bucket': bucket, 'key': key, 'endpoint_url': endpoint_url}
+        journaled = journal.get_multipart(src_key) if journal else None
+        if journaled and journaled[1] == part_size:
+            try:
+                staged_block_ids = {block.id for block in self.blob_client(bucket, key, endpoint_url).get_block_list('uncommitted')[1]}
+            except ResourceNotFoundError:
+                staged_block_ids = set()
+            staged_parts = {part_number: azure_block_id(part_number) for part_number in journaled[2] if azure_block_id(part_number) in staged_block_ids}
+            print(f"Resuming block upload of '{key}' with {len(staged_parts)} blocks already staged.")
+            return upload, staged_parts
+        if journal:
+            journal.start_multipart(src_key, 'azure_block_list', part_size)
+        return upload, {}
+
+    def write_part(self, upload, part_number, offset, data, endpoint_url):
+        self.blob_client(upload['bucket'], upload['key'], endpoint_url).stage_block(azure_block_id(part_number), data, length=len(data), validate_content=True)
+        return azure_block_id(part_number)
+
+    # Uncommitted blocks are discarded by the service after a week, an aborted upload needs no clean up
+    def complete_parts(self, upload, parts):
+        self.blob_client(upload['bucket'], upload['key'], upload['endpoint_url']).commit_block_list([BlobBlock(block_id=block_id) for _, block_id in parts])
+        return None
+
+    def can_copy_from(self, src_driver, src_endpoint_url, dst_endpoint_url):
+        if src_driver.service == 'AZURE':
+            return azure_account_name(src_driver.side_config['access_key']) == azure_account_name(self.side_config['access_key'])
+        # Azure pulls from a presigned url, which it can only reach on S3 itself
+        if src_driver.service == 'AWS':
+            return is_native_aws_endpoint(src_driver.region, src_endpoint_url)
+        return False
+
+    def source_url(self, bucket, key, endpoint_url):
+        return self.blob_client(bucket, key, endpoint_url).url
+
+    def copy_object(self, src_driver, src_bucket, src_key, dst_bucket, dst_key, src_endpoint_url, dst_endpoint_url):
+        """Have Azure pull the object from the source url and wait for the asynchronous copy to finish."""
+        blob_client = self.blob_client(dst_bucket, dst_key, dst_endpoint_url)
+        copy = blob_client.start_copy_from_url(src_driver.source_url(src_bucket, src_key, src_endpoint_url))
+        copy_status = copy['copy_status']
+        # Polled with a doubling delay, a copy still pending at the deadline is aborted and fails as a timeout the caller retries
+        deadline = time.monotonic() + get_transfer_setting(self.config, 'azure_copy_timeout_seconds')
+        delay = 0.5
+        while copy_status == 'pending':
+            if time.monotonic() >= deadline:
+                try:
+                    blob_client.abort_copy(copy['copy_id'])
+                except HttpResponseError as e:
+                    # The copy finished between the last poll and the abort
+                    print(f"Could not abort the Azure server-side copy of '{dst_key}': {e}")
+                raise TimeoutError(f"Azure server-side copy of '{dst_key}' still pending after {get_transfer_setting(self.config, 'azure_copy_timeout_seconds')} seconds, aborted it")
+            time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+            delay = min(delay * 2, AZURE_COPY_MAX_POLL_SECONDS)
+            copy_status = blob_client.get_blob_properties().copy.status
+        if copy_status != 'success':
+            raise RuntimeError(f"Azure server-side copy of '{dst_key}' finished with status {copy_status}")
+        # The copy keeps the Content-MD5 of its source, there is no destination ETag to predict
+        return None
+
+    def delete_objects(self, bucket, keys, endpoint_url):
+        container_client = self.client(endpoint_url).get_container_client(bucket)
+        # Blob batches hold up to 256 deletes
+        for start in range(0, len(keys), 256):
+            container_client.delete_blobs(*keys[start:start + 256])
+###
+# END: AZURE DRIVER
+###
+
+###
+# BEGIN: LOCAL DRIVER
+###
+class LocalDriver(StorageDriver):
+    """Local disks and NFS mounts, objects are written to partial files and renamed into place once complete."""
+    service = 'LOCAL'
+    ranged_reads = True
+    multipart_uploads = True
+    # copy_file_range within and between local filesystems
+    server_side_copy = True
+
+    def path(self, bucket, key, endpoint_url):
+        return self.client(endpoint_url).path(bucket, key)
+
+    def open_read(self, bucket, key, endpoint_url):
+        # Unbuffered, every read the upload makes is one read of the file
+        body = open(self.path(bucket, key, endpoint_url), 'rb', buffering=0)
+        return {'body': body, 'bytes': os.fstat(body.fileno()).st_size, 'etag': None, 'md5_hex': None}
+
+    def close_read(self, source):
+        source['body'].close()
+
+    def read_range(self, bucket, key, offset, length, endpoint_url):
+        # Into a buffer the range thread reuses, it is uploaded or written before the thread reads its next range
+        return read_local_range(self.path(bucket, key, endpoint_url), offset, length)
+
+    def write_stream(self, bucket, key, reader, obj_bytes, endpoint_url):
+        # Written to a partial file that only replaces the object once the checksum matched
+        write_local_stream(self.path(bucket, key, endpoint_url), reader, obj_bytes)
+        return reader.md5_hex()
+
+    def commit_stream(self, bucket, key, endpoint_url):
+        commit_local_partial(self.path(bucket, key, endpoint_url))
+
+    def discard_stream(self, bucket, key, endpoint_url):
+        discard_local_partial(self.path(bucket, key, endpoint_url))
+
+    # Parts are written at their offsets into the object's partial file, which a journaled previous attempt may have started
+    def open_parts(self, bucket, key, obj_bytes, part_size, endpoint_url, journal=None, src_key=None):
+        path = self.path(bucket, key, endpoint_url)
+        journaled = journal.get_multipart(src_key) if journal else None
+        if journaled and journaled[1] == part_size and os.path.exists(partial_path(path)):
+            print(f"Resuming file copy of '{path}' with {len(journaled[2])} parts already written.")
+            return {'path': path, 'fd': open_local_partial(path, obj_bytes, truncate=False)}, dict(journaled[2])
+        if journal:
+            # The partial file is journaled as the upload id, so an orphaned one can be removed
+            journal.start_multipart(src_key, partial_path(path), part_size)
+        return {'path': path, 'fd': open_local_partial(path, obj_bytes)}, {}
+
+    def write_part(self, upload, part_number, offset, data, endpoint_url):
+        write_local_range(upload['fd'], data, offset)
+        return 'written'
+
+    def complete_parts(self, upload, parts):
+        os.close(upload['fd'])
+        commit_local_partial(upload['path'])
+        return None
+
+    def abort_parts(self, upload, keep_parts=False):
+        os.close(upload['fd'])
+        if not keep_parts:
+            discard_local_partial(upload['path'])
+
+    def abort_orphaned_upload(self, bucket, key, upload_id, endpoint_url):
+        if not os.path.exists(upload_id):
+            return False
+        os.remove(upload_id)
+        return True
+
+    # The kernel copies between the files, or the NFS server or filesystem does when it can
+    def can_copy_from(self, src_driver, src_endpoint_url, dst_endpoint_url):
+        return src_driver.service == 'LOCAL'
+
+    def copy_object(self, src_driver, src_bucket, src_key, dst_bucket, dst_key, src_endpoint_url, dst_endpoint_url):
+        copy_local_file(src_driver.path(src_bucket, src_key, src_endpoint_url), self.path(dst_bucket, dst_key, dst_endpoint_url))
+        # Local files have no ETag
+        return None
+
+    def delete_objects(self, bucket, keys, endpoint_url):
+        for key in keys:
+            try:
+                os.remove(self.path(bucket, key, endpoint_url))
+            except FileNotFoundError:
+                pass
+###
+# END: LOCAL DRIVER
+###
+
+STORAGE_DRIVERS = {driver.service: driver for driver in (S3Driver, AzureDriver, LocalDriver)}
+
+# Returns the driver of a config side ('src', 'dst' or 'log') for its service
+def get_storage_driver(service, config, side):
+    if service not in STORAGE_DRIVERS:
+        raise ValueError(f"Unsupported storage service: {service}")
+    return STORAGE_DRIVERS[service](config, side)
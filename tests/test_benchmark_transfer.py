@@ -0,0 +1,35 @@
+import os
+import sys
+
+from benchmark_transfer import (BENCHMARK_PROFILES, percentile, process_tree_memory_bytes, profile_object_sizes, run_measured, seed_objects,
+                                stand_in_side)
+
+def test_profile_sizes_are_repeatable_and_within_bounds():
+    sizes = profile_object_sizes('mixed', scale=0.1, seed=3)
+    assert sizes == profile_object_sizes('mixed', scale=0.1, seed=3)
+    assert sizes != profile_object_sizes('mixed', scale=0.1, seed=4)
+    assert len(sizes) == 40 + 10 + 1
+    smallest = min(min_bytes for _, min_bytes, _ in BENCHMARK_PROFILES['mixed'])
+    largest = max(max_bytes for _, _, max_bytes in BENCHMARK_PROFILES['mixed'])
+    assert all(smallest <= size <= largest for size in sizes)
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([3, 1, 2], 0.5) == 2
+    assert percentile(list(range(101)), 0.99) == 99
+
+def test_seeded_local_source(tmp_path):
+    config = {'src': stand_in_side(None, 'LOCAL', 'source', str(tmp_path))}
+    os.makedirs(config['src']['bucket'])
+    seed_objects(config, [10, 0, 20], max_workers=2)
+    directory = os.path.join(config['src']['bucket'], 'benchmark')
+    assert sorted(os.listdir(directory)) == ['part-0000000.bin', 'part-0000001.bin', 'part-0000002.bin']
+    assert [os.path.getsize(os.path.join(directory, f"part-{index:07d}.bin")) for index in range(3)] == [10, 0, 20]
+
+def test_run_measured(tmp_path):
+    assert process_tree_memory_bytes(os.getpid()) > 0
+    log_path = str(tmp_path / 'run.log')
+    measurement = run_measured([sys.executable, '-c', 'print("done")'], log_path, sample_seconds=0.01)
+    assert measurement['returncode'] == 0
+    assert measurement['wall_seconds'] > 0 and measurement['cpu_seconds'] >= 0
+    assert open(log_path).read() == 'done\n'
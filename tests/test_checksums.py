@@ -0,0 +1,65 @@
+import io
+import base64
+import hashlib
+import pytest
+from checksums import MEBIBYTE, ChecksumMismatchError, HashingReader, content_md5_base64, etag_part_size_candidates, is_multipart_etag, multipart_etag, upload_etag
+
+def part_digests(data, part_size):
+    return [hashlib.md5(data[offset:offset + part_size]).digest() for offset in range(0, len(data), part_size)]
+
+def test_multipart_etag():
+    data = bytes(range(256)) * 100
+    digests = part_digests(data, 10000)
+    assert multipart_etag(digests) == f"{hashlib.md5(b''.join(digests)).hexdigest()}-3"
+    assert is_multipart_etag(multipart_etag(digests))
+    assert not is_multipart_etag(hashlib.md5(data).hexdigest())
+    assert not is_multipart_etag(None)
+
+def test_upload_etag_switches_to_multipart_at_the_part_size():
+    data = b'x' * 25
+    assert upload_etag(hashlib.md5(data).hexdigest(), part_digests(data, 30), len(data), 30) == hashlib.md5(data).hexdigest()
+    assert upload_etag(hashlib.md5(data).hexdigest(), part_digests(data, 10), len(data), 10) == multipart_etag(part_digests(data, 10))
+
+def test_etag_part_size_candidates_common_sizes():
+    # 20 MiB in 8 MiB parts is 3 parts, 16 MiB parts would give 2
+    assert etag_part_size_candidates(20 * MEBIBYTE, 'abc-3') == [7 * MEBIBYTE, 8 * MEBIBYTE]
+    assert etag_part_size_candidates(20 * MEBIBYTE, 'abc-2') == [10 * MEBIBYTE, 16 * MEBIBYTE]
+
+def test_etag_part_size_candidates_configured_sizes():
+    assert 6 * MEBIBYTE in etag_part_size_candidates(20 * MEBIBYTE, 'abc-4', [6 * MEBIBYTE])
+    assert 6 * MEBIBYTE not in etag_part_size_candidates(20 * MEBIBYTE, 'abc-3', [6 * MEBIBYTE])
+
+def test_etag_part_size_candidates_without_a_match():
+    assert etag_part_size_candidates(MEBIBYTE, 'abc-1000') == []
+
+def test_content_md5_base64():
+    assert content_md5_base64(b'data') == base64.b64encode(hashlib.md5(b'data').digest()).decode()
+
+def test_hashing_reader_tracks_md5_and_parts_across_uneven_reads():
+    data = bytes(range(256)) * 40
+    reader = HashingReader(io.BytesIO(data), part_sizes=[1000, 4096])
+    chunks = []
+    while True:
+        chunk = reader.read(777)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    assert b''.join(chunks) == data
+    assert reader.bytes_read == len(data)
+    assert reader.md5_hex() == hashlib.md5(data).hexdigest()
+    assert reader.part_digests(1000) == part_digests(data, 1000)
+    assert reader.part_digests(4096) == part_digests(data, 4096)
+    assert reader.upload_etag(4096) == multipart_etag(part_digests(data, 4096))
+
+def test_hashing_reader_verify():
+    data = b'y' * 3000
+    reader = HashingReader(io.BytesIO(data), part_sizes=[1000])
+    reader.read()
+    assert reader.verify(src_etag=hashlib.md5(data).hexdigest()) is True
+    assert reader.verify(src_md5_hex=hashlib.md5(data).hexdigest()) is True
+    assert reader.verify(src_etag=multipart_etag(part_digests(data, 1000))) is True
+    # A multipart ETag of a part size that was not tracked cannot be checked
+    assert reader.verify(src_etag=multipart_etag(part_digests(data, 2000))) is None
+    assert reader.verify() is None
+    with pytest.raises(ChecksumMismatchError):
+        reader.verify(src_etag=hashlib.md5(b'other').hexdigest())
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from utils import CLIENT_CACHE, DEFAULT_POOL_CONNECTIONS, client_pool_connections, create_client, reset_client_cache
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    reset_client_cache()
+    yield
+    reset_client_cache()
+
+def create(endpoint_url='http://127.0.0.1:1', access_key='a', max_pool_connections=None):
+    return create_client('AWS', access_key, 'secret', 'us-east-1', endpoint_url, max_pool_connections)
+
+def test_clients_are_shared_per_endpoint_and_credentials():
+    client = create()
+    assert create() is client
+    assert create(endpoint_url='http://127.0.0.1:2') is not client
+    assert create(access_key='b') is not client
+    assert len(CLIENT_CACHE) == 3
+
+def test_pool_size_is_part_of_the_client():
+    assert create().meta.config.max_pool_connections == DEFAULT_POOL_CONNECTIONS
+    assert create(max_pool_connections=40).meta.config.max_pool_connections == 40
+    assert create(max_pool_connections=40) is not create()
+
+def test_pool_fits_the_threads_sharing_a_client():
+    assert client_pool_connections({}) == max(DEFAULT_POOL_CONNECTIONS, 16, 8)
+    assert client_pool_connections({'transfer': {'listing_workers': 64}}) == 64
+    assert client_pool_connections({'transfer': {'client_pool_connections': 5}}) == 5
+
+def test_forked_process_starts_without_clients():
+    create()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write_fd, str(len(CLIENT_CACHE)).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 16) == b'0'
+    assert len(CLIENT_CACHE) == 1
@@ -0,0 +1,65 @@
+import pytest
+from compact_listing import BLOCK_SIZE, CompactListing, common_prefix_length, diff_listings
+
+def make_listing(count):
+    return {f"data/year=2024/month={index % 12:02d}/part-{index:05d}.parquet": (index, f"etag{index}", 1700000000 + index) for index in range(count)}
+
+def test_common_prefix_length():
+    assert common_prefix_length(b'', b'abc') == 0
+    assert common_prefix_length(b'abc', b'abd') == 2
+    assert common_prefix_length(b'abc', b'abcdef') == 3
+    assert common_prefix_length(b'abc', b'abc') == 3
+
+def test_round_trip_across_blocks():
+    listing = make_listing(3 * BLOCK_SIZE + 5)
+    compact_listing = CompactListing.from_listing(listing)
+    assert len(compact_listing) == len(listing)
+    assert list(compact_listing) == sorted(listing)
+    assert dict(compact_listing.items()) == listing
+    assert compact_listing.total_bytes == sum(entry[0] for entry in listing.values())
+
+def test_lookups():
+    listing = make_listing(2 * BLOCK_SIZE + 1)
+    compact_listing = CompactListing.from_listing(listing)
+    for key, entry in listing.items():
+        assert key in compact_listing
+        assert compact_listing[key] == entry
+    assert 'data/' not in compact_listing
+    assert 'zzz' not in compact_listing
+    assert compact_listing.get('data/missing', 'default') == 'default'
+    with pytest.raises(KeyError):
+        compact_listing['data/missing']
+
+def test_missing_etag_and_last_modified_read_back_as_none():
+    compact_listing = CompactListing.from_listing({'a': (1, None, None)})
+    assert compact_listing['a'] == (1, None, None)
+
+def test_sizes_only():
+    compact_listing = CompactListing.from_listing({'b': 2, 'a': 1}, details=False)
+    assert dict(compact_listing.items()) == {'a': 1, 'b': 2}
+
+def test_keys_have_to_be_appended_in_order():
+    compact_listing = CompactListing()
+    compact_listing.append('b', (1, None, None))
+    with pytest.raises(ValueError):
+        compact_listing.append('a', (1, None, None))
+
+def test_non_ascii_keys():
+    listing = {'café/été': (3, None, None), 'café/é': (1, None, None), '日本/語': (2, None, None)}
+    assert dict(CompactListing.from_listing(listing).items()) == listing
+
+def test_diff_listings():
+    src_listing = CompactListing.from_listing({'a': (1, 'e1', None), 'b': (2, 'e2', None), 'c': (3, 'e3', None), 'd': (4, 'e4', None)})
+    # b differs in size, c is missing, x only exists at the destination
+    dst_listing = CompactListing.from_listing({'a': (1, 'other', None), 'b': (5, 'e2', None), 'd': (4, 'e4', None), 'x': (9, None, None)})
+    assert diff_listings(src_listing, dst_listing) == (2, 5, {'b': 2, 'c': 3})
+
+def test_diff_listings_compares_known_source_etags():
+    src_listing = CompactListing.from_listing({'a': (1, 'new', None), 'b': (2, 'e2', None)})
+    dst_listing = CompactListing.from_listing({'a': (1, 'x', None), 'b': (2, 'y', None)})
+    # a was copied from an older version of the source, b was copied from the version listed now
+    assert diff_listings(src_listing, dst_listing, {'a': 'old', 'b': 'e2'}) == (1, 2, {'a': 1})
+
+def test_diff_listings_empty_destination():
+    src_listing = CompactListing.from_listing({'a': (1, None, None)})
+    assert diff_listings(src_listing, CompactListing()) == (0, 0, {'a': 1})
@@ -0,0 +1,66 @@
+from botocore.exceptions import ClientError
+
+from concurrency_controller import AdaptiveConcurrency, is_throttle_error
+
+def client_error(code, status=400):
+    return ClientError({'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}, 'PutObject')
+
+def controller(**kwargs):
+    concurrency = AdaptiveConcurrency(floor=2, ceiling=10, initial=4, interval_seconds=10, **kwargs)
+    concurrency.interval_start = 0
+    return concurrency
+
+def test_throttle_errors():
+    assert is_throttle_error(client_error('SlowDown', 503))
+    assert is_throttle_error(client_error('Whatever', 429))
+    assert not is_throttle_error(client_error('AccessDenied', 403))
+    assert not is_throttle_error(ValueError())
+
+def test_no_decision_before_the_interval_ends():
+    concurrency = controller()
+    concurrency.record(100)
+    assert concurrency.update(in_flight=4, now=5) is None
+    assert concurrency.limit == 4
+
+def test_limit_grows_while_throughput_holds():
+    concurrency = controller()
+    concurrency.record(1000)
+    decision = concurrency.update(in_flight=4, now=10)
+    assert decision['reason'] == 'throughput_ok' and concurrency.limit == 5
+    concurrency.record(1000)
+    assert concurrency.update(in_flight=5, now=20)['limit'] == 6
+
+def test_limit_holds_when_it_was_not_the_bottleneck():
+    concurrency = controller()
+    concurrency.record(1000)
+    assert concurrency.update(in_flight=2, now=10) is None
+    assert concurrency.limit == 4
+
+def test_throttle_halves_the_limit_down_to_the_floor():
+    concurrency = controller()
+    concurrency.record(0, client_error('SlowDown', 503))
+    decision = concurrency.update(in_flight=4, now=10)
+    assert decision['reason'] == 'throttled' and decision['throttles'] == 1 and concurrency.limit == 2
+    concurrency.record(0, client_error('SlowDown', 503))
+    assert concurrency.update(in_flight=2, now=20) is None
+    assert concurrency.limit == 2
+
+def test_throughput_drop_after_an_increase_steps_back():
+    concurrency = controller()
+    concurrency.record(1000)
+    concurrency.update(in_flight=4, now=10)
+    concurrency.record(500)
+    decision = concurrency.update(in_flight=5, now=20)
+    assert decision['reason'] == 'throughput_dropped' and concurrency.limit == 4
+
+def test_rate_limited_objects_step_the_limit_down():
+    concurrency = controller()
+    concurrency.record(1000)
+    decision = concurrency.update(in_flight=4, now=10, rate_limit_waited_seconds=30)
+    assert decision['reason'] == 'rate_limited' and concurrency.limit == 3
+
+def test_fixed_limit_when_not_adaptive():
+    concurrency = controller(adaptive=False)
+    concurrency.record(0, client_error('SlowDown', 503))
+    assert concurrency.update(in_flight=4, now=10) is None
+    assert concurrency.limit == 4
@@ -0,0 +1,40 @@
+from dedup_index import DedupIndex, content_hash, dedup_index_path
+
+MD5 = 'd41d8cd98f00b204e9800998ecf8427e'
+MULTIPART_ETAG = 'a' * 32 + '-3'
+
+def test_content_hash_only_accepts_md5_and_multipart_etags():
+    assert content_hash(MD5) == MD5
+    assert content_hash(MULTIPART_ETAG) == MULTIPART_ETAG
+    assert content_hash('0x8DC1234567890AB') is None
+    assert content_hash(None) is None
+    assert content_hash('') is None
+
+def test_index_path_is_per_destination_bucket(tmp_path):
+    assert dedup_index_path(str(tmp_path), 'AWS', 'a') != dedup_index_path(str(tmp_path), 'AWS', 'b')
+
+def test_keys_recorded_by_this_run_are_trusted(tmp_path):
+    index = DedupIndex(str(tmp_path / 'index' / 'dedup.sqlite'))
+    index.record([MD5, MULTIPART_ETAG], 10, 'dst/a')
+    assert index.lookup([MULTIPART_ETAG], 10) == ('dst/a', True)
+    assert index.lookup([MD5], 11) is None
+    assert index.lookup(['b' * 32], 10) is None
+
+def test_keys_from_earlier_runs_are_not_trusted(tmp_path):
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite'))
+    index.record([MD5], 10, 'dst/a')
+    index.close()
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite'))
+    assert index.lookup([MD5], 10) == ('dst/a', False)
+
+def test_forget_drops_the_key_everywhere(tmp_path):
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite'))
+    index.record([MD5], 10, 'dst/a')
+    index.record([MULTIPART_ETAG], 20, 'dst/b')
+    index.forget('dst/a')
+    assert index.lookup([MD5], 10) is None
+    assert index.lookup([MULTIPART_ETAG], 20) == ('dst/b', True)
+    index.close()
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite'))
+    assert index.lookup([MD5], 10) is None
+    assert index.lookup([MULTIPART_ETAG], 20) == ('dst/b', False)
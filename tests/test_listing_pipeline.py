@@ -0,0 +1,42 @@
+import pytest
+from listing_pipeline import ListingPipeline, merge_join_listings, prefetch_pages
+
+def test_merge_join_listings():
+    src_entries = [('a', (1,)), ('b', (2,)), ('d', (4,)), ('f', (6,))]
+    dst_entries = [('0', (9,)), ('b', (2,)), ('c', (3,)), ('d', (5,))]
+    assert list(merge_join_listings(src_entries, dst_entries)) == [('a', (1,), None), ('b', (2,), (2,)), ('d', (4,), (5,)), ('f', (6,), None)]
+
+def test_merge_join_listings_empty_sides():
+    assert list(merge_join_listings([], [('a', (1,))])) == []
+    assert list(merge_join_listings([('a', (1,))], [])) == [('a', (1,), None)]
+
+def test_merge_join_listings_reads_the_destination_lazily():
+    dst_reads = []
+    def dst_entries():
+        for key in ['a', 'b', 'c']:
+            dst_reads.append(key)
+            yield key, (1,)
+    joined = merge_join_listings(iter([('a', (1,))]), dst_entries())
+    assert next(joined) == ('a', (1,), (1,))
+    assert dst_reads == ['a']
+
+def test_prefetch_pages_flattens_pages_and_reraises_errors():
+    assert list(prefetch_pages(iter([[1, 2], [], [3]]))) == [1, 2, 3]
+    def failing_pages():
+        yield [1]
+        raise RuntimeError('listing failed')
+    with pytest.raises(RuntimeError):
+        list(prefetch_pages(failing_pages()))
+
+def test_listing_pipeline_hands_over_objects_not_synced():
+    src_entries = [(f"k{index:03d}", (index, None, None)) for index in range(50)]
+    # Even keys are synced, odd keys differ in size
+    dst_entries = [(f"k{index:03d}", (index if index % 2 == 0 else index + 1, None, None)) for index in range(50)]
+    pipeline = ListingPipeline(iter(src_entries), iter(dst_entries), max_queued=10, batch_size=4)
+    taken = []
+    while not pipeline.finished:
+        pipeline.wait(timeout=1)
+        taken.extend(pipeline.take(3))
+    assert taken == [(f"k{index:03d}", index) for index in range(1, 50, 2)]
+    assert pipeline.synced_objects == 25
+    assert pipeline.listed_objects == 50
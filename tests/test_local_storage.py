@@ -0,0 +1,63 @@
+import io
+import os
+
+import pytest
+
+import local_storage
+from local_storage import (PARTIAL_SUFFIX, LocalClient, commit_local_partial, copy_local_file, discard_local_partial, list_local_objects,
+                           list_local_objects_parallel, open_local_partial, partial_path, read_local_range, write_local_range, write_local_stream)
+
+def test_client_paths_are_relative_to_the_mount(tmp_path):
+    assert LocalClient(str(tmp_path)).path('bucket', '/a/b') == str(tmp_path / 'bucket' / 'a' / 'b')
+    assert LocalClient().path(str(tmp_path / 'bucket')) == str(tmp_path / 'bucket')
+
+def test_listing_is_in_key_order_and_skips_partial_files(tmp_path):
+    for path in ['a/1', 'a-b', 'a/c/2', 'b' + PARTIAL_SUFFIX]:
+        (tmp_path / 'bucket' / 'prefix' / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / 'bucket' / 'prefix' / path).write_bytes(b'xyz')
+    client = LocalClient(str(tmp_path))
+    objects = list_local_objects('bucket', 'prefix', client)
+    assert list(objects) == ['a-b', 'a/1', 'a/c/2']
+    assert set(objects.values()) == {3}
+    assert list_local_objects_parallel('bucket', 'prefix', [client], details=True)['a/1'][:2] == (3, None)
+    assert list_local_objects('bucket', 'missing', client) == {}
+
+def test_ranges_are_written_at_their_offsets_and_committed(tmp_path):
+    path = str(tmp_path / 'dst' / 'object')
+    fd = open_local_partial(path, 6)
+    try:
+        write_local_range(fd, b'def', 3)
+        write_local_range(fd, b'abc', 0)
+    finally:
+        os.close(fd)
+    assert list_local_objects(str(tmp_path / 'dst'), '', LocalClient()) == {}
+    commit_local_partial(path)
+    assert open(path, 'rb').read() == b'abcdef'
+    assert bytes(read_local_range(path, 2, 3)) == b'cde'
+    with pytest.raises(EOFError):
+        read_local_range(path, 4, 3)
+
+def test_short_stream_gives_back_reserved_space(tmp_path):
+    path = str(tmp_path / 'object')
+    write_local_stream(path, io.BytesIO(b'abc'), 100)
+    commit_local_partial(path)
+    assert open(path, 'rb').read() == b'abc'
+
+def test_discard_removes_the_partial_file(tmp_path):
+    path = str(tmp_path / 'object')
+    os.close(open_local_partial(path, 10))
+    discard_local_partial(path)
+    discard_local_partial(path)
+    assert not (tmp_path / ('object' + PARTIAL_SUFFIX)).exists()
+    assert partial_path(path) == path + PARTIAL_SUFFIX
+
+def test_copy_falls_back_when_copy_file_range_fails(tmp_path, monkeypatch):
+    src = tmp_path / 'src'
+    src.write_bytes(b'x' * 1000)
+    def unsupported(*args):
+        raise OSError('unsupported')
+    monkeypatch.setattr(local_storage, 'COPY_CHUNK_BYTES', 300)
+    monkeypatch.setattr(local_storage, 'copy_file_range_chunk', unsupported)
+    assert copy_local_file(str(src), str(tmp_path / 'dst' / 'copy')) == 1000
+    assert (tmp_path / 'dst' / 'copy').read_bytes() == b'x' * 1000
+    assert not (tmp_path / 'dst' / ('copy' + PARTIAL_SUFFIX)).exists()
@@ -0,0 +1,59 @@
+import pytest
+
+import cloud_sync_obj
+from cloud_sync_obj import copy_parts, effective_part_size, plan_byte_ranges, range_endpoint_url
+
+ENDPOINT_URLS = ['http://a', 'http://b', 'http://c']
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setattr(cloud_sync_obj, 'worker_config', {'transfer': {'multipart_max_concurrency': 2}})
+    monkeypatch.setattr(cloud_sync_obj, 'worker_endpoint_urls', {'src': list(ENDPOINT_URLS), 'dst': ['http://d']})
+    monkeypatch.setattr(cloud_sync_obj, 'worker_journal', None)
+
+class FakeDriver:
+    def __init__(self):
+        self.completed = None
+        self.aborted = None
+
+    def complete_parts(self, upload, parts):
+        self.completed = parts
+        return 'etag-3'
+
+    def abort_parts(self, upload, keep_parts):
+        self.aborted = keep_parts
+
+def test_byte_ranges_cover_the_object():
+    assert plan_byte_ranges(10, 4) == [(1, 0, 4), (2, 4, 4), (3, 8, 2)]
+    assert plan_byte_ranges(0, 4) == []
+
+def test_part_size_grows_to_stay_under_the_part_limit():
+    assert effective_part_size(100, 4, 10) == 10
+    assert effective_part_size(100, 40, 10) == 40
+    assert effective_part_size(100, 4, None) == 4
+
+def test_byte_ranges_spread_over_the_healthy_endpoints(worker):
+    assert [range_endpoint_url('src', 'http://b', part_number) for part_number in range(1, 5)] == ['http://b', 'http://c', 'http://a', 'http://b']
+    # An endpoint that is no longer healthy keeps its own ranges
+    assert range_endpoint_url('src', 'http://x', 2) == 'http://x'
+    cloud_sync_obj.worker_config['transfer']['multipart_spread_endpoints'] = False
+    assert range_endpoint_url('src', 'http://b', 2) == 'http://b'
+
+def test_copy_parts_only_copies_missing_ranges(worker):
+    dst_driver = FakeDriver()
+    copied = []
+    def copy_range(byte_range):
+        copied.append(byte_range[0])
+        return byte_range[0], f"etag-part-{byte_range[0]}"
+    checksums = copy_parts(dst_driver, 'upload', {2: 'etag-earlier'}, plan_byte_ranges(10, 4), copy_range, 'key')
+    assert sorted(copied) == [1, 3]
+    assert dst_driver.completed == [(1, 'etag-part-1'), (2, 'etag-earlier'), (3, 'etag-part-3')]
+    assert checksums == {'md5': None, 'dst_etag': 'etag-3'}
+
+def test_failed_range_aborts_the_upload(worker):
+    dst_driver = FakeDriver()
+    def copy_range(byte_range):
+        raise ConnectionError('reset')
+    with pytest.raises(ConnectionError):
+        copy_parts(dst_driver, 'upload', {}, plan_byte_ranges(10, 4), copy_range, 'key')
+    assert dst_driver.aborted is False and dst_driver.completed is None
@@ -0,0 +1,69 @@
+import datetime
+import threading
+
+from utils import list_objects_parallel, list_range_split_key
+
+class FakeS3Client:
+    """Answers list_objects_v2 over a sorted key list, a page holds page_size keys or common prefixes."""
+    def __init__(self, keys, page_size=10):
+        self.keys = sorted(keys)
+        self.page_size = page_size
+        self.start_afters = []
+        self.lock = threading.Lock()
+
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, StartAfter=None, ContinuationToken=None):
+        after = ContinuationToken if ContinuationToken is not None else StartAfter
+        if ContinuationToken is None:
+            with self.lock:
+                self.start_afters.append(StartAfter)
+        entries = []
+        for key in self.keys:
+            if not key.startswith(Prefix) or (after is not None and key <= after):
+                continue
+            if Delimiter and Delimiter in key[len(Prefix):]:
+                common_prefix = Prefix + key[len(Prefix):].split(Delimiter, 1)[0] + Delimiter
+                if entries and entries[-1] == ('prefix', common_prefix):
+                    continue
+                entries.append(('prefix', common_prefix))
+            else:
+                entries.append(('key', key))
+            if len(entries) > self.page_size:
+                break
+        truncated = len(entries) > self.page_size
+        entries = entries[:self.page_size]
+        page = {
+            'Contents': [{'Key': key, 'Size': 1, 'ETag': '"e"', 'LastModified': datetime.datetime(2026, 1, 1)} for kind, key in entries if kind == 'key'],
+            'CommonPrefixes': [{'Prefix': key} for kind, key in entries if kind == 'prefix'],
+            'IsTruncated': truncated,
+        }
+        if truncated:
+            page['NextContinuationToken'] = entries[-1][1]
+        return page
+
+def test_split_key_lies_after_the_page_and_before_the_end():
+    assert 'data/0099' < list_range_split_key('data/0000', 'data/0099', None, 'data/')
+    assert 'data/0099' < list_range_split_key('data/0000', 'data/0099', 'data/5', 'data/') < 'data/5'
+    assert 'data/0099' < list_range_split_key('data/0000', 'data/0099', 'data/00990', 'data/') < 'data/00990'
+    assert list_range_split_key('data/0000', 'data/0099', 'data/0099 ', 'data/') is None
+
+def test_keys_sharing_their_first_characters_are_listed_in_parallel():
+    keys = [f'prefix/aaaa{i:05d}' for i in range(500)]
+    client = FakeS3Client(keys)
+    objects = list_objects_parallel('AWS', 'bucket', 'prefix', [client], max_workers=8)
+    assert sorted(objects) == sorted(key[len('prefix/'):] for key in keys)
+    assert len([start_after for start_after in client.start_afters if start_after is not None]) > 1
+
+def test_split_shards_list_every_key_once():
+    keys = [f'prefix/{name}/{i:04d}' for name in ['a', 'bb', 'bc'] for i in range(300)] + ['prefix/top']
+    client = FakeS3Client(keys, page_size=7)
+    listed = []
+    objects = list_objects_parallel('AWS', 'bucket', 'prefix', [client], max_workers=4, target_shards=2, max_depth=1, progress=listed.append)
+    assert sorted(objects) == sorted(key[len('prefix/'):] for key in keys)
+    assert listed[-1] == len(keys)
+
+def test_no_split_without_free_workers():
+    keys = [f'prefix/{i:04d}' for i in range(100)]
+    client = FakeS3Client(keys)
+    objects = list_objects_parallel('AWS', 'bucket', 'prefix', [client], max_workers=1)
+    assert len(objects) == 100
+    assert [start_after for start_after in client.start_afters if start_after is not None] == []
@@ -0,0 +1,75 @@
+import io
+import pytest
+import rate_limiter
+from rate_limiter import RateLimitedStream, RateLimiter, TokenBucket, create_rate_limiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', fake_clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, 'sleep', fake_clock.sleep)
+    return fake_clock
+
+def test_token_bucket_starts_full(clock):
+    bucket = TokenBucket(100, burst_seconds=2)
+    assert bucket.reserve(200) == 0.0
+
+def test_token_bucket_debt_is_paid_back_at_the_rate(clock):
+    bucket = TokenBucket(100, burst_seconds=1)
+    assert bucket.reserve(100) == 0.0
+    # A read larger than the bucket still goes through, the caller waits out the debt
+    assert bucket.reserve(250) == pytest.approx(2.5)
+    # Callers queue behind the debt in the order they arrived
+    assert bucket.reserve(50) == pytest.approx(3.0)
+    clock.now += 3.0
+    assert bucket.reserve(0) == 0.0
+
+def test_token_bucket_refill_is_capped_at_the_burst(clock):
+    bucket = TokenBucket(100, burst_seconds=1)
+    bucket.reserve(100)
+    clock.now += 60
+    assert bucket.reserve(100) == 0.0
+    assert bucket.reserve(100) == pytest.approx(1.0)
+
+def test_rate_limiter_waits_for_the_slowest_bucket(clock):
+    limiter = RateLimiter({'bytes': 1000, 'requests': None}, {'http://a': {'bytes': 100, 'requests': 10}})
+    limiter.acquire(['http://a'], bytes=100, requests=1)
+    assert clock.slept == []
+    limiter.acquire(['http://a'], bytes=200)
+    assert clock.slept == [pytest.approx(2.0)]
+    assert limiter.waited_seconds() == pytest.approx(2.0)
+    # Endpoints without limits only draw from the job budget
+    limiter.acquire(['http://b'], bytes=500, job_bytes=0)
+    assert len(clock.slept) == 1
+
+def test_create_rate_limiter_only_when_something_is_limited():
+    assert create_rate_limiter({}, ['http://a']) is None
+    limiter = create_rate_limiter({'transfer': {'endpoint_rate_limits': {'http://a': {'max_requests_per_second': 5}}}}, ['http://a', 'http://b'])
+    assert set(limiter.endpoint_buckets) == {'http://a'}
+    assert set(limiter.endpoint_buckets['http://a']) == {'requests'}
+
+class RecordingLimiter:
+    def __init__(self):
+        self.calls = []
+
+    def acquire(self, endpoint_urls, bytes=0, requests=0, job_bytes=None):
+        self.calls.append((tuple(endpoint_urls), bytes, requests))
+
+def test_rate_limited_stream_charges_bytes_and_one_request_per_later_part():
+    limiter = RecordingLimiter()
+    stream = RateLimitedStream(io.BytesIO(b'z' * 25), limiter, ['src', 'dst'], part_size=10, part_endpoint_urls=['dst'])
+    while stream.read(4):
+        pass
+    assert sum(bytes for _, bytes, _ in limiter.calls) == 25
+    assert sum(requests for endpoint_urls, _, requests in limiter.calls if endpoint_urls == ('dst',)) == 2
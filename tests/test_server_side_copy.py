@@ -0,0 +1,24 @@
+import pytest
+from botocore.exceptions import ClientError
+import cloud_sync_obj
+from cloud_sync_obj import server_side_copy_fallback
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'CopyObject')
+
+@pytest.fixture(autouse=True)
+def server_side_copy_supported(monkeypatch):
+    monkeypatch.setattr(cloud_sync_obj, 'worker_server_side_copy_unsupported', False)
+
+def test_refused_copy_falls_back_for_that_object_only():
+    assert server_side_copy_fallback(client_error('AccessDenied'), 'key') == 'denied'
+    assert not cloud_sync_obj.worker_server_side_copy_unsupported
+
+def test_unsupported_copy_turns_server_side_copies_off():
+    assert server_side_copy_fallback(client_error('NotImplemented'), 'key') == 'unsupported'
+    assert cloud_sync_obj.worker_server_side_copy_unsupported
+
+def test_other_errors_are_real_failures():
+    assert server_side_copy_fallback(client_error('InternalError'), 'key') is None
+    assert server_side_copy_fallback(TimeoutError('pending'), 'key') is None
+    assert not cloud_sync_obj.worker_server_side_copy_unsupported
@@ -0,0 +1,46 @@
+import io
+from storage_drivers import S3Driver
+
+def s3_config(src_endpoint_urls, dst_endpoint_urls, region='snow', dst_access_key='key'):
+    return {'src': {'region': region, 'access_key': 'key', 'secret_access_key': 'secret', 'endpoint_urls': src_endpoint_urls},
+            'dst': {'region': region, 'access_key': dst_access_key, 'secret_access_key': 'secret', 'endpoint_urls': dst_endpoint_urls}}
+
+def drivers(config):
+    return S3Driver(config, 'src'), S3Driver(config, 'dst')
+
+def test_any_two_endpoints_of_the_same_device_copy_server_side():
+    device = ['http://10.0.0.1:8080', 'http://10.0.0.2:8080']
+    src_driver, dst_driver = drivers(s3_config(device, device))
+    assert dst_driver.can_copy_from(src_driver, device[0], device[1])
+    assert dst_driver.can_copy_from(src_driver, device[1], device[1])
+
+def test_different_devices_do_not_copy_server_side():
+    src_driver, dst_driver = drivers(s3_config(['http://10.0.0.1:8080'], ['http://10.0.1.1:8080']))
+    assert not dst_driver.can_copy_from(src_driver, 'http://10.0.0.1:8080', 'http://10.0.1.1:8080')
+
+def test_different_credentials_do_not_copy_server_side():
+    device = ['http://10.0.0.1:8080']
+    src_driver, dst_driver = drivers(s3_config(device, device, dst_access_key='other'))
+    assert not dst_driver.can_copy_from(src_driver, device[0], device[0])
+
+def test_s3_itself_copies_server_side():
+    src_driver, dst_driver = drivers(s3_config(['no_endpoint'], ['no_endpoint'], region='us-east-1'))
+    assert dst_driver.can_copy_from(src_driver, 'no_endpoint', 'no_endpoint')
+
+class RecordingS3Client:
+    def __init__(self):
+        self.uploads = []
+
+    def upload_fileobj(self, reader, bucket, key, Config=None, ExtraArgs=None):
+        reader.read()
+        self.uploads.append(ExtraArgs)
+
+def test_stream_uploads_carry_a_checksum(monkeypatch):
+    config = s3_config(['no_endpoint'], ['no_endpoint'], region='us-east-1')
+    dst_driver = S3Driver(config, 'dst')
+    client = RecordingS3Client()
+    monkeypatch.setattr(dst_driver, 'api', lambda endpoint_url: client)
+    dst_driver.write_stream('bucket', 'key', dst_driver.hashing_reader(io.BytesIO(b'data'), ()), 4, 'no_endpoint')
+    config['transfer'] = {'stream_upload_checksum_algorithm': None}
+    dst_driver.write_stream('bucket', 'key', dst_driver.hashing_reader(io.BytesIO(b'data'), ()), 4, 'no_endpoint')
+    assert client.uploads == [{'ChecksumAlgorithm': 'CRC32'}, None]
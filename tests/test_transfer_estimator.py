@@ -0,0 +1,68 @@
+from transfer_estimator import ThroughputHistory, estimate_transfer, size_histogram
+from transfer_planner import TransferPlan
+
+CONFIG = {'transfer': {'tiny_object_max_bytes': 100, 'multipart_threshold_bytes': 10000, 'max_workers': 8,
+                       'tiny_lane_concurrency': 2, 'medium_lane_concurrency': 1, 'huge_lane_concurrency': 1, 'multipart_max_concurrency': 4}}
+
+class FakeDriver:
+    ranged_reads = True
+    multipart_uploads = True
+
+    def can_copy_from(self, src_driver, src_endpoint_url, dst_endpoint_url):
+        return False
+
+def history(*runs):
+    throughput_history = ThroughputHistory(CONFIG, 'AWS', 'AWS', ['http://src'], ['http://dst'])
+    for run in runs:
+        throughput_history.add_run(run)
+    return throughput_history
+
+def run(objects_moved=(), **fields):
+    return {'src_service': 'AWS', 'dst_service': 'AWS', 'src_endpoint_urls': ['http://src'], 'dst_endpoint_urls': ['http://dst'],
+            'objects_moved': list(objects_moved), **fields}
+
+def estimate(objects, throughput_history):
+    plan_summary = TransferPlan(objects, CONFIG).summary()
+    return estimate_transfer(plan_summary, throughput_history, FakeDriver(), FakeDriver(), ['http://src'], ['http://dst'], CONFIG, listing_seconds=5)
+
+def test_size_histogram():
+    histogram = size_histogram({'a': 0, 'b': 1024, 'c': 1025, 'd': 2 ** 40})
+    assert histogram['0 B'] == {'objects': 1, 'bytes': 0}
+    assert histogram['1 KiB'] == {'objects': 1, 'bytes': 1024}
+    assert histogram['64 KiB'] == {'objects': 1, 'bytes': 1025}
+    assert histogram['larger'] == {'objects': 1, 'bytes': 2 ** 40}
+
+def test_history_skips_other_services_and_deduplicated_objects():
+    throughput_history = history(run([{'bytes': 50, 'total_time_seconds': 1, 'copy_method': 'stream'},
+                                      {'bytes': 50, 'total_time_seconds': 1, 'copy_method': 'dedup'}]),
+                                 dict(run([{'bytes': 50, 'total_time_seconds': 1, 'copy_method': 'stream'}]), dst_service='AZURE'))
+    assert throughput_history.object_timings('http://src', 'http://dst', 'tiny', 'stream') == ([1, 50, 1], 'endpoint_pair_and_method')
+    assert throughput_history.object_timings('http://other', 'http://dst', 'tiny', 'stream') == ([1, 50, 1], 'copy_method')
+    assert throughput_history.object_timings('http://src', 'http://dst', 'medium', 'stream') == (None, None)
+
+def test_estimate_from_object_timings():
+    throughput_history = history(run([{'bytes': 50, 'total_time_seconds': 10, 'copy_method': 'stream'}] * 10))
+    result = estimate({'t1': 10, 't2': 50}, throughput_history)
+    assert result['estimate_basis'] == 'object_timings'
+    # Two tiny objects of 10 seconds each, two in flight
+    assert result['lanes']['tiny']['estimated_seconds'] == 10
+    assert result['estimated_copy_seconds'] == 10
+    assert result['estimated_duration_seconds'] == 15
+
+def test_estimate_from_runs_only():
+    throughput_history = history(run(bytes_transferred=1073741824, speed_gbps=8))
+    assert throughput_history.aggregate_bytes_per_second() == 1073741824
+    result = estimate({'h1': 2 * 1073741824}, throughput_history)
+    assert result['estimate_basis'] == 'runs'
+    assert result['lanes']['huge']['estimated_seconds'] is None
+    assert result['estimated_copy_seconds'] == 2
+
+def test_estimate_without_history():
+    result = estimate({'t1': 10}, history())
+    assert result['estimate_basis'] == 'no_history'
+    assert result['estimated_duration_seconds'] is None
+
+def test_estimate_with_nothing_to_copy():
+    result = estimate({}, history())
+    assert result['estimate_basis'] == 'nothing_to_copy'
+    assert result['estimated_duration_seconds'] == 5
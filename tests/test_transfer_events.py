@@ -0,0 +1,32 @@
+import json
+import transfer_events
+from transfer_events import TransferSummary, append_transfer_event
+
+def test_periodic_flushes_write_recent_events_and_the_final_flush_writes_all(tmp_path):
+    json_path = str(tmp_path / 'data_transfer_data_1.json')
+    summary = TransferSummary(json_path, {'objects_moved': [], 'status': 'Running'})
+    append_transfer_event(summary.events_path, {'src_key': 'a', 'bytes': 1})
+    summary.flush({'concurrency_decisions': []})
+    with open(json_path) as json_file:
+        document = json.load(json_file)
+    assert [event['src_key'] for event in document['objects_moved']] == ['a']
+    assert document['objects_moved_count'] == 1
+    append_transfer_event(summary.events_path, {'src_key': 'b', 'bytes': 2})
+    summary.flush({'status': 'Completed'}, final=True)
+    with open(json_path) as json_file:
+        document = json.load(json_file)
+    assert [event['src_key'] for event in document['objects_moved']] == ['a', 'b']
+    assert document['objects_moved_count'] == 2
+    assert document['status'] == 'Completed'
+
+def test_periodic_flushes_keep_a_bounded_window(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer_events, 'RECENT_OBJECTS_MOVED', 2)
+    json_path = str(tmp_path / 'data_transfer_data_1.json')
+    summary = TransferSummary(json_path, {'objects_moved': []})
+    for key in 'abc':
+        append_transfer_event(summary.events_path, {'src_key': key})
+    summary.flush()
+    with open(json_path) as json_file:
+        document = json.load(json_file)
+    assert [event['src_key'] for event in document['objects_moved']] == ['b', 'c']
+    assert document['objects_moved_count'] == 3
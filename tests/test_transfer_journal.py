@@ -0,0 +1,54 @@
+from transfer_journal import TransferJournal, transfer_journal_path
+
+def planned_journal(tmp_path):
+    journal = TransferJournal(str(tmp_path / 'journals' / 'journal.sqlite'))
+    journal.plan({'a': ('src/a', 'dst/a', 10), 'b': ('src/b', 'dst/b', 20), 'c': ('src/c', 'dst/c', 30)})
+    return journal
+
+def test_journal_path_is_per_job(tmp_path):
+    path = transfer_journal_path(str(tmp_path), 'AWS', 'src', 'p', 'AWS', 'dst', 'p')
+    assert path == transfer_journal_path(str(tmp_path), 'AWS', 'src', 'p', 'AWS', 'dst', 'p')
+    assert path != transfer_journal_path(str(tmp_path), 'AWS', 'src', 'p', 'AWS', 'dst', 'q')
+
+def test_reopened_journal_resumes_unfinished_objects(tmp_path):
+    journal = planned_journal(tmp_path)
+    journal.set_meta(listed_epoch=123)
+    journal.mark('src/a', 'done')
+    journal.mark('src/b', 'failed')
+    assert journal.unfinished_objects() == {'a': 10, 'b': 20, 'c': 30}
+    journal.close()
+
+    journal = TransferJournal(str(tmp_path / 'journals' / 'journal.sqlite'))
+    assert journal.get_meta('listed_epoch') == 123
+    assert journal.get_meta('missing', 'default') == 'default'
+    assert journal.unfinished_objects() == {'b': 20, 'c': 30}
+    assert journal.planned_objects() == {'a': 10, 'b': 20, 'c': 30}
+    assert journal.count_states() == {'done': 1, 'failed': 1, 'planned': 1}
+
+def test_multipart_parts_survive_a_restart(tmp_path):
+    journal = planned_journal(tmp_path)
+    assert journal.get_multipart('src/c') is None
+    journal.start_multipart('src/c', 'upload-1', 8)
+    journal.record_part('src/c', 1, 'etag-1')
+    journal.record_part('src/c', 2, 'etag-2')
+    journal.close()
+
+    journal = TransferJournal(str(tmp_path / 'journals' / 'journal.sqlite'))
+    assert journal.get_multipart('src/c') == ('upload-1', 8, {1: 'etag-1', 2: 'etag-2'})
+    assert journal.open_multipart_uploads() == [('src/c', 'dst/c', 'upload-1')]
+    journal.start_multipart('src/c', 'upload-2', 8)
+    assert journal.get_multipart('src/c') == ('upload-2', 8, {})
+    journal.clear_multipart('src/c')
+    assert journal.get_multipart('src/c') is None
+    assert journal.open_multipart_uploads() == []
+
+def test_reset_forgets_the_previous_run(tmp_path):
+    journal = planned_journal(tmp_path)
+    journal.set_meta(listed_epoch=123)
+    journal.start_multipart('src/c', 'upload-1', 8)
+    journal.mark('src/a', 'done')
+    journal.reset()
+    journal.commit()
+    assert journal.planned_objects() == {}
+    assert journal.get_meta('listed_epoch') is None
+    assert journal.get_multipart('src/c') is None
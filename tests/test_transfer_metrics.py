@@ -0,0 +1,37 @@
+from local_storage import LocalClient, list_local_objects_parallel
+from transfer_metrics import ENDPOINT_STATUSES, MetricsRegistry, network_status_metrics_registry, set_endpoints_status, transfer_metrics_registry
+
+def test_render_openmetrics_and_classic():
+    registry = MetricsRegistry()
+    registry.describe('bytes_copied', 'counter', 'Bytes copied.')
+    registry.describe('objects_in_flight', 'gauge', 'Objects in flight.')
+    registry.inc('bytes_copied', 10, side='src')
+    registry.inc('bytes_copied', 5, side='src')
+    registry.set('objects_in_flight', 3)
+    openmetrics = registry.render()
+    assert '# TYPE data_transfer_bytes_copied counter' in openmetrics
+    assert 'data_transfer_bytes_copied_total{side="src"} 15' in openmetrics
+    assert 'data_transfer_objects_in_flight 3' in openmetrics
+    assert openmetrics.endswith('# EOF\n')
+    classic = registry.render(openmetrics=False)
+    assert '# TYPE data_transfer_bytes_copied_total counter' in classic
+    assert '# EOF' not in classic
+
+def test_endpoints_status_state_label_is_named_after_the_family():
+    registry = network_status_metrics_registry()
+    set_endpoints_status(registry, 'src', ENDPOINT_STATUSES[0])
+    lines = [line for line in registry.render().splitlines() if line.startswith('data_transfer_endpoints_status{')]
+    assert len(lines) == len(ENDPOINT_STATUSES)
+    assert f'data_transfer_endpoints_status{{data_transfer_endpoints_status="{ENDPOINT_STATUSES[0]}",side="src"}} 1' in lines
+
+def test_rate_limit_wait_is_a_counter():
+    assert transfer_metrics_registry().metrics['rate_limit_wait_seconds']['type'] == 'counter'
+
+def test_local_listing_reports_progress_per_directory(tmp_path):
+    for path in ['a/1', 'a/2', 'b/c/3', '4']:
+        (tmp_path / 'bucket' / 'prefix' / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / 'bucket' / 'prefix' / path).write_bytes(b'x')
+    listed = []
+    objects = list_local_objects_parallel('bucket', 'prefix', [LocalClient(str(tmp_path))], progress=listed.append)
+    assert sorted(objects) == ['4', 'a/1', 'a/2', 'b/c/3']
+    assert listed == sorted(listed) and listed[-1] == 4 and len(listed) == 4
@@ -0,0 +1,45 @@
+from transfer_planner import LANE_NAMES, TransferPlan, classify_object_size
+
+CONFIG = {'transfer': {'tiny_object_max_bytes': 100, 'multipart_threshold_bytes': 10000,
+                       'tiny_lane_concurrency': 2, 'medium_lane_concurrency': 1, 'huge_lane_concurrency': 1, 'multipart_max_concurrency': 4}}
+
+def test_classify_object_size():
+    assert classify_object_size(0, CONFIG) == 'tiny'
+    assert classify_object_size(100, CONFIG) == 'tiny'
+    assert classify_object_size(101, CONFIG) == 'medium'
+    assert classify_object_size(9999, CONFIG) == 'medium'
+    assert classify_object_size(10000, CONFIG) == 'huge'
+
+def test_lanes_are_ordered_largest_first():
+    plan = TransferPlan({'t1': 10, 't2': 50, 't3': 30, 'm1': 500, 'm2': 5000}, CONFIG)
+    assert list(plan.lanes['tiny']['pending']) == ['t2', 't3', 't1']
+    assert list(plan.lanes['medium']['pending']) == ['m2', 'm1']
+    assert not plan.lanes['huge']['pending']
+
+def test_next_object_round_robins_over_lanes_below_their_cap():
+    plan = TransferPlan({'t1': 10, 't2': 20, 't3': 30, 'm1': 500, 'm2': 600, 'h1': 20000}, CONFIG)
+    started = [plan.next_object() for _ in range(4)]
+    assert started == [('huge', 'h1'), ('medium', 'm2'), ('tiny', 't3'), ('tiny', 't2')]
+    # Every lane is at its cap or empty until an object completes
+    assert plan.next_object() is None
+    plan.complete('medium')
+    assert plan.next_object() == ('medium', 'm1')
+    plan.complete('tiny')
+    assert plan.next_object() == ('tiny', 't1')
+    assert plan.pending_objects() == 0
+
+def test_requeue_goes_to_the_front_of_its_lane():
+    plan = TransferPlan({'t1': 10, 't2': 20}, CONFIG)
+    lane_name, obj_key = plan.next_object()
+    plan.complete(lane_name)
+    plan.requeue(obj_key, 20)
+    assert list(plan.lanes['tiny']['pending']) == ['t2', 't1']
+    assert plan.lanes['tiny']['objects'] == 2
+
+def test_summary_critical_path():
+    plan = TransferPlan({'t1': 10, 't2': 50, 'h1': 40000}, CONFIG)
+    summary = plan.summary()
+    assert set(summary['lanes']) == set(LANE_NAMES)
+    assert summary['lanes']['tiny']['critical_path_bytes_per_stream'] == 50
+    assert summary['lanes']['huge']['critical_path_bytes_per_stream'] == 10000
+    assert summary['critical_lane'] == 'huge'
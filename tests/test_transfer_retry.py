@@ -0,0 +1,77 @@
+import pickle
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from boto3.exceptions import S3UploadFailedError
+from azure.core.exceptions import HttpResponseError
+from checksums import ChecksumMismatchError
+from transfer_retry import TransferAttemptError, TransferRetry, classify_error
+
+def client_error(code, status=400):
+    return ClientError({'Error': {'Code': code, 'Message': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}, 'PutObject')
+
+@pytest.mark.parametrize('error, error_class', [
+    (client_error('SlowDown', 503), 'throttle'),
+    (client_error('Unknown', 429), 'throttle'),
+    (client_error('InternalError', 500), 'transient'),
+    (client_error('Unknown', 502), 'transient'),
+    (client_error('NoSuchBucket', 404), 'permanent'),
+    (client_error('AccessDenied', 403), 'permanent'),
+    # A skewed clock fails every signed request, retrying only burns attempts
+    (client_error('RequestTimeTooSkewed', 403), 'permanent'),
+    (EndpointConnectionError(endpoint_url='http://127.0.0.1:1'), 'transient'),
+    (ChecksumMismatchError('damaged'), 'transient'),
+    (TimeoutError('copy still pending'), 'transient'),
+    (ConnectionResetError('reset by peer'), 'transient'),
+    (FileNotFoundError('gone'), 'permanent'),
+    (PermissionError('denied'), 'permanent'),
+    (IsADirectoryError('directory'), 'permanent'),
+    (NotADirectoryError('not a directory'), 'permanent'),
+    (ValueError('bug'), 'permanent'),
+])
+def test_classify_error(error, error_class):
+    assert classify_error(error) == error_class
+
+def test_classify_azure_errors():
+    throttled = HttpResponseError(message='busy')
+    throttled.status_code, throttled.error_code = 503, 'ServerBusy'
+    missing = HttpResponseError(message='missing')
+    missing.status_code, missing.error_code = 404, 'BlobNotFound'
+    assert classify_error(throttled) == 'throttle'
+    assert classify_error(missing) == 'permanent'
+
+def test_classify_error_unwraps_upload_failures():
+    try:
+        try:
+            raise client_error('SlowDown', 503)
+        except ClientError as e:
+            raise S3UploadFailedError('upload failed') from e
+    except S3UploadFailedError as e:
+        assert classify_error(e) == 'throttle'
+
+def test_transfer_attempt_error_keeps_its_class_across_processes():
+    error = pickle.loads(pickle.dumps(TransferAttemptError('copy failed', 'throttle')))
+    assert str(error) == 'copy failed'
+    assert classify_error(error) == 'throttle'
+
+def test_retry_until_max_attempts():
+    retry = TransferRetry(max_attempts=2, base_delay_seconds=1, max_delay_seconds=8)
+    assert retry.failed('a', ('src', 'dst'), client_error('InternalError', 500), now=0) == ('transient', True)
+    assert retry.avoid('a', now=0) == {'src', 'dst'}
+    assert retry.due(now=0) == []
+    assert retry.due(now=10) == ['a']
+    assert retry.failed('a', ('src', 'dst'), client_error('InternalError', 500), now=10) == ('transient', False)
+    assert retry.given_up['a']['attempts'] == 2
+
+def test_permanent_failures_are_not_retried_and_do_not_back_off():
+    retry = TransferRetry()
+    assert retry.failed('a', ('src', 'dst'), client_error('NoSuchKey', 404), now=0) == ('permanent', False)
+    assert not retry.backing_off('src', now=0)
+    assert retry.summary()['objects_given_up'] == 1
+
+def test_success_resets_endpoint_backoff():
+    retry = TransferRetry(base_delay_seconds=4, max_delay_seconds=4)
+    retry.failed('a', ('src', 'dst'), client_error('SlowDown', 503), now=0)
+    assert retry.backing_off('dst', now=1)
+    assert not retry.backing_off('dst', now=5)
+    retry.succeeded('b', ('src', 'dst'))
+    assert 'dst' not in retry.endpoint_failures
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+import transfer_trace
+from transfer_trace import NULL_SPAN, enable_tracing, export_chrome_trace, trace_events_path_for, trace_span
+
+@pytest.fixture
+def events_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer_trace, 'trace_events_path', None)
+    return trace_events_path_for(str(tmp_path), 1700000000)
+
+def test_spans_record_nothing_while_tracing_is_off(events_path):
+    with trace_span('copy', 'object', key='a') as span:
+        span.set(method='stream')
+    assert span is NULL_SPAN
+
+def test_spans_export_as_a_chrome_trace(events_path):
+    enable_tracing(events_path, 'dispatcher')
+    with trace_span('copy', 'object', key='a') as span:
+        span.set(method='stream')
+    with pytest.raises(ValueError):
+        with trace_span('copy', 'object', key='b'):
+            raise ValueError('broken')
+    # A process killed mid-write leaves a partial line
+    with open(events_path, 'a') as events_file:
+        events_file.write('{"name": "cut')
+
+    trace_path = export_chrome_trace(events_path)
+    assert trace_path.endswith('transfer_trace_1700000000.json')
+    with open(trace_path) as trace_file:
+        trace = json.load(trace_file)
+    metadata, first, second = trace['traceEvents']
+    assert metadata['ph'] == 'M' and metadata['args']['name'].startswith('dispatcher ')
+    assert first['ph'] == 'X' and first['dur'] >= 0 and first['args'] == {'key': 'a', 'method': 'stream'}
+    assert second['args'] == {'key': 'b', 'error': 'ValueError: broken'}
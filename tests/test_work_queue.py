@@ -0,0 +1,110 @@
+import io
+import json
+from work_queue import LocalWorkQueueBackend, S3WorkQueueBackend, WorkQueue, partition_work_units
+
+def test_partition_work_units_by_bytes_and_objects():
+    objects = {f"k{index}": 10 for index in range(7)}
+    listing = {'k0': (10, 'etag0', None)}
+    units = partition_work_units(objects, listing, unit_bytes=30, unit_objects=100)
+    assert [[key for key, _, _ in unit['objects']] for unit in units] == [['k0', 'k1', 'k2'], ['k3', 'k4', 'k5'], ['k6']]
+    assert [unit['unit_id'] for unit in units] == ['00000000', '00000001', '00000002']
+    assert [unit['bytes'] for unit in units] == [30, 30, 10]
+    assert units[0]['objects'][0] == ['k0', 10, 'etag0']
+    assert units[0]['objects'][1] == ['k1', 10, None]
+    assert [len(unit['objects']) for unit in partition_work_units(objects, {}, unit_bytes=1000, unit_objects=2)] == [2, 2, 2, 1]
+
+def test_partition_work_units_keeps_key_ranges_together():
+    objects = {'b/2': 1, 'a/1': 1, 'b/1': 1, 'a/2': 1}
+    units = partition_work_units(objects, {}, unit_bytes=2, unit_objects=100)
+    assert [[key for key, _, _ in unit['objects']] for unit in units] == [['a/1', 'a/2'], ['b/1', 'b/2']]
+
+def test_partition_work_units_large_object_gets_its_own_unit():
+    units = partition_work_units({'a': 100, 'b': 1, 'c': 1}, {}, unit_bytes=10, unit_objects=100)
+    assert [[key for key, _, _ in unit['objects']] for unit in units] == [['a'], ['b', 'c']]
+
+def test_local_backend_conditional_writes(tmp_path):
+    backend = LocalWorkQueueBackend(str(tmp_path))
+    assert backend.create('leases/1.json', b'first')
+    assert not backend.create('leases/1.json', b'second')
+    data, version = backend.get('leases/1.json')
+    assert data == b'first'
+    assert backend.replace('leases/1.json', b'third', version)
+    assert not backend.replace('leases/1.json', b'fourth', version)
+    assert backend.list('leases') == ['leases/1.json']
+    backend.delete('leases/1.json')
+    assert backend.get('leases/1.json') is None
+
+def test_hosts_never_lease_the_same_unit(tmp_path):
+    units = partition_work_units({'a': 1, 'b': 1}, {}, unit_bytes=1, unit_objects=100)
+    coordinator = WorkQueue(LocalWorkQueueBackend(str(tmp_path)))
+    worker = WorkQueue(LocalWorkQueueBackend(str(tmp_path)))
+    worker.worker_id = 'other-host'
+    assert worker.lease_next() is None
+    coordinator.publish(units)
+    first, second = coordinator.lease_next(), worker.lease_next()
+    assert {first['unit_id'], second['unit_id']} == {'00000000', '00000001'}
+    assert worker.lease_next() is None
+    coordinator.complete(first['unit_id'], {'objects_copied': 1})
+    assert not coordinator.finished()
+    worker.complete(second['unit_id'], {'objects_copied': 1})
+    assert coordinator.finished()
+
+def test_expired_lease_is_taken_over(tmp_path):
+    backend = LocalWorkQueueBackend(str(tmp_path))
+    coordinator = WorkQueue(backend, lease_seconds=60)
+    coordinator.publish(partition_work_units({'a': 1}, {}, unit_bytes=1, unit_objects=100))
+    unit = coordinator.lease_next()
+    lease, version = coordinator.read_document(f"leases/{unit['unit_id']}.json")
+    backend.replace(f"leases/{unit['unit_id']}.json", json.dumps({**lease, 'expires_epoch': 0}).encode('utf-8'), version)
+    worker = WorkQueue(backend, lease_seconds=60)
+    worker.worker_id = 'other-host'
+    assert worker.lease_next()['unit_id'] == unit['unit_id']
+    # The host that lost the lease finds out when it renews
+    assert coordinator.renew() == [unit['unit_id']]
+
+def test_republished_queue_drops_units_of_the_earlier_publish(tmp_path):
+    backend = LocalWorkQueueBackend(str(tmp_path))
+    coordinator = WorkQueue(backend)
+    coordinator.publish(partition_work_units({'a': 1, 'b': 1}, {}, unit_bytes=1, unit_objects=100))
+    worker = WorkQueue(backend)
+    worker.worker_id = 'other-host'
+    stale_unit = worker.lease_next()
+    coordinator.publish(partition_work_units({'c': 1}, {}, unit_bytes=1, unit_objects=100))
+    # The worker finds the new publish, the unit it held is reported lost before a unit of the same id is leased again
+    assert worker.lease_next() is None
+    assert worker.maybe_renew() == [stale_unit['unit_id']]
+    assert worker.lease_next()['objects'] == [['c', 1, None]]
+    assert not coordinator.finished()
+
+def test_finishing_a_unit_of_an_earlier_publish_does_not_mark_the_new_one_done(tmp_path):
+    backend = LocalWorkQueueBackend(str(tmp_path))
+    coordinator = WorkQueue(backend)
+    coordinator.publish(partition_work_units({'a': 1}, {}, unit_bytes=1, unit_objects=100))
+    worker = WorkQueue(backend)
+    worker.worker_id = 'other-host'
+    stale_unit = worker.lease_next()
+    coordinator.publish(partition_work_units({'b': 1}, {}, unit_bytes=1, unit_objects=100))
+    worker.finished()
+    worker.complete(stale_unit['unit_id'], {})
+    assert backend.list('done') == []
+
+class PlainS3Client:
+    """An S3-compatible endpoint that stores every put and ignores If-None-Match and If-Match."""
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **conditions):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key]), 'ETag': str(hash(self.objects[Key]))}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+def test_conditional_write_probe(tmp_path):
+    assert LocalWorkQueueBackend(str(tmp_path)).conditional_writes_enforced()
+    backend = S3WorkQueueBackend.__new__(S3WorkQueueBackend)
+    backend.client, backend.bucket, backend.prefix = PlainS3Client(), 'logs', 'api/work_queue'
+    assert not backend.conditional_writes_enforced()
+    assert backend.client.objects == {}
@@ -0,0 +1,190 @@
+import os
+import glob
+from utils import get_transfer_setting, read_json
+from transfer_planner import LANE_NAMES, classify_object_size, choose_copy_strategy
+
+###
+# BEGIN: SIZE HISTOGRAM
+###
+# Upper bounds of the histogram buckets, every bucket holds the objects up to its bound and above the previous one
+SIZE_BUCKETS = [(0, '0 B'), (1024, '1 KiB'), (65536, '64 KiB'), (1048576, '1 MiB'), (16777216, '16 MiB'),
+                (268435456, '256 MiB'), (1073741824, '1 GiB'), (17179869184, '16 GiB'), (None, 'larger')]
+
+def size_histogram(objects):
+    histogram = {label: {'objects': 0, 'bytes': 0} for upper_bound, label in SIZE_BUCKETS}
+    for obj_bytes in objects.values():
+        label = next(label for upper_bound, label in SIZE_BUCKETS if upper_bound is None or obj_bytes <= upper_bound)
+        histogram[label]['objects'] += 1
+        histogram[label]['bytes'] += obj_bytes
+    return histogram
+###
+# END: SIZE HISTOGRAM
+###
+
+###
+# BEGIN: THROUGHPUT HISTORY
+###
+class ThroughputHistory:
+    """
+    Copy timings of earlier transfers, read from the data_transfer_data_*.json logs in the log directory.
+
+    Every moved object adds its bytes and seconds to its endpoint pair, size class and copy method, so an estimate uses
+    what the same endpoints did with objects of the same size. The speed_gbps of whole runs between the same services
+    and endpoints gives the aggregate throughput the objects in flight together reached, listing included.
+    """
+    def __init__(self, config, src_service, dst_service, src_endpoint_urls, dst_endpoint_urls):
+        self.config = config
+        self.src_service = src_service
+        self.dst_service = dst_service
+        self.src_endpoint_urls = set(src_endpoint_urls)
+        self.dst_endpoint_urls = set(dst_endpoint_urls)
+        # (src_endpoint_url, dst_endpoint_url, lane_name, copy_method) -> [objects, bytes, seconds]
+        self.objects = {}
+        self.runs = 0
+        self.run_bytes = 0
+        self.run_seconds = 0
+
+    def load(self, log_local_directory):
+        for path in sorted(glob.glob(os.path.join(log_local_directory, 'data_transfer_data_*.json'))):
+            try:
+                self.add_run(read_json(path))
+            except (OSError, ValueError) as e:
+                print(f"Skipping transfer log {path}: {e}")
+        return self
+
+    def add_run(self, run):
+        if run.get('src_service') != self.src_service or run.get('dst_service') != self.dst_service:
+            return
+        # Logs written before objects recorded their endpoints are attributed to the only endpoint of a side, if there was one
+        run_src_endpoint_urls = run.get('src_endpoint_urls') or []
+        run_dst_endpoint_urls = run.get('dst_endpoint_urls') or []
+        for object_moved in run.get('objects_moved') or []:
+            # A deduplicated object never crossed the link, its time says nothing about throughput
+            if object_moved.get('copy_method') == 'dedup' or not object_moved.get('total_time_seconds'):
+                continue
+            src_endpoint_url = object_moved.get('src_endpoint_url') or (run_src_endpoint_urls[0] if len(run_src_endpoint_urls) == 1 else None)
+            dst_endpoint_url = object_moved.get('dst_endpoint_url') or (run_dst_endpoint_urls[0] if len(run_dst_endpoint_urls) == 1 else None)
+            key = (src_endpoint_url, dst_endpoint_url, classify_object_size(object_moved['bytes'], self.config), object_moved.get('copy_method'))
+            totals = self.objects.setdefault(key, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += object_moved['bytes']
+            totals[2] += object_moved['total_time_seconds']
+        # Only runs that used some of the endpoints at hand say something about their aggregate throughput
+        if run.get('speed_gbps') and run.get('bytes_transferred') and \
+                self.src_endpoint_urls & set(run_src_endpoint_urls) and self.dst_endpoint_urls & set(run_dst_endpoint_urls):
+            self.runs += 1
+            self.run_bytes += run['bytes_transferred']
+            self.run_seconds += run['bytes_transferred'] * 8 / (run['speed_gbps'] * 1073741824)
+
+    def object_timings(self, src_endpoint_url, dst_endpoint_url, lane_name, copy_method):
+        """
+        Returns (objects, bytes, seconds) of earlier copies most like the ones asked for, and what they matched on.
+
+        The exact endpoint pair and copy method come first, then the pair with any method, then any pair with the method.
+        """
+        candidates = [('endpoint_pair_and_method', lambda key: key == (src_endpoint_url, dst_endpoint_url, lane_name, copy_method)),
+                      ('endpoint_pair', lambda key: key[:3] == (src_endpoint_url, dst_endpoint_url, lane_name)),
+                      ('copy_method', lambda key: key[2:] == (lane_name, copy_method))]
+        for basis, matches in candidates:
+            totals = [0, 0, 0]
+            for key, (objects, obj_bytes, seconds) in self.objects.items():
+                if matches(key):
+                    totals = [totals[0] + objects, totals[1] + obj_bytes, totals[2] + seconds]
+            if totals[0]:
+                return totals, basis
+        return None, None
+
+    # Bytes/s of the earlier runs together, weighted by the bytes each one moved
+    def aggregate_bytes_per_second(self):
+        return self.run_bytes / self.run_seconds if self.run_seconds else None
+###
+# END: THROUGHPUT HISTORY
+###
+
+###
+# BEGIN: DURATION ESTIMATE
+###
+# A size of every lane to pick the copy strategy of its objects with
+def representative_object_bytes(lane_name, config):
+    if lane_name == 'huge':
+        return get_transfer_setting(config, 'multipart_threshold_bytes')
+    if lane_name == 'medium':
+        return get_transfer_setting(config, 'tiny_object_max_bytes') + 1
+    return 0
+
+def estimate_transfer(plan_summary, history, src_driver, dst_driver, src_endpoint_urls, dst_endpoint_urls, config, listing_seconds=0):
+    """
+    Estimates how long copying the planned lanes takes from the throughput history.
+
+    Objects are spread evenly over the endpoint pairs. A tiny object costs what one took on average before, per-request
+    latency dominates it, medium and huge objects cost their bytes at the per-stream rate seen before. Each lane runs its
+    objects concurrency at a time but never finishes before its largest object, the lanes run side by side and together
+    never faster than the aggregate throughput of earlier runs. listing_seconds is added for the listings of the run.
+    """
+    max_workers = get_transfer_setting(config, 'max_workers')
+    endpoint_pairs = [(src_endpoint_url, dst_endpoint_url) for src_endpoint_url in src_endpoint_urls for dst_endpoint_url in dst_endpoint_urls]
+    lanes = {}
+    for lane_name in LANE_NAMES:
+        lane = plan_summary['lanes'][lane_name]
+        strategies = {}
+        stream_seconds = largest_object_seconds = 0
+        missing_history = False
+        for src_endpoint_url, dst_endpoint_url in endpoint_pairs:
+            copy_method = choose_copy_strategy(src_driver, dst_driver, src_endpoint_url, dst_endpoint_url, representative_object_bytes(lane_name, config), config)
+            timings, basis = history.object_timings(src_endpoint_url, dst_endpoint_url, lane_name, copy_method)
+            strategies[f"{src_endpoint_url} -> {dst_endpoint_url}"] = {'copy_method': copy_method, 'history_basis': basis,
+                                                                      'history_objects': timings[0] if timings else 0}
+            if timings is None:
+                missing_history = True
+                continue
+            objects, obj_bytes, seconds = timings
+            if lane_name == 'tiny' or not obj_bytes:
+                stream_seconds += lane['objects'] * seconds / objects / len(endpoint_pairs)
+            else:
+                stream_seconds += lane['bytes'] * seconds / obj_bytes / len(endpoint_pairs)
+                largest_object_seconds = max(largest_object_seconds, lane['largest_object_bytes'] * seconds / obj_bytes)
+        concurrency = max(1, min(lane['concurrency'], max_workers))
+        lane_seconds = None if missing_history and lane['objects'] else max(stream_seconds / concurrency, largest_object_seconds)
+        lanes[lane_name] = {'objects': lane['objects'], 'bytes': lane['bytes'], 'strategies': strategies, 'estimated_seconds': lane_seconds}
+
+    total_bytes = sum(lane['bytes'] for lane in lanes.values())
+    aggregate_bytes_per_second = history.aggregate_bytes_per_second()
+    aggregate_seconds = total_bytes / aggregate_bytes_per_second if aggregate_bytes_per_second else None
+    lane_seconds = [lane['estimated_seconds'] for lane in lanes.values() if lane['objects']]
+    if lane_seconds and None not in lane_seconds:
+        copy_seconds = max(lane_seconds + [aggregate_seconds or 0])
+        basis = 'object_timings_and_runs' if aggregate_seconds is not None else 'object_timings'
+    elif aggregate_seconds is not None:
+        copy_seconds, basis = aggregate_seconds, 'runs'
+    elif not lane_seconds:
+        copy_seconds, basis = 0, 'nothing_to_copy'
+    else:
+        copy_seconds, basis = None, 'no_history'
+    return {'lanes': lanes,
+            'history_runs': history.runs,
+            'aggregate_bytes_per_second': int(aggregate_bytes_per_second) if aggregate_bytes_per_second else None,
+            'estimated_copy_seconds': int(copy_seconds) if copy_seconds is not None else None,
+            'listing_seconds': int(listing_seconds),
+            'estimated_duration_seconds': int(listing_seconds + copy_seconds) if copy_seconds is not None else None,
+            'estimate_basis': basis}
+###
+# END: DURATION ESTIMATE
+###
+
+# Prints the histogram and the estimate as a short table
+def print_transfer_estimate(histogram, estimate):
+    print("Objects to move by size:")
+    for label, bucket in histogram.items():
+        if bucket['objects']:
+            print(f"  up to {label:>7}: {bucket['objects']} objects, {bucket['bytes']/1073741824:.3f} GB")
+    for lane_name, lane in estimate['lanes'].items():
+        if not lane['objects']:
+            continue
+        methods = ', '.join(sorted({strategy['copy_method'] for strategy in lane['strategies'].values()}))
+        seconds = f"{lane['estimated_seconds']:.0f} s" if lane['estimated_seconds'] is not None else 'unknown, no earlier copies of this size'
+        print(f"  {lane_name:>6} lane: {methods}, estimated {seconds}")
+    if estimate['estimated_duration_seconds'] is None:
+        print("No earlier transfers between these services to estimate the duration from.")
+    else:
+        print(f"Estimated duration: {estimate['estimated_duration_seconds']/3600:.2f} hours ({estimate['estimated_duration_seconds']} seconds, "
+              f"{estimate['listing_seconds']} of them listing, from {estimate['estimate_basis']} of earlier transfers)")
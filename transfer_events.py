@@ -0,0 +1,73 @@
+import os
+from collections import deque
+from utils import write_json, append_jsonl, read_jsonl
+from transfer_trace import trace_span
+
+###
+# BEGIN: TRANSFER EVENT LOG
+###
+# Workers append one line per finished object here instead of rewriting the summary document.
+# The name deliberately does not start with data_transfer so the control panel never mistakes it for a summary.
+def transfer_events_path(data_transfer_data_json_dir):
+    directory, filename = os.path.split(data_transfer_data_json_dir)
+    return os.path.join(directory, filename.replace('data_transfer_data_', 'transfer_events_', 1).replace('.json', '.jsonl'))
+
+def append_transfer_event(events_path, record):
+    append_jsonl(events_path, record)
+###
+# END: TRANSFER EVENT LOG
+###
+
+###
+# BEGIN: TRANSFER SUMMARY AGGREGATOR
+###
+# Objects moved most recently that every summary write carries while the transfer runs
+RECENT_OBJECTS_MOVED = 1000
+
+class TransferSummary:
+    """
+    The single writer of the data_transfer_data_*.json summary document.
+
+    The summary is kept in memory and written whole with write_json, so readers such as the control panel and
+    logs_to_s3.py always see a complete document. While the transfer runs objects_moved holds the RECENT_OBJECTS_MOVED
+    objects moved last and objects_moved_count all of them, so a flush costs the same early and late in a long job and
+    the control panel still shows what is moving. The final flush reads the whole event log once into objects_moved.
+    """
+    def __init__(self, json_path, data):
+        self.json_path = json_path
+        self.events_path = transfer_events_path(json_path)
+        self.events_offset = 0
+        self.data = data
+        self.data['objects_moved_count'] = 0
+        self.recent_objects_moved = deque(maxlen=RECENT_OBJECTS_MOVED)
+        write_json(self.json_path, self.data)
+
+    # Merges new data the same way utils.update_json does, lists are extended and everything else is replaced
+    def update(self, new_data):
+        for key, value in new_data.items():
+            if key in self.data and isinstance(self.data[key], list):
+                self.data[key].extend(value)
+            else:
+                self.data[key] = value
+
+    # Reads the events appended since the last call, counts them and keeps the most recent ones, returns the new events
+    def ingest_events(self):
+        events, self.events_offset = read_jsonl(self.events_path, self.events_offset)
+        self.data['objects_moved_count'] += len(events)
+        self.recent_objects_moved.extend(events)
+        return events
+
+    # final=True ends the run, objects_moved is filled from the whole event log
+    def flush(self, new_data=None, final=False):
+        with trace_span('summary_flush', 'json', path=self.json_path) as span:
+            if new_data:
+                self.update(new_data)
+            span.set(events=len(self.ingest_events()))
+            if final:
+                self.data['objects_moved'], _ = read_jsonl(self.events_path)
+            else:
+                self.data['objects_moved'] = list(self.recent_objects_moved)
+            write_json(self.json_path, self.data)
+###
+# END: TRANSFER SUMMARY AGGREGATOR
+###
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+###
+# BEGIN: TRANSFER JOURNAL
+###
+# One journal per src/dst pair, so a rerun of the same config finds the journal of the run it resumes
+def transfer_journal_path(journal_directory, src_service, src_bucket, src_prefix, dst_service, dst_bucket, dst_prefix):
+    job = f"{src_service}:{src_bucket}/{src_prefix}->{dst_service}:{dst_bucket}/{dst_prefix}"
+    return os.path.join(journal_directory, f"transfer_journal_{hashlib.sha1(job.encode('utf-8')).hexdigest()[:16]}.sqlite")
+
+class TransferJournal:
+    """
+    Durable local record of a transfer: every planned object with its state (planned, in_flight, done, failed),
+    and for large objects the multipart upload id and the parts that already finished.
+
+    The parent process queues object state changes in memory and writes them in one short transaction per commit(),
+    so worker processes recording multipart parts through their own connection never wait long on the write lock.
+    """
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        directory = os.path.dirname(journal_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(journal_path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS objects (src_key TEXT PRIMARY KEY, obj_key TEXT, dst_key TEXT, bytes INTEGER, state TEXT, upload_id TEXT, part_size INTEGER, updated_epoch INTEGER)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS parts (src_key TEXT, part_number INTEGER, etag TEXT, PRIMARY KEY (src_key, part_number))")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS objects_state ON objects (state)")
+        self.pending_states = []
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    ###
+    # Run level information
+    ###
+    def get_meta(self, name, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, **values):
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", [(name, json.dumps(value)) for name, value in values.items()])
+
+    # Starts a fresh journal for a new run, keeping nothing from a previous one
+    def reset(self):
+        self.pending_states = []
+        with self.connection:
+            for table in ('meta', 'objects', 'parts'):
+                self.connection.execute(f"DELETE FROM {table}")
+
+    ###
+    # Object states, written by the parent process
+    ###
+    # Records every object the run is going to move, planned_objects maps obj_key to (src_key, dst_key, bytes)
+    def plan(self, planned_objects):
+        now = int(time.time())
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO objects (src_key, obj_key, dst_key, bytes, state, upload_id, part_size, updated_epoch) VALUES (?, ?, ?, ?, 'planned', NULL, NULL, ?)",
+                                        ((src_key, obj_key, dst_key, obj_bytes, now) for obj_key, (src_key, dst_key, obj_bytes) in planned_objects.items()))
+
+    def mark(self, src_key, state):
+        self.pending_states.append((state, int(time.time()), src_key))
+
+    # Writes the queued state changes, the workers clear the multipart parts of an upload once they complete it
+    def commit(self):
+        if not self.pending_states:
+            return
+        pending_states, self.pending_states = self.pending_states, []
+        with self.connection:
+            self.connection.executemany("UPDATE objects SET state = ?, updated_epoch = ? WHERE src_key = ?", pending_states)
+
+    # Returns {obj_key: bytes} for every planned object that has not finished
+    def unfinished_objects(self):
+        return {obj_key: obj_bytes for obj_key, obj_bytes in self.connection.execute("SELECT obj_key, bytes FROM objects WHERE state != 'done'")}
+
+    def planned_objects(self):
+        return {obj_key: obj_bytes for obj_key, obj_bytes in self.connection.execute("SELECT obj_key, bytes FROM objects")}
+
+    def count_states(self):
+        return dict(self.connection.execute("SELECT state, COUNT(*) FROM objects GROUP BY state").fetchall())
+
+    # Objects that have a multipart upload open: [(src_key, dst_key, upload_id)]
+    def open_multipart_uploads(self):
+        return self.connection.execute("SELECT src_key, dst_key, upload_id FROM objects WHERE upload_id IS NOT NULL AND state != 'done'").fetchall()
+
+    ###
+    # Multipart progress, written by the worker processes
+    ###
+    # Returns (upload_id, part_size, {part_number: etag}) of an unfinished multipart upload, or None
+    def get_multipart(self, src_key):
+        row = self.connection.execute("SELECT upload_id, part_size FROM objects WHERE src_key = ? AND upload_id IS NOT NULL", (src_key,)).fetchone()
+        if not row:
+            return None
+        parts = dict(self.connection.execute("SELECT part_number, etag FROM parts WHERE src_key = ?", (src_key,)).fetchall())
+        return row[0], row[1], parts
+
+    def start_multipart(self, src_key, upload_id, part_size):
+        with self.connection:
+            self.connection.execute("UPDATE objects SET upload_id = ?, part_size = ? WHERE src_key = ?", (upload_id, part_size, src_key))
+            self.connection.execute("DELETE FROM parts WHERE src_key = ?", (src_key,))
+
+    def record_part(self, src_key, part_number, etag):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO parts (src_key, part_number, etag) VALUES (?, ?, ?)", (src_key, part_number, etag))
+
+    # Forgets the upload of an object once it was completed or aborted at the destination
+    def clear_multipart(self, src_key):
+        with self.connection:
+            self.connection.execute("UPDATE objects SET upload_id = NULL, part_size = NULL WHERE src_key = ?", (src_key,))
+            self.connection.execute("DELETE FROM parts WHERE src_key = ?", (src_key,))
+###
+# END: TRANSFER JOURNAL
+###
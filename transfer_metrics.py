@@ -0,0 +1,179 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+###
+# BEGIN: METRICS REGISTRY
+###
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + '}'
+
+def format_value(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+class MetricsRegistry:
+    """
+    Counters and gauges kept in memory and rendered in the Prometheus/OpenMetrics text format when scraped.
+
+    The dispatcher and the monitors update them as events happen, a scrape only formats the current values,
+    so nothing is read back from the JSON logs and an idle scrape costs a lock and a string join.
+    """
+    def __init__(self, namespace='data_transfer'):
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    # Declares a metric, name is without the namespace and without the _total suffix of counters
+    def describe(self, name, metric_type, help_text):
+        with self.lock:
+            self.metrics.setdefault(name, {'type': metric_type, 'help': help_text, 'samples': {}})
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            samples = self.metrics[name]['samples']
+            key = tuple(sorted(labels.items()))
+            samples[key] = samples.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.metrics[name]['samples'][tuple(sorted(labels.items()))] = value
+
+    def render(self, openmetrics=True):
+        """
+        Returns every metric as exposition text, in the OpenMetrics format or, with openmetrics=False,
+        in the classic Prometheus text format that the node_exporter textfile collector reads.
+        """
+        lines = []
+        with self.lock:
+            for name, metric in self.metrics.items():
+                family = f"{self.namespace}_{name}"
+                sample_name = f"{family}_total" if metric['type'] == 'counter' else family
+                type_name = family if openmetrics else sample_name
+                # The classic format has no state sets, their states are plain 0/1 gauges there
+                metric_type = 'gauge' if metric['type'] == 'stateset' and not openmetrics else metric['type']
+                lines.append(f"# HELP {type_name} {metric['help']}")
+                lines.append(f"# TYPE {type_name} {metric_type}")
+                for labels, value in metric['samples'].items():
+                    lines.append(f"{sample_name}{format_labels(labels)} {format_value(value)}")
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+###
+# END: METRICS REGISTRY
+###
+
+###
+# BEGIN: METRICS EXPOSITION
+###
+# Serves registry.render() on http://address:port/metrics from a daemon thread, returns the server
+def start_metrics_server(registry, port, address='0.0.0.0'):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            # Prometheus asks for OpenMetrics in its Accept header, anything else gets the classic format
+            openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+            body = registry.render(openmetrics).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        # Scrapes every few seconds would otherwise flood the transfer output
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{address}:{port}/metrics")
+    return server
+
+# Writes the registry for the node_exporter textfile collector, replaced atomically so a scrape never sees half a file
+def write_metrics_textfile(registry, directory, filename):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    tmp_path = os.path.join(directory, f".{filename}.tmp")
+    with open(tmp_path, 'w') as metrics_file:
+        metrics_file.write(registry.render(openmetrics=False))
+    os.replace(tmp_path, path)
+    return path
+
+# Starts the exposition a config asks for, returns a function that refreshes the textfile (a no-op without one)
+def expose_metrics(registry, port, textfile_directory, textfile_name):
+    if port:
+        try:
+            start_metrics_server(registry, port)
+        except OSError as e:
+            print(f"Could not serve metrics on port {port}: {e}")
+    if not textfile_directory:
+        return lambda: None
+    def refresh_textfile():
+        try:
+            write_metrics_textfile(registry, textfile_directory, textfile_name)
+        except OSError as e:
+            print(f"Could not write metrics to {textfile_directory}: {e}")
+    return refresh_textfile
+###
+# END: METRICS EXPOSITION
+###
+
+###
+# BEGIN: TRANSFER METRICS
+###
+# Endpoint health states of a side as logs_network_status.py names them, exported as an OpenMetrics state set
+ENDPOINT_STATUSES = ['operational', 'degraded', 'critical']
+
+def transfer_metrics_registry():
+    registry = MetricsRegistry()
+    registry.describe('objects_copied', 'counter', 'Objects copied, by endpoint of each side.')
+    registry.describe('bytes_copied', 'counter', 'Bytes copied, by endpoint of each side.')
+    registry.describe('deduplicated_objects', 'counter', 'Objects created by a server-side copy of identical content already at the destination.')
+    registry.describe('deduplicated_bytes', 'counter', 'Bytes of the deduplicated objects, none of them crossed the link.')
+    registry.describe('copy_failures', 'counter', 'Failed copy attempts, by error class (throttle, transient or permanent).')
+    registry.describe('retries', 'counter', 'Failed copy attempts that were queued for another attempt.')
+    registry.describe('objects_in_flight', 'gauge', 'Objects being copied by the workers.')
+    registry.describe('objects_in_flight_endpoint', 'gauge', 'Objects being copied, by endpoint of each side.')
+    registry.describe('concurrency_limit', 'gauge', 'Objects the concurrency controller currently allows in flight.')
+    registry.describe('queued_objects', 'gauge', 'Objects planned but not started yet, by size lane.')
+    registry.describe('retry_queued_objects', 'gauge', 'Objects waiting for their retry delay.')
+    registry.describe('endpoint_backing_off', 'gauge', '1 while an endpoint backs off after failures.')
+    registry.describe('listed_objects', 'gauge', 'Objects listed so far, by side.')
+    registry.describe('listing_complete', 'gauge', '1 once the listing of both sides has finished.')
+    registry.describe('objects_to_move', 'gauge', 'Objects found to be missing or different at the destination.')
+    registry.describe('bytes_to_move', 'gauge', 'Bytes of the objects to move.')
+    registry.describe('recent_bytes_per_second', 'gauge', 'Throughput over the recent throughput window.')
+    registry.describe('rate_limit_wait_seconds', 'counter', 'Seconds workers waited for bytes/s and requests/s limits.')
+    registry.describe('start_time_seconds', 'gauge', 'Unix time the transfer started.')
+    registry.set('retries', 0)
+    return registry
+
+def network_status_metrics_registry():
+    registry = MetricsRegistry()
+    registry.describe('endpoint_healthy', 'gauge', '1 if the last health check of an endpoint succeeded.')
+    registry.describe('endpoint_health_check_seconds', 'gauge', 'Duration of the last health check of an endpoint.')
+    registry.describe('endpoints_status', 'stateset', 'Operational status of the endpoints of a side.')
+    registry.describe('health_check_time_seconds', 'gauge', 'Unix time of the last round of health checks.')
+    return registry
+
+# Sets the status state set of a side, exactly one of its states is 1. OpenMetrics names the state label after the metric family.
+def set_endpoints_status(registry, side, status):
+    for state in ENDPOINT_STATUSES:
+        registry.set('endpoints_status', 1 if state == status else 0, side=side, **{f"{registry.namespace}_endpoints_status": state})
+###
+# END: TRANSFER METRICS
+###
@@ -0,0 +1,141 @@
+from collections import deque
+from utils import get_transfer_setting
+
+###
+# BEGIN: SIZE CLASSES
+###
+# Lanes in the order the dispatcher visits them, huge objects first so they do not start at the end and leave a long tail
+LANE_NAMES = ['huge', 'medium', 'tiny']
+
+# Tiny objects are dominated by per-request latency, huge objects are copied as parallel byte ranges
+def classify_object_size(obj_bytes, config):
+    if obj_bytes >= get_transfer_setting(config, 'multipart_threshold_bytes'):
+        return 'huge'
+    if obj_bytes <= get_transfer_setting(config, 'tiny_object_max_bytes'):
+        return 'tiny'
+    return 'medium'
+###
+# END: SIZE CLASSES
+###
+
+###
+# BEGIN: COPY STRATEGIES
+###
+# Returns how an object is copied, from what the storage drivers of both sides can do:
+# 'server_side' when the destination can copy it from the source itself, 'multipart' for a large object the source can
+# read as byte ranges and the destination can take as parallel parts, and 'stream' for everything else
+def choose_copy_strategy(src_driver, dst_driver, src_endpoint_url, dst_endpoint_url, obj_bytes, config, server_side_copy_unsupported=False):
+    if get_transfer_setting(config, 'server_side_copy') and not server_side_copy_unsupported and dst_driver.can_copy_from(src_driver, src_endpoint_url, dst_endpoint_url):
+        return 'server_side'
+    if obj_bytes >= get_transfer_setting(config, 'multipart_threshold_bytes') and src_driver.ranged_reads and dst_driver.multipart_uploads:
+        return 'multipart'
+    return 'stream'
+
+# Describes the capabilities of both sides and the strategy every pair of healthy endpoints copies small and large objects with
+def copy_strategy_summary(src_driver, dst_driver, src_endpoint_urls, dst_endpoint_urls, config):
+    multipart_threshold_bytes = get_transfer_setting(config, 'multipart_threshold_bytes')
+    strategies = {}
+    for src_endpoint_url in src_endpoint_urls:
+        for dst_endpoint_url in dst_endpoint_urls:
+            strategies[f"{src_endpoint_url} -> {dst_endpoint_url}"] = {
+                'small': choose_copy_strategy(src_driver, dst_driver, src_endpoint_url, dst_endpoint_url, 0, config),
+                'large': choose_copy_strategy(src_driver, dst_driver, src_endpoint_url, dst_endpoint_url, multipart_threshold_bytes, config)}
+    return {'src_capabilities': src_driver.capabilities(),
+            'dst_capabilities': dst_driver.capabilities(),
+            'strategies': strategies}
+###
+# END: COPY STRATEGIES
+###
+
+###
+# BEGIN: TRANSFER PLAN
+###
+class TransferPlan:
+    """
+    Orders the objects to move into size-class lanes, largest object first within every lane.
+
+    Every lane has its own cap on objects in flight (many parallel PUTs for tiny objects, a few streams with many parts
+    for huge ones) and next_object() round-robins over the lanes that are below their cap, so all lanes drain side by side
+    while the overall number of objects in flight is still left to the concurrency controller.
+    """
+    def __init__(self, objects, config):
+        self.config = config
+        self.objects = objects
+        self.lanes = {lane_name: {'concurrency': max(1, get_transfer_setting(config, f'{lane_name}_lane_concurrency')),
+                                  'pending': deque(),
+                                  'in_flight': 0,
+                                  'objects': 0,
+                                  'bytes': 0,
+                                  'largest_object_bytes': 0} for lane_name in LANE_NAMES}
+        # Largest-first (LPT) ordering keeps the makespan close to the optimum for every lane
+        for obj_key in sorted(objects, key=objects.get, reverse=True):
+            self.add(obj_key, objects[obj_key])
+        self.next_lane = 0
+
+    def add(self, obj_key, obj_bytes):
+        lane = self.lanes[classify_object_size(obj_bytes, self.config)]
+        lane['pending'].append(obj_key)
+        lane['objects'] += 1
+        lane['bytes'] += obj_bytes
+        lane['largest_object_bytes'] = max(lane['largest_object_bytes'], obj_bytes)
+
+    # Puts an object whose copy failed back at the front of its lane, it is already counted in the lane totals
+    def requeue(self, obj_key, obj_bytes):
+        self.lanes[classify_object_size(obj_bytes, self.config)]['pending'].appendleft(obj_key)
+
+    # Objects added but not started yet
+    def pending_objects(self):
+        return sum(len(lane['pending']) for lane in self.lanes.values())
+
+    # Returns (lane_name, obj_key) for the next object to start, or None when every lane is empty or at its cap
+    def next_object(self):
+        for offset in range(len(LANE_NAMES)):
+            lane_name = LANE_NAMES[(self.next_lane + offset) % len(LANE_NAMES)]
+            lane = self.lanes[lane_name]
+            if lane['pending'] and lane['in_flight'] < lane['concurrency']:
+                self.next_lane = (self.next_lane + offset + 1) % len(LANE_NAMES)
+                lane['in_flight'] += 1
+                return lane_name, lane['pending'].popleft()
+        return None
+
+    def complete(self, lane_name):
+        self.lanes[lane_name]['in_flight'] -= 1
+
+    def summary(self):
+        """
+        Describes the lanes and the expected critical path of the transfer before it starts.
+
+        The critical path of a lane is the most bytes a single stream has to move: either its share of the lane
+        (bytes / concurrency) or the largest object in the lane, whichever is bigger. Huge objects are split over
+        multipart_max_concurrency byte ranges, so their streams carry that fraction of an object.
+        """
+        multipart_max_concurrency = get_transfer_setting(self.config, 'multipart_max_concurrency')
+        lanes = {}
+        for lane_name, lane in self.lanes.items():
+            streams_per_object = multipart_max_concurrency if lane_name == 'huge' else 1
+            critical_path_bytes = max(lane['bytes'] / (lane['concurrency'] * streams_per_object), lane['largest_object_bytes'] / streams_per_object)
+            lanes[lane_name] = {'objects': lane['objects'],
+                                'bytes': lane['bytes'],
+                                'concurrency': lane['concurrency'],
+                                'largest_object_bytes': lane['largest_object_bytes'],
+                                'critical_path_bytes_per_stream': int(critical_path_bytes)}
+        critical_lane = max(lanes, key=lambda lane_name: lanes[lane_name]['critical_path_bytes_per_stream'])
+        return {'order': 'largest_first',
+                'tiny_object_max_bytes': get_transfer_setting(self.config, 'tiny_object_max_bytes'),
+                'huge_object_min_bytes': get_transfer_setting(self.config, 'multipart_threshold_bytes'),
+                'lanes': lanes,
+                'critical_lane': critical_lane,
+                'critical_path_bytes_per_stream': lanes[critical_lane]['critical_path_bytes_per_stream']}
+###
+# END: TRANSFER PLAN
+###
+
+# Prints a plan summary as a short table
+def print_transfer_plan(plan_summary):
+    print("Transfer plan (largest object first in every lane):")
+    for lane_name, lane in plan_summary['lanes'].items():
+        print(f"  {lane_name:>6}: {lane['objects']} objects, {lane['bytes']/1073741824:.3f} GB, {lane['concurrency']} in flight, "
+              f"largest {lane['largest_object_bytes']/1073741824:.3f} GB, critical path {lane['critical_path_bytes_per_stream']/1073741824:.3f} GB per stream")
+    print(f"  Expected critical path: {plan_summary['critical_lane']} lane, {plan_summary['critical_path_bytes_per_stream']/1073741824:.3f} GB per stream")
+    for endpoint_pair, strategy in plan_summary.get('copy_strategies', {}).get('strategies', {}).items():
+        print(f"  Copy strategy {endpoint_pair}: {strategy['small']}, {strategy['large']} for huge objects")
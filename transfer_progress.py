@@ -0,0 +1,87 @@
+import time
+from collections import deque
+
+###
+# BEGIN: TRANSFER PROGRESS
+###
+class TransferProgress:
+    """
+    Tracks transfer progress in memory from worker completions instead of re-listing the destination.
+
+    Counters are flushed to the transfer JSON at most every flush_interval_seconds, the rolling throughput
+    covers the completions of the last throughput_window_seconds and the ETA is the remaining bytes at that rate.
+    """
+    def __init__(self, initial_synced_objects, objects_to_move, bytes_to_move, flush_interval_seconds=10, throughput_window_seconds=60):
+        self.initial_synced_objects = initial_synced_objects
+        self.objects_to_move = objects_to_move
+        self.bytes_to_move = bytes_to_move
+        self.flush_interval_seconds = flush_interval_seconds
+        self.throughput_window_seconds = throughput_window_seconds
+        self.objects_done = 0
+        self.bytes_done = 0
+        self.objects_failed = 0
+        self.start_time = time.time()
+        self.last_flush_time = self.start_time
+        self.window = deque()
+        self.window_bytes = 0
+
+    # Grows the totals while objects to move are still being listed
+    def add(self, objects_to_move, bytes_to_move):
+        self.objects_to_move += objects_to_move
+        self.bytes_to_move += bytes_to_move
+
+    # Records a finished object, only successful copies count as progress
+    def record(self, obj_bytes, succeeded=True, now=None):
+        now = time.time() if now is None else now
+        if not succeeded:
+            self.objects_failed += 1
+            return
+        self.objects_done += 1
+        self.bytes_done += obj_bytes
+        self.window.append((now, obj_bytes))
+        self.window_bytes += obj_bytes
+
+    # Bytes/s over the rolling window, or since the start while the transfer is younger than the window
+    def bytes_per_second(self, now=None):
+        now = time.time() if now is None else now
+        while self.window and self.window[0][0] < now - self.throughput_window_seconds:
+            self.window_bytes -= self.window.popleft()[1]
+        elapsed = min(self.throughput_window_seconds, now - self.start_time)
+        return self.window_bytes / elapsed if elapsed > 0 else 0
+
+    def summary(self, now=None):
+        now = time.time() if now is None else now
+        bytes_per_second = self.bytes_per_second(now)
+        remaining_bytes = self.bytes_to_move - self.bytes_done
+        synced_objects = self.initial_synced_objects + self.objects_done
+        unsynced_objects = self.objects_to_move - self.objects_done
+        eta_seconds = int(remaining_bytes / bytes_per_second) if bytes_per_second > 0 else False
+        return {"final_synced_objects": synced_objects,
+                "final_unsynced_objects": unsynced_objects,
+                "completion_percentage": 100 * synced_objects/(synced_objects + unsynced_objects) if synced_objects + unsynced_objects else 100.0,
+                "bytes_transferred": self.bytes_done,
+                "equivalent_gigabytes_transferred": float(f"{(self.bytes_done/1073741824):.3f}"),
+                "remaining_bytes": remaining_bytes,
+                "equivalent_remaining_bytes": float(f"{(remaining_bytes/1073741824):.3f}"),
+                "objects_failed_attempts": self.objects_failed,
+                "recent_bytes_per_second": int(bytes_per_second),
+                "recent_speed_gbps": float(f"{(bytes_per_second/1073741824*8):.3f}"),
+                "eta_seconds": eta_seconds,
+                "eta_epoch": int(now + eta_seconds) if eta_seconds is not False else False,
+                "progress_updated_epoch": int(now)}
+
+    # Writes the counters to the transfer summary once flush_interval_seconds have passed since the last write
+    def maybe_flush(self, transfer_summary, now=None):
+        now = time.time() if now is None else now
+        if now - self.last_flush_time < self.flush_interval_seconds:
+            return False
+        self.flush(transfer_summary, now)
+        return True
+
+    def flush(self, transfer_summary, now=None):
+        now = time.time() if now is None else now
+        self.last_flush_time = now
+        transfer_summary.flush(self.summary(now))
+###
+# END: TRANSFER PROGRESS
+###
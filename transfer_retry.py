@@ -0,0 +1,173 @@
+import time
+import heapq
+import random
+from itertools import islice
+from botocore.exceptions import ClientError, HTTPClientError, ConnectionError as BotocoreConnectionError, IncompleteReadError, ResponseStreamingError
+from boto3.exceptions import S3UploadFailedError, RetriesExceededError
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from concurrency_controller import is_throttle_error
+from checksums import ChecksumMismatchError
+
+###
+# BEGIN: ERROR CLASSIFICATION
+###
+# Error codes of failures that are worth retrying but are not a request to slow down
+TRANSIENT_ERROR_CODES = {'InternalError', 'RequestTimeout', 'RequestTimeoutException', 'OperationTimedOut', 'InternalServerError', 'BadDigest', 'Md5Mismatch'}
+TRANSIENT_HTTP_STATUSES = {408, 500, 502, 504}
+# Error codes that never clear by retrying however they are sent, a clock skewed against the service fails every signed request
+PERMANENT_ERROR_CODES = {'RequestTimeTooSkewed'}
+# Most object keys and error messages reported per problem in the transfer JSON
+MAX_REPORTED_ERRORS = 1000
+
+# Sorts a failed copy into 'throttle' (the endpoint wants us to slow down), 'transient' (retry) or 'permanent' (do not retry)
+def classify_error(error):
+    if isinstance(error, TransferAttemptError):
+        return error.error_class
+    if isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in PERMANENT_ERROR_CODES:
+        return 'permanent'
+    if is_throttle_error(error):
+        return 'throttle'
+    if isinstance(error, ClientError):
+        if (error.response.get('Error', {}).get('Code') in TRANSIENT_ERROR_CODES
+                or error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') in TRANSIENT_HTTP_STATUSES):
+            return 'transient'
+        return 'permanent'
+    if isinstance(error, HttpResponseError):
+        if error.error_code in TRANSIENT_ERROR_CODES or error.status_code in TRANSIENT_HTTP_STATUSES or error.status_code is None:
+            return 'transient'
+        return 'permanent'
+    # boto3 transfers re-raise the service error as their own, classify the error they were handling
+    if isinstance(error, S3UploadFailedError) and (error.__cause__ or error.__context__) is not None:
+        return classify_error(error.__cause__ or error.__context__)
+    # Dropped connections, timeouts, truncated bodies and bytes damaged on the way. Other OS errors such as a missing
+    # file, a denied permission or a directory where a file was expected fail the same way however often they are retried.
+    if isinstance(error, (HTTPClientError, BotocoreConnectionError, IncompleteReadError, ResponseStreamingError, RetriesExceededError, ServiceRequestError, ServiceResponseError, ChecksumMismatchError, ConnectionError, TimeoutError)):
+        return 'transient'
+    return 'permanent'
+
+class TransferAttemptError(Exception):
+    """
+    A failed copy as it is handed back from a worker process, classified where the original error is still at hand.
+
+    Service exceptions do not always survive pickling between processes, this one only carries a message and its class.
+    """
+    def __init__(self, message, error_class):
+        super().__init__(message, error_class)
+        self.message = message
+        self.error_class = error_class
+
+    def __str__(self):
+        return self.message
+###
+# END: ERROR CLASSIFICATION
+###
+
+###
+# BEGIN: TRANSFER RETRY
+###
+class TransferRetry:
+    """
+    Decides what happens to an object whose copy failed and keeps the backoff of every endpoint.
+
+    Throttled and transient failures are retried until an object has failed max_attempts times, permanent ones never.
+    A retry waits a jittered exponential delay and avoids the endpoints the object already failed on. Since a failure
+    cannot be pinned on the source or the destination, both endpoints of the attempt back off: no new object is sent
+    to an endpoint before its backoff ends, which doubles with every failure until one of its copies succeeds again.
+    """
+    def __init__(self, max_attempts=5, base_delay_seconds=1, max_delay_seconds=60):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.attempts = {}
+        self.failed_endpoints = {}
+        self.endpoint_failures = {}
+        self.endpoint_backoff_until = {}
+        self.retry_queue = []
+        self.given_up = {}
+        self.failures = {'throttle': 0, 'transient': 0, 'permanent': 0}
+        self.retried_objects = 0
+
+    # Half the exponential delay is kept and the other half jittered, so retries of a burst of failures spread out
+    def backoff_seconds(self, failures):
+        delay = min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (failures - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def failed(self, obj_key, endpoint_urls, error, now=None):
+        """
+        Records a failed attempt at obj_key on endpoint_urls (its source and destination endpoint).
+
+        Returns the error class and whether the object was queued for another attempt.
+        """
+        now = time.time() if now is None else now
+        error_class = classify_error(error)
+        self.failures[error_class] += 1
+        attempts = self.attempts[obj_key] = self.attempts.get(obj_key, 0) + 1
+        if error_class != 'permanent':
+            self.failed_endpoints.setdefault(obj_key, set()).update(endpoint_urls)
+            for endpoint_url in endpoint_urls:
+                # Objects already in flight when an endpoint started backing off do not escalate its backoff further
+                if self.backing_off(endpoint_url, now):
+                    continue
+                failures = self.endpoint_failures[endpoint_url] = self.endpoint_failures.get(endpoint_url, 0) + 1
+                self.endpoint_backoff_until[endpoint_url] = now + self.backoff_seconds(failures)
+        if error_class == 'permanent' or attempts >= self.max_attempts:
+            self.given_up[obj_key] = {'error_class': error_class, 'attempts': attempts, 'error': str(error)}
+            self.attempts.pop(obj_key)
+            self.failed_endpoints.pop(obj_key, None)
+            return error_class, False
+        if attempts == 1:
+            self.retried_objects += 1
+        heapq.heappush(self.retry_queue, (now + self.backoff_seconds(attempts), obj_key))
+        return error_class, True
+
+    # A successful copy resets the backoff of both its endpoints
+    def succeeded(self, obj_key, endpoint_urls):
+        self.attempts.pop(obj_key, None)
+        self.failed_endpoints.pop(obj_key, None)
+        for endpoint_url in endpoint_urls:
+            self.endpoint_failures.pop(endpoint_url, None)
+
+    def backing_off(self, endpoint_url, now=None):
+        now = time.time() if now is None else now
+        return self.endpoint_backoff_until.get(endpoint_url, 0) > now
+
+    def all_backing_off(self, endpoint_urls, now=None):
+        return all(self.backing_off(endpoint_url, now) for endpoint_url in endpoint_urls)
+
+    # Endpoints an object should not be sent to: the ones it failed on and the ones backing off
+    def avoid(self, obj_key, now=None):
+        now = time.time() if now is None else now
+        return self.failed_endpoints.get(obj_key, set()) | {endpoint_url for endpoint_url, until in self.endpoint_backoff_until.items() if until > now}
+
+    # Pops the objects whose retry delay has passed
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        due_objects = []
+        while self.retry_queue and self.retry_queue[0][0] <= now:
+            due_objects.append(heapq.heappop(self.retry_queue)[1])
+        return due_objects
+
+    @property
+    def pending(self):
+        return len(self.retry_queue)
+
+    # Seconds until the next retry is due or the next endpoint stops backing off, at most max_seconds
+    def wait_seconds(self, max_seconds, now=None):
+        now = time.time() if now is None else now
+        ready_times = [until for until in self.endpoint_backoff_until.values() if until > now]
+        if self.retry_queue:
+            ready_times.append(self.retry_queue[0][0])
+        return max(0.0, min([max_seconds] + [ready_time - now for ready_time in ready_times]))
+
+    # Totals for the transfer JSON, with the errors of the objects given up on
+    def summary(self):
+        return {'retry_max_attempts': self.max_attempts,
+                'throttled_attempts': self.failures['throttle'],
+                'transient_failures': self.failures['transient'],
+                'permanent_failures': self.failures['permanent'],
+                'retried_objects': self.retried_objects,
+                'objects_given_up': len(self.given_up),
+                'given_up_errors': dict(islice(self.given_up.items(), MAX_REPORTED_ERRORS))}
+###
+# END: TRANSFER RETRY
+###
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import threading
+
+###
+# BEGIN: TRACE SPANS
+###
+# Trace event log of this process, None while tracing is off. Every process of a transfer appends to the same file.
+trace_events_path = None
+
+class TraceSpan:
+    """
+    A complete ('X') event in Chrome trace-event format, recorded when the with block ends.
+
+    Timestamps are wall clock microseconds so the spans of the dispatcher and every worker process line up on one
+    timeline, each thread (listing shards, byte ranges) gets its own track.
+    """
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    # Adds arguments only known once the span is running, e.g. the copy method an object ended up with
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start_us = time.time_ns() // 1000
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end_us = time.time_ns() // 1000
+        if exc_type is not None:
+            self.args['error'] = f"{exc_type.__name__}: {exc_value}"
+        append_trace_event({'name': self.name, 'cat': self.category, 'ph': 'X', 'ts': self.start_us, 'dur': end_us - self.start_us,
+                            'pid': os.getpid(), 'tid': threading.get_native_id(), 'args': self.args})
+        return False
+
+class NullSpan:
+    """Stands in for a TraceSpan while tracing is off, one shared instance that records nothing."""
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_SPAN = NullSpan()
+
+# With tracing off this is one global lookup, so spans can stay in the per-object and per-part paths
+def trace_span(name, category, **args):
+    if trace_events_path is None:
+        return NULL_SPAN
+    return TraceSpan(name, category, args)
+
+def append_trace_event(event):
+    line = (json.dumps(event, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+    fd = os.open(trace_events_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+# Turns tracing on for this process, process_name labels its track group in Perfetto
+def enable_tracing(events_path, process_name):
+    global trace_events_path
+    trace_events_path = events_path
+    append_trace_event({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': f"{process_name} {os.getpid()}"}})
+###
+# END: TRACE SPANS
+###
+
+###
+# BEGIN: CHROME TRACE EXPORT
+###
+# The trace event log of a transfer started at start_epoch, not named data_transfer_data_* so the control panel skips it
+def trace_events_path_for(log_local_directory, start_epoch):
+    return os.path.join(log_local_directory, f"transfer_trace_{int(start_epoch)}.jsonl")
+
+def export_chrome_trace(events_path):
+    """
+    Writes the events every process appended to events_path as a Chrome trace-event JSON document next to it,
+    which Perfetto (ui.perfetto.dev) and chrome://tracing open. Returns the path of the document.
+    """
+    events = []
+    with open(events_path, 'rb') as events_file:
+        for line in events_file:
+            # A process killed mid-write leaves a partial last line
+            if line.endswith(b'\n'):
+                events.append(json.loads(line))
+    trace_path = events_path[:-len('.jsonl')] + '.json'
+    tmp_path = os.path.join(os.path.dirname(trace_path), f".{os.path.basename(trace_path)}.tmp")
+    with open(tmp_path, 'w') as trace_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+    os.replace(tmp_path, trace_path)
+    return trace_path
+###
+# END: CHROME TRACE EXPORT
+###
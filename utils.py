@@ -1,11 +1,16 @@
 import yaml
 import os
 import boto3
+import requests
+import threading
+from botocore.config import Config
 import json
 import subprocess
 from filelock import FileLock
 # import signal
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, BlobPrefix
+from local_storage import LocalClient, list_local_objects, list_local_objects_parallel
+from transfer_trace import trace_span
 import concurrent.futures
 import re
 
@@ -18,22 +23,52 @@ def read_json(file_path):
     with open(file_path, 'r') as json_file:
         return json.load(json_file)
 
-# Function to write JSON file
+# Function to write JSON file, written to a hidden temporary file first so readers never see a half written document
 def write_json(file_path, data):
-    with open(file_path, 'w') as json_file:
+    tmp_path = os.path.join(os.path.dirname(file_path), f".{os.path.basename(file_path)}.tmp")
+    with open(tmp_path, 'w') as json_file:
         json.dump(data, json_file, indent=4)
+    os.replace(tmp_path, file_path)
 
 # Function to update JSON file with new data without overriding existing keys
 def update_json(file_path, new_data):
     lock_path = file_path + ".lock"
-    with FileLock(lock_path):
-        data = read_json(file_path)
-        for key, value in new_data.items():
-            if key in data and isinstance(data[key], list):
-                data[key].extend(value)
-            else:
-                data[key] = value
-        write_json(file_path, data)
+    lock = FileLock(lock_path)
+    # Time spent waiting for other writers is traced on its own
+    with trace_span('update_json_lock_wait', 'json', path=file_path):
+        lock.acquire()
+    try:
+        with trace_span('update_json', 'json', path=file_path):
+            data = read_json(file_path)
+            for key, value in new_data.items():
+                if key in data and isinstance(data[key], list):
+                    data[key].extend(value)
+                else:
+                    data[key] = value
+            write_json(file_path, data)
+    finally:
+        lock.release()
+
+# Function to append a record as a single compact JSON line, safe to call from many processes at once
+def append_jsonl(file_path, record):
+    line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+    fd = os.open(file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+# Function to read the complete JSON lines written after offset, returns the records and the offset to continue from
+def read_jsonl(file_path, offset=0):
+    if not os.path.exists(file_path):
+        return [], offset
+    with open(file_path, 'rb') as jsonl_file:
+        jsonl_file.seek(offset)
+        data = jsonl_file.read()
+    # A line without its newline is still being written, leave it for the next read
+    complete = data[:data.rfind(b'\n') + 1]
+    records = [json.loads(line) for line in complete.splitlines() if line]
+    return records, offset + len(complete)
 ###
 # END: LOGGING JSON UTILITY
 ###
@@ -49,6 +84,65 @@ def read_config(filename='config.yaml'):
         except yaml.YAMLError as exc:
             print(exc)
             return None
+
+# Defaults for the optional 'transfer' section of a config, used when a key is not set
+TRANSFER_DEFAULTS = {
+    'min_workers': 2, # Fewest objects the transfer keeps in flight
+    'max_workers': 32, # Most objects the transfer keeps in flight, also the size of the worker process pool
+    'initial_workers': None, # Objects in flight at the start, None starts at a third of the cpu count
+    'adaptive_concurrency': True, # Grow and shrink the objects in flight from measured throughput and throttling
+    'concurrency_interval_seconds': 10, # How often the concurrency limit is re-evaluated
+    'retry_max_attempts': 5, # Attempts per object before it is given up, throttled and transient failures are retried on another endpoint if there is one
+    'retry_base_delay_seconds': 1, # Backoff after the first failure of an object or endpoint, doubled with every further failure
+    'retry_max_delay_seconds': 60, # Longest backoff of an object or endpoint
+    'transfer_journal': True, # Keep a local journal of planned, in-flight and finished objects so a run can be resumed with --resume
+    'journal_directory': 'journals', # Where transfer journals and listing indexes are kept, outside the log directory that is synced to S3
+    'listing_workers': 16, # Shards of a listing that are listed at the same time, spread across all healthy endpoints
+    'listing_shards': 64, # Sub-prefixes or key ranges a listing is split into before the shards are listed
+    'streaming_listing': False, # List both sides in key order and start copying while the listing still runs, without holding either listing in memory
+    'streaming_queue_objects': 10000, # Most listed objects waiting to be started before a streaming listing pauses
+    'listing_index': True, # Keep persistent listing indexes of both sides, the destination one is updated from completed copies and verifies the transfer
+    'source_index_max_age_seconds': 0, # Take the source shards (sub-prefixes) listed within this long from the index instead of listing them again, 0 lists every shard
+    'destination_index_max_age_seconds': 0, # Diff against the destination index instead of listing the destination while its last full listing is younger than this, 0 always lists
+    'verify_from_destination_index': False, # Verify the transfer from the destination index and the copies this run completed instead of a final destination listing
+    'progress_flush_seconds': 10, # How often progress counters are written to the transfer JSON
+    'throughput_window_seconds': 60, # Window of completions the reported throughput and ETA are based on
+    'tiny_object_max_bytes': 1048576, # Objects up to this size go to the tiny lane, where per-request latency dominates (1 MiB)
+    'tiny_lane_concurrency': 32, # Most tiny objects in flight at once
+    'medium_lane_concurrency': 16, # Most medium objects in flight at once
+    'huge_lane_concurrency': 2, # Most huge (multipart) objects in flight at once, each one also runs multipart_max_concurrency ranges
+    'multipart_threshold_bytes': 268435456, # Objects at least this large are copied as parallel byte ranges (256 MiB)
+    'multipart_part_size_bytes': 33554432, # Size of each byte range / multipart part / staged block (32 MiB)
+    'multipart_max_concurrency': 8, # Byte ranges of a single object that are copied at the same time
+    'multipart_spread_endpoints': True, # Spread the byte ranges of a single object across all healthy endpoint_urls
+    'stream_upload_checksum_algorithm': 'CRC32', # Checksum sent with every streamed S3 upload request and stored with the object, None for devices that reject it
+    'server_side_copy': True, # Let the storage service copy objects itself when source and destination share a backend
+    'server_side_copy_part_size_bytes': 536870912, # Part size for upload_part_copy, nothing is buffered on this host (512 MiB)
+    'presigned_url_expiry_seconds': 43200, # Lifetime of the presigned S3 url Azure copies from
+    'azure_copy_timeout_seconds': 3600, # Longest wait for an Azure server-side copy, a copy still pending then is aborted and retried
+    'client_pool_connections': None, # Connections each client keeps open, None sizes the pool to the most threads that share a client
+    'trace_transfers': False, # Record spans of every transfer phase and object as a Chrome/Perfetto trace next to the transfer JSON
+    'metrics_port': None, # Serve live transfer metrics for Prometheus on http://<host>:<port>/metrics, None serves none
+    'metrics_textfile_directory': None, # Also write the metrics to a .prom file here for the node_exporter textfile collector
+    'network_status_metrics_port': None, # Serve the endpoint health of logs_network_status.py for Prometheus on this port
+    'max_bytes_per_second': None, # Most bytes/s the whole transfer reads from the source, None is unlimited
+    'max_requests_per_second': None, # Most storage requests/s the whole transfer sends, None is unlimited
+    'endpoint_max_bytes_per_second': None, # Most bytes/s sent to or read from each endpoint, None is unlimited
+    'endpoint_max_requests_per_second': None, # Most requests/s sent to each endpoint, None is unlimited
+    'endpoint_rate_limits': {}, # Limits of single endpoints, keyed by endpoint url, overriding the two settings above
+    'rate_limit_burst_seconds': 1, # Seconds of unused rate a limit lets build up for a burst
+    'deduplicate_objects': False, # Create objects whose content is already at the destination with a server-side copy of it instead of moving the bytes again, needs a source whose listings carry content hashes (not LOCAL)
+    'work_queue_directory': None, # Keep the work queue of --coordinator/--worker runs below this shared directory instead of the log bucket's api/ prefix
+    'work_unit_bytes': 10737418240, # Bytes of objects per work unit a host leases (10 GiB)
+    'work_unit_objects': 10000, # Most objects per work unit
+    'work_lease_seconds': 120, # A work unit whose host has not renewed its lease for this long is handed to another host
+    'work_queue_poll_seconds': 5, # How often a host without work asks the queue for a unit
+}
+
+# Reads a setting from the optional 'transfer' section of a config, falling back to TRANSFER_DEFAULTS
+def get_transfer_setting(config, name):
+    transfer_config = config.get('transfer') or {}
+    return transfer_config.get(name, TRANSFER_DEFAULTS[name])
 ###
 # END: YAML READING UTILITY
 ###
@@ -69,50 +163,91 @@ def run_command(command):
 ###
 # BEGIN: CREATE CLIENTS UTILITY
 ###
-def create_client(service, access_key = None, secret_access_key = None, region=None, endpoint_url=None):
+# Clients are built once per service, endpoint, credentials and pool size and then shared by every thread,
+# so repeated calls (health checks, workers, monitoring loops) reuse open TCP/TLS connections instead of new handshakes.
+# boto3 and Azure clients are thread-safe.
+CLIENT_CACHE = {}
+CLIENT_CACHE_LOCK = threading.Lock()
+
+# A forked process must not share the parent's clients and their sockets, it starts with an empty cache and a new lock
+# since another thread of the parent may have held the old one during the fork
+def reset_client_cache():
+    global CLIENT_CACHE_LOCK
+    CLIENT_CACHE.clear()
+    CLIENT_CACHE_LOCK = threading.Lock()
+os.register_at_fork(after_in_child=reset_client_cache)
+
+# Connections a client keeps open when the caller does not size its pool, botocore's default
+DEFAULT_POOL_CONNECTIONS = 10
+
+# Connections every client of a transfer keeps open: enough for the listing threads, the byte ranges of a
+# multipart copy or boto3's upload threads, whichever use one client the most at once
+def client_pool_connections(config):
+    return get_transfer_setting(config, 'client_pool_connections') or max(DEFAULT_POOL_CONNECTIONS,
+                                                                           get_transfer_setting(config, 'listing_workers'),
+                                                                           get_transfer_setting(config, 'multipart_max_concurrency'))
+
+# Returns the cached client for cache_key, building it under the lock since creating boto3 sessions is not thread-safe
+def cached_client(cache_key, build_client):
+    with CLIENT_CACHE_LOCK:
+        client = CLIENT_CACHE.get(cache_key)
+        if client is None:
+            client = CLIENT_CACHE[cache_key] = build_client()
+        return client
+
+def create_client(service, access_key = None, secret_access_key = None, region=None, endpoint_url=None, max_pool_connections=None):
     if service == 'AWS':
-        return create_s3_client(access_key, secret_access_key, region, endpoint_url)
+        return create_s3_client(access_key, secret_access_key, region, endpoint_url, max_pool_connections)
     elif service == 'AZURE':
-        return create_az_client(access_key)
+        return create_az_client(access_key, max_pool_connections)
+    elif service == 'LOCAL':
+        # The bucket is a directory below the endpoint_url mount point, there is nothing to connect to
+        return LocalClient(endpoint_url)
 
-def create_s3_client(access_key, secret_access_key, region, endpoint_url):
-    
-    if endpoint_url == 'no_endpoint':
-        s3_client = boto3.client('s3', 
+def create_s3_client(access_key, secret_access_key, region, endpoint_url, max_pool_connections=None):
+    max_pool_connections = max_pool_connections or DEFAULT_POOL_CONNECTIONS
+    return cached_client(('AWS', access_key, secret_access_key, region, endpoint_url, max_pool_connections),
+                         lambda: build_s3_client(access_key, secret_access_key, region, endpoint_url, max_pool_connections))
+
+def build_s3_client(access_key, secret_access_key, region, endpoint_url, max_pool_connections):
+    client_config = Config(max_pool_connections=max_pool_connections, tcp_keepalive=True)
+    session = boto3.Session(
         aws_access_key_id=access_key, 
-        aws_secret_access_key=secret_access_key, 
-        region_name=region)
+        aws_secret_access_key=secret_access_key
+    )
+    if endpoint_url == 'no_endpoint':
+        s3_client = session.client('s3', 
+        region_name=region,
+        config=client_config)
     elif 's3-accelerate' in endpoint_url and region != 'snow':
-        s3_client = boto3.client('s3', 
-        aws_access_key_id=access_key, 
-        aws_secret_access_key=secret_access_key, 
-        region_name=region)
+        s3_client = session.client('s3', 
+        region_name=region,
+        config=client_config)
     elif endpoint_url != 'no_endpoint' and region != 'snow': 
-        s3_client = boto3.client('s3', 
-        aws_access_key_id=access_key, 
-        aws_secret_access_key=secret_access_key, 
+        s3_client = session.client('s3', 
         region_name=region, 
         endpoint_url=endpoint_url,
-        verify=False)
+        verify=False,
+        config=client_config)
     else:
-        session = boto3.Session(
-            aws_access_key_id=access_key, 
-            aws_secret_access_key=secret_access_key
-        )
         if 'https' in endpoint_url: # denotes new snowballs
-            s3_client = session.resource('s3', endpoint_url=endpoint_url, verify=False)
+            s3_client = session.resource('s3', endpoint_url=endpoint_url, verify=False, config=client_config)
         else:
-            s3_client = session.resource('s3', endpoint_url=endpoint_url)
+            s3_client = session.resource('s3', endpoint_url=endpoint_url, config=client_config)
     return s3_client
 
-def create_az_client(access_key):
+def create_az_client(access_key, max_pool_connections=None):
+    max_pool_connections = max_pool_connections or DEFAULT_POOL_CONNECTIONS
+    return cached_client(('AZURE', access_key, max_pool_connections), lambda: build_az_client(access_key, max_pool_connections))
+
+def build_az_client(access_key, max_pool_connections):
     connection_string = access_key
 
     pattern = (
-        r"^DefaultEndpointsProtocol=https;"
+        r"^DefaultEndpointsProtocol=https?;"
         r"AccountName=[a-zA-Z0-9+/=]+;" # for future production use, put in a bunch of valid account names.
         r"AccountKey=[a-zA-Z0-9+/=]+;"
-        r"EndpointSuffix=core.windows.net"
+        r"(EndpointSuffix=core.windows.net|BlobEndpoint=https?://[^;]+)" # BlobEndpoint for Azurite and other stand-ins
     )
     
     match = re.match(pattern, connection_string)
@@ -122,7 +257,12 @@ def create_az_client(access_key):
     
     print("Connection string is valid")
 
-    az_client = BlobServiceClient.from_connection_string(connection_string)
+    # The pipeline's requests session keeps up to max_pool_connections connections to the account alive
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=max_pool_connections, pool_maxsize=max_pool_connections)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    az_client = BlobServiceClient.from_connection_string(connection_string, session=session)
     return az_client
 ###
 # END: CREATE CLIENTS UTILITY
@@ -131,17 +271,21 @@ def create_az_client(access_key):
 ###
 # BEGIN: LIST OBJECTS UTILITY
 ###
-def list_objects(service, bucket_name, prefix, client, isSnow=False):
+# With details=True every key maps to (size, etag, last_modified_epoch) instead of the size alone
+def list_objects(service, bucket_name, prefix, client, isSnow=False, details=False):
     if prefix == '/':
         prefix=''
     if service == "AWS":
-        objects = list_s3_objects(bucket_name, prefix, client, isSnow)
+        objects = list_s3_objects(bucket_name, prefix, client, isSnow, details)
         return objects
     if service == "AZURE":
-        objects = list_blob_objects(bucket_name, prefix, client)
+        objects = list_blob_objects(bucket_name, prefix, client, details)
+        return objects
+    if service == "LOCAL":
+        objects = list_local_objects(bucket_name, prefix, client, details)
         return objects
     
-def list_s3_objects(bucket_name, prefix, s3_client, isSnow=False):
+def list_s3_objects(bucket_name, prefix, s3_client, isSnow=False, details=False):
     prefix = prefix.lstrip('/') + '/'
     """List all objects in a given bucket with a specified prefix along with their size."""
     objects = {}
@@ -152,7 +296,7 @@ def list_s3_objects(bucket_name, prefix, s3_client, isSnow=False):
         for obj in bucket.objects.filter(Prefix=prefix):
             if not obj.key.endswith('/'):
                 key = obj.key.replace(prefix, '', 1).lstrip('/')
-                objects[key] = obj.size
+                objects[key] = (obj.size, obj.e_tag.strip('"'), int(obj.last_modified.timestamp())) if details else obj.size
     else:
         paginator = s3_client.get_paginator('list_objects_v2')
         for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
@@ -160,22 +304,237 @@ def list_s3_objects(bucket_name, prefix, s3_client, isSnow=False):
                 for obj in page["Contents"]:
                     if not obj["Key"].endswith('/'):
                         key = obj["Key"].replace(prefix, '', 1).lstrip('/')
-                        objects[key] = obj['Size']
+                        objects[key] = (obj['Size'], obj['ETag'].strip('"'), int(obj['LastModified'].timestamp())) if details else obj['Size']
     return objects
 
-def list_blob_objects(bucket_name, prefix, az_client):
+def list_blob_objects(bucket_name, prefix, az_client, details=False):
     objects = {}
     container_client = az_client.get_container_client(bucket_name)
     blob_list = container_client.list_blobs(name_starts_with=prefix)
     for blob in blob_list:
         if not blob.name.endswith('/'):
                         key = blob.name.replace(prefix, '', 1).lstrip('/')
-                        objects[key] = blob.size
+                        objects[key] = blob_listing_entry(blob, details)
     return objects
 ###
 # END: LIST OBJECTS UTILITY
 ###
 
+###
+# BEGIN: PARALLEL LIST OBJECTS UTILITY
+###
+# A shard that lists a full page hands the keys beyond about this many more pages to a new shard
+LIST_SPLIT_PAGES = 8
+# Split keys are made of the printable ASCII characters, every character a digit of this base
+LIST_SPLIT_FIRST_CHARACTER = 0x20
+LIST_SPLIT_BASE = 95
+
+def list_split_digits(key, start, length):
+    return [min(max(ord(character) - LIST_SPLIT_FIRST_CHARACTER, 0), LIST_SPLIT_BASE - 1) for character in key[start:start + length].ljust(length, chr(LIST_SPLIT_FIRST_CHARACTER))]
+
+def list_split_value(digits):
+    value = 0
+    for digit in digits:
+        value = value * LIST_SPLIT_BASE + digit
+    return value
+
+def list_range_split_key(first_key, last_key, high_key, shard_prefix):
+    """
+    Returns a key to split the rest of a shard's range after last_key at, or None when there is nothing to split.
+
+    The keys of the page just listed (first_key to last_key) tell how densely keys sit, the split goes about
+    LIST_SPLIT_PAGES pages further on, or halfway to high_key (None is the end of shard_prefix) when that is nearer.
+    Keys are read as numbers in base LIST_SPLIT_BASE from where first_key and high_key start to differ, on as many
+    characters as first_key and last_key share and a few more, so the page spans at least a few units.
+    """
+    common = os.path.commonprefix([first_key, high_key]) if high_key is not None else shard_prefix
+    length = len(os.path.commonprefix([first_key, last_key])) - len(common) + 3
+    first, last = list_split_value(list_split_digits(first_key, len(common), length)), list_split_value(list_split_digits(last_key, len(common), length))
+    high = list_split_value(list_split_digits(high_key, len(common), length)) if high_key is not None else LIST_SPLIT_BASE ** length - 1
+    target = min(last + LIST_SPLIT_PAGES * (last - first), (last + high) // 2)
+    digits = []
+    for _ in range(length):
+        target, digit = divmod(target, LIST_SPLIT_BASE)
+        digits.append(chr(digit + LIST_SPLIT_FIRST_CHARACTER))
+    split_key = (common + ''.join(reversed(digits))).rstrip(chr(LIST_SPLIT_FIRST_CHARACTER))
+    # Clamped characters outside printable ASCII can put the estimate outside the range, such a range is not split
+    if split_key <= last_key or (high_key is not None and split_key >= high_key) or not split_key.startswith(shard_prefix):
+        return None
+    return split_key
+
+def list_objects_parallel(service, bucket_name, prefix, clients, isSnow=False, details=False, max_workers=16, target_shards=64, max_depth=4, shard_cache=None, progress=None):
+    """
+    Lists a prefix as many shards at once, round-robin over one client per healthy endpoint, returns the same dictionary as list_objects.
+
+    Shards are the sub-prefixes found with a '/' delimiter, up to max_depth levels down or until there are target_shards of them.
+    An S3 prefix with more entries than fit in one page is listed as a key range instead.
+    A shard_cache (see listing_index.ShardCache) can hand back the objects of a shard listed recently instead of listing it again,
+    it is only asked from the calling thread and told which shards were listed.
+    progress is called from the calling thread with the number of objects listed so far whenever a shard finished.
+    While fewer shards than max_workers are listing, an S3 shard that lists a full page splits off the rest of its key range
+    as a new shard starting after a key estimated from that page, so keys that share their first characters are still listed in parallel.
+    """
+    if prefix == '/':
+        prefix=''
+    if service == "AWS":
+        prefix = prefix.lstrip('/') + '/'
+        # The snowball resource has no delimiter or StartAfter listing, its low level client does
+        apis = [client.meta.client if isSnow else client for client in clients]
+        objects, shards = discover_s3_list_shards(bucket_name, prefix, apis[0], isSnow, details, target_shards, max_depth)
+        list_shard = lambda index, shard, split: list_s3_shard(bucket_name, prefix, apis[index % len(apis)], shard, isSnow, details, split)
+    elif service == "AZURE":
+        container_clients = [client.get_container_client(bucket_name) for client in clients]
+        objects, shards = discover_blob_list_shards(prefix, container_clients[0], details, target_shards, max_depth)
+        list_shard = lambda index, shard, split: list_blob_shard(prefix, container_clients[index % len(container_clients)], shard, details)
+    elif service == "LOCAL":
+        # Directories are the natural shards of a file tree, they are walked in parallel as they are found
+        return list_local_objects_parallel(bucket_name, prefix, clients, details, max_workers, progress)
+
+    def traced_list_shard(index, shard):
+        with trace_span('list_shard', 'listing', shard=shard):
+            return list_shard(index, shard, split)
+
+    if shard_cache is not None:
+        # Shard bounds relative to the prefix, like the keys of the listing
+        relative_key = lambda key: key.replace(prefix, '', 1).lstrip('/') if key is not None else None
+        shards_to_list = []
+        for shard in shards:
+            shard_prefix, start_after, end_at = shard if isinstance(shard, tuple) else (shard, None, None)
+            cached_objects = shard_cache.get(shard, relative_key(shard_prefix), relative_key(start_after), relative_key(end_at))
+            if cached_objects is None:
+                shards_to_list.append(shard)
+            else:
+                objects.update(cached_objects)
+        shards = shards_to_list
+    if progress is not None:
+        progress(len(objects))
+
+    pending = set()
+    pending_lock = threading.Lock()
+    submitted = [0]
+    # Called from the listing threads, takes a shard split off a running one while there are workers left to list it
+    def split(shard):
+        with pending_lock:
+            if len(pending) >= max_workers:
+                return False
+            pending.add(executor.submit(traced_list_shard, submitted[0], shard))
+            submitted[0] += 1
+            return True
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        with pending_lock:
+            for shard in shards:
+                pending.add(executor.submit(traced_list_shard, submitted[0], shard))
+                submitted[0] += 1
+        while True:
+            with pending_lock:
+                listing = set(pending)
+            if not listing:
+                break
+            done, _ = concurrent.futures.wait(listing, return_when=concurrent.futures.FIRST_COMPLETED)
+            with pending_lock:
+                pending.difference_update(done)
+            for future in done:
+                objects.update(future.result())
+            if progress is not None:
+                progress(len(objects))
+    if shard_cache is not None:
+        shard_cache.listed(shards)
+    return objects
+
+def s3_listing_entry(obj, details):
+    return (obj['Size'], obj['ETag'].strip('"'), int(obj['LastModified'].timestamp())) if details else obj['Size']
+
+# Blob ETags are opaque versions, the Content-MD5 is used instead when the blob has one so it compares with S3 ETags
+def blob_listing_entry(blob, details):
+    if not details:
+        return blob.size
+    content_md5 = blob.content_settings.content_md5
+    return (blob.size, bytes(content_md5).hex() if content_md5 else blob.etag.strip('"'), int(blob.last_modified.timestamp()))
+
+# Returns the objects found while walking down the delimiter levels and the shards left to list: [(shard_prefix, start_after, end_at)]
+def discover_s3_list_shards(bucket_name, prefix, s3_api, isSnow, details, target_shards, max_depth):
+    objects = {}
+    shards = []
+    level = [prefix]
+    for depth in range(max_depth):
+        next_level = []
+        for shard_prefix in level:
+            page = (s3_api.list_objects if isSnow else s3_api.list_objects_v2)(Bucket=bucket_name, Prefix=shard_prefix, Delimiter='/')
+            if page.get('IsTruncated'):
+                # Too many entries to enumerate this level, everything below it is one key range that splits as it is listed
+                shards.append((shard_prefix, None, None))
+                continue
+            for obj in page.get('Contents', []):
+                if not obj['Key'].endswith('/'):
+                    objects[obj['Key'].replace(prefix, '', 1).lstrip('/')] = s3_listing_entry(obj, details)
+            next_level.extend(common_prefix['Prefix'] for common_prefix in page.get('CommonPrefixes', []))
+        level = next_level
+        if len(shards) + len(level) >= target_shards:
+            break
+    shards.extend((shard_prefix, None, None) for shard_prefix in level)
+    return objects, shards
+
+# Lists the keys of shard_prefix after start_after up to and including end_at. After every full page the rest of the
+# range is offered to split() as a new shard, the shard then only lists up to where the new one starts.
+def list_s3_shard(bucket_name, prefix, s3_api, shard, isSnow, details, split=None):
+    shard_prefix, start_after, end_at = shard
+    objects = {}
+    kwargs = {'Bucket': bucket_name, 'Prefix': shard_prefix}
+    if start_after is not None:
+        kwargs['Marker' if isSnow else 'StartAfter'] = start_after
+    while True:
+        page = (s3_api.list_objects if isSnow else s3_api.list_objects_v2)(**kwargs)
+        contents = page.get('Contents', [])
+        for obj in contents:
+            if end_at is not None and obj['Key'] > end_at:
+                return objects
+            if not obj['Key'].endswith('/'):
+                objects[obj['Key'].replace(prefix, '', 1).lstrip('/')] = s3_listing_entry(obj, details)
+        if not page.get('IsTruncated') or not contents:
+            return objects
+        if split is not None:
+            split_key = list_range_split_key(contents[0]['Key'], contents[-1]['Key'], end_at, shard_prefix)
+            if split_key is not None and split((shard_prefix, split_key, end_at)):
+                end_at = split_key
+        if isSnow:
+            kwargs['Marker'] = contents[-1]['Key']
+        else:
+            kwargs['ContinuationToken'] = page['NextContinuationToken']
+
+# Blob listings cannot start after a key, a level with more entries than one page is listed as a single shard
+def discover_blob_list_shards(prefix, container_client, details, target_shards, max_depth):
+    objects = {}
+    shards = []
+    level = [prefix]
+    for depth in range(max_depth):
+        next_level = []
+        for shard_prefix in level:
+            pages = container_client.walk_blobs(name_starts_with=shard_prefix, delimiter='/').by_page()
+            page = list(next(pages))
+            if pages.continuation_token:
+                shards.append(shard_prefix)
+                continue
+            for item in page:
+                if isinstance(item, BlobPrefix):
+                    next_level.append(item.name)
+                elif not item.name.endswith('/'):
+                    objects[item.name.replace(prefix, '', 1).lstrip('/')] = blob_listing_entry(item, details)
+        level = next_level
+        if len(shards) + len(level) >= target_shards:
+            break
+    return objects, shards + level
+
+def list_blob_shard(prefix, container_client, shard_prefix, details):
+    objects = {}
+    for blob in container_client.list_blobs(name_starts_with=shard_prefix):
+        if not blob.name.endswith('/'):
+            objects[blob.name.replace(prefix, '', 1).lstrip('/')] = blob_listing_entry(blob, details)
+    return objects
+###
+# END: PARALLEL LIST OBJECTS UTILITY
+###
+
 ###
 # BEGIN: SERVICE ENDPOINT CHECKING UTILITY
 ###
@@ -219,6 +578,11 @@ def is_endpoint_healthy(service, bucket_name, prefix, client, isSnow=False, time
                     count += 1  # Increment the counter
                     if count >= 5:  # Break the loop after processing 5 objects
                         break
+        elif service == "LOCAL":
+            # The bucket directory (or mount) has to be readable, a hung NFS mount times out here like an endpoint,
+            # the prefix directory is created by the first copy
+            with os.scandir(client.path(bucket_name)) as entries:
+                next(entries, None)
         if len(objects) > 1:
             objects.pop('No objects are inside this directory')
         return objects
@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import fcntl
+import socket
+import hashlib
+from botocore.exceptions import ClientError
+from utils import create_s3_client
+
+###
+# BEGIN: WORK QUEUE BACKENDS
+###
+class S3WorkQueueBackend:
+    """
+    Queue documents as objects below a prefix of the log bucket, next to the api/ documents of remote runs.
+
+    Leases rely on conditional writes: If-None-Match creates a document only when it does not exist yet and If-Match
+    replaces it only while it is still the version that was read, so two hosts can never both take the same lease.
+    S3 enforces both, S3-compatible endpoints such as Snowball devices may ignore them, which
+    conditional_writes_enforced() finds out before the queue is used.
+    """
+    def __init__(self, log_config, prefix):
+        client = create_s3_client(log_config['access_key'], log_config['secret_access_key'], log_config['region'], log_config['endpoint_urls'][0])
+        self.isSnow = log_config['region'] == 'snow'
+        # Snowball devices get a boto3 resource, the queue only needs its client
+        self.client = client.meta.client if self.isSnow else client
+        self.bucket = log_config['bucket']
+        self.prefix = prefix
+
+    def location(self):
+        return f"s3://{self.bucket}/{self.prefix}"
+
+    def put(self, name, data):
+        self.client.put_object(Bucket=self.bucket, Key=f"{self.prefix}/{name}", Body=data)
+
+    # Returns (data, version) or None when the document does not exist
+    def get(self, name):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=f"{self.prefix}/{name}")
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+        return response['Body'].read(), response['ETag']
+
+    def create(self, name, data):
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=f"{self.prefix}/{name}", Body=data, IfNoneMatch='*')
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return False
+            raise
+        return True
+
+    def replace(self, name, data, version):
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=f"{self.prefix}/{name}", Body=data, IfMatch=version)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict', 'NoSuchKey'):
+                return False
+            raise
+        return True
+
+    def conditional_writes_enforced(self):
+        """
+        Probes whether the endpoint rejects a second If-None-Match create and an If-Match replace of an old version.
+        """
+        name = f"probe/{socket.gethostname()}-{os.getpid()}-{time.time_ns()}.json"
+        try:
+            if not self.create(name, b'1'):
+                return False
+            _, version = self.get(name)
+            self.put(name, b'2')
+            return not self.create(name, b'3') and not self.replace(name, b'4', version)
+        finally:
+            self.delete(name)
+
+    def list(self, directory):
+        names = []
+        paginator = self.client.get_paginator('list_objects' if self.isSnow else 'list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}/{directory}/"):
+            names.extend(obj['Key'][len(self.prefix) + 1:] for obj in page.get('Contents', []))
+        return names
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=f"{self.prefix}/{name}")
+
+class LocalWorkQueueBackend:
+    """
+    Queue documents as files below a directory, on local disk for a single host or on an NFS mount shared by all of them.
+
+    Documents are created by hard linking a finished temporary file, which fails when the name exists, and replaced
+    under an exclusive flock of the queue, the version of a document is the MD5 of its content.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def location(self):
+        return self.directory
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write_tmp(self, name, data):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{socket.gethostname()}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as tmp_file:
+            tmp_file.write(data)
+        return tmp_path
+
+    def put(self, name, data):
+        os.replace(self.write_tmp(name, data), self.path(name))
+
+    def get(self, name):
+        try:
+            with open(self.path(name), 'rb') as document:
+                data = document.read()
+        except FileNotFoundError:
+            return None
+        return data, hashlib.md5(data).hexdigest()
+
+    def create(self, name, data):
+        tmp_path = self.write_tmp(name, data)
+        try:
+            os.link(tmp_path, self.path(name))
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    # Hard links and flock hold on local disks and NFS, there is nothing to probe
+    def conditional_writes_enforced(self):
+        return True
+
+    def replace(self, name, data, version):
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                current = self.get(name)
+                if current is None or current[1] != version:
+                    return False
+                self.put(name, data)
+                return True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def list(self, directory):
+        try:
+            return [f"{directory}/{filename}" for filename in os.listdir(self.path(directory)) if not filename.startswith('.')]
+        except FileNotFoundError:
+            return []
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+# The queue of a transfer job, every host running the same config finds the same queue
+def work_queue_job_id(src_service, src_bucket, src_prefix, dst_service, dst_bucket, dst_prefix):
+    job = f"{src_service}:{src_bucket}/{src_prefix}->{dst_service}:{dst_bucket}/{dst_prefix}"
+    return hashlib.sha1(job.encode('utf-8')).hexdigest()[:16]
+
+# A local or shared directory when work_queue_directory is set, otherwise the log bucket's api/ prefix
+def create_work_queue_backend(config, job_id, work_queue_directory=None):
+    if work_queue_directory:
+        return LocalWorkQueueBackend(os.path.join(work_queue_directory, f"work_queue_{job_id}"))
+    return S3WorkQueueBackend(config['log'], f"api/work_queue_{job_id}")
+###
+# END: WORK QUEUE BACKENDS
+###
+
+###
+# BEGIN: WORK UNITS
+###
+def partition_work_units(objects, listing, unit_bytes, unit_objects):
+    """
+    Splits {key: bytes} into key-ordered work units of about unit_bytes and at most unit_objects objects each.
+
+    Neighbouring keys stay together, so every unit is a key range and a host works through one part of the bucket.
+    listing maps keys to (size, etag, last_modified) and gives each object the source ETag its copy is verified with.
+    """
+    units = []
+    unit = None
+    for key in sorted(objects):
+        if unit is None or unit['bytes'] >= unit_bytes or len(unit['objects']) >= unit_objects:
+            unit = {'unit_id': f"{len(units):08d}", 'objects': [], 'bytes': 0}
+            units.append(unit)
+        entry = listing.get(key)
+        unit['objects'].append([key, objects[key], entry[1] if entry else None])
+        unit['bytes'] += objects[key]
+    return units
+
+class WorkQueue:
+    """
+    Work units of a transfer job shared by a coordinator and worker hosts through a backend.
+
+    The coordinator publishes the units of the diff. Hosts lease a unit, renew the lease while copying it and mark it
+    done. A lease that was not renewed within lease_seconds (its host died or hung) is taken over by the next host that
+    asks, so the unit is finished anyway. Copies are idempotent, so a unit that ends up copied twice does no harm.
+    Every publish gets a new publish_id: a host that still holds units of an earlier publish of the queue forgets them
+    and the units it knew, so it never works from unit ids that no longer belong to the job.
+    """
+    def __init__(self, backend, lease_seconds=120):
+        self.backend = backend
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.leases = {}
+        self.done_units = set()
+        self.unit_ids = None
+        self.publish_id = None
+        self.stale_units = set()
+
+    def read_document(self, name):
+        document = self.backend.get(name)
+        return (json.loads(document[0]), document[1]) if document else (None, None)
+
+    # Tells workers a coordinator is listing, so they wait for its units instead of finding the queue of an earlier run finished
+    def announce(self):
+        self.backend.put('job.json', json.dumps({'status': 'listing', 'coordinator': self.worker_id}).encode('utf-8'))
+
+    # Replaces the queue of an earlier run with new units
+    def publish(self, units):
+        for name in self.backend.list('units') + self.backend.list('leases') + self.backend.list('done'):
+            self.backend.delete(name)
+        self.backend.put('job.json', json.dumps({'status': 'publishing', 'coordinator': self.worker_id}).encode('utf-8'))
+        for unit in units:
+            self.backend.put(f"units/{unit['unit_id']}.json", json.dumps(unit).encode('utf-8'))
+        self.backend.put('job.json', json.dumps({'status': 'published', 'coordinator': self.worker_id, 'publish_id': f"{self.worker_id}-{time.time_ns()}", 'units': len(units),
+                                                 'objects': sum(len(unit['objects']) for unit in units), 'bytes': sum(unit['bytes'] for unit in units),
+                                                 'published_epoch': int(time.time())}).encode('utf-8'))
+
+    # Returns the job document once the coordinator has published all units, otherwise None
+    def job(self):
+        job, _ = self.read_document('job.json')
+        if not job or job['status'] != 'published':
+            return None
+        # Queues published before publish ids existed are told apart by their publish time
+        publish_id = job.get('publish_id', job.get('published_epoch'))
+        if publish_id != self.publish_id:
+            if self.publish_id is not None:
+                print(f"The work queue was published again, dropping {len(self.leases)} leased units of the earlier publish.")
+            self.publish_id = publish_id
+            self.unit_ids = None
+            self.done_units = set()
+            self.stale_units.update(self.leases)
+            self.leases = {}
+        return job
+
+    def lease_document(self):
+        return json.dumps({'worker_id': self.worker_id, 'expires_epoch': time.time() + self.lease_seconds}).encode('utf-8')
+
+    def lease_next(self):
+        """
+        Leases a unit that is neither done nor leased by a live host, returns the unit or None when there is none right now.
+        """
+        if self.job() is None:
+            return None
+        if self.unit_ids is None:
+            self.unit_ids = sorted(name[len('units/'):-len('.json')] for name in self.backend.list('units'))
+        self.done_units.update(name[len('done/'):-len('.json')] for name in self.backend.list('done'))
+        leased_units = {name[len('leases/'):-len('.json')] for name in self.backend.list('leases')}
+        for unit_id in self.unit_ids:
+            if unit_id in self.done_units or unit_id in self.leases or unit_id in self.stale_units:
+                continue
+            lease_name = f"leases/{unit_id}.json"
+            if unit_id not in leased_units:
+                leased = self.backend.create(lease_name, self.lease_document())
+            else:
+                lease, version = self.read_document(lease_name)
+                leased = lease is not None and lease['expires_epoch'] < time.time() and self.backend.replace(lease_name, self.lease_document(), version)
+                if leased:
+                    print(f"Took over the expired lease of work unit {unit_id} from {lease['worker_id']}.")
+            if leased:
+                unit, _ = self.read_document(f"units/{unit_id}.json")
+                self.leases[unit_id] = time.time()
+                return unit
+        return None
+
+    # Extends every lease this host holds, returns the units whose lease another host took over or that an earlier publish held
+    def renew(self):
+        lost_units = sorted(self.stale_units)
+        self.stale_units = set()
+        for unit_id in list(self.leases):
+            lease_name = f"leases/{unit_id}.json"
+            lease, version = self.read_document(lease_name)
+            if lease is None or lease['worker_id'] != self.worker_id or not self.backend.replace(lease_name, self.lease_document(), version):
+                lost_units.append(unit_id)
+                del self.leases[unit_id]
+            else:
+                self.leases[unit_id] = time.time()
+        return lost_units
+
+    # Renews the leases once a third of the lease time has passed since the oldest renewal
+    def maybe_renew(self):
+        if self.stale_units or self.leases and time.time() - min(self.leases.values()) >= self.lease_seconds / 3:
+            return self.renew()
+        return []
+
+    def complete(self, unit_id, summary):
+        # The unit id belongs to an earlier publish, the unit of the same id in the current one is not done
+        if unit_id in self.stale_units:
+            self.stale_units.discard(unit_id)
+            return
+        self.backend.put(f"done/{unit_id}.json", json.dumps({'worker_id': self.worker_id, 'epoch_time': int(time.time()), **summary}).encode('utf-8'))
+        self.done_units.add(unit_id)
+        if self.leases.pop(unit_id, None) is not None:
+            self.backend.delete(f"leases/{unit_id}.json")
+
+    # True once every published unit is done, by this host or another one
+    def finished(self):
+        if self.job() is None or self.unit_ids is None:
+            return False
+        self.done_units.update(name[len('done/'):-len('.json')] for name in self.backend.list('done'))
+        return all(unit_id in self.done_units for unit_id in self.unit_ids)
+
+    def summary(self):
+        return {'work_queue': self.backend.location(),
+                'worker_id': self.worker_id,
+                'units': len(self.unit_ids) if self.unit_ids is not None else None,
+                'units_done': len(self.done_units)}
+###
+# END: WORK UNITS
+###